@@ -1,27 +1,15 @@
 from django.conf import settings
 from django.contrib import admin
-from django.utils.html import format_html
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 
+from .cache import ShortUrlCache
 from .models import AccessLog, ShortUrls
+from .pagination import EstimatedCountPaginator
 from .serializers import ShortUrlService
 
 
 # Register your models here.
-class AccessLogInline(admin.TabularInline):
-    model = AccessLog
-
-    # 預設不新增額外的空白表單
-    extra = 0
-
-    # 不能刪除
-    can_delete = False
-
-    max_num = 0
-
-    # fields = ['short_url_id', 'accessed_at', 'ip_address', 'user_agent', 'referer']
-    readonly_fields = ['short_url_id', 'accessed_at', 'ip_address', 'user_agent', 'referer']
-
-
 @admin.register(ShortUrls)
 class ShortUrlsAdmin(admin.ModelAdmin):
     list_display = [
@@ -53,29 +41,78 @@ class ShortUrlsAdmin(admin.ModelAdmin):
 
     @admin.display(description='short URL!!!')
     def display_short_url(self, obj):
-        return f'{settings.SITE_URL}/{ShortUrlService.encode(obj.id)}'
-
-    inlines = [
-        AccessLogInline,
-    ]
+        return f'{settings.SITE_URL}/{obj.alias or ShortUrlService.encode(obj.id)}'
+
+    @admin.display(description='recent access logs')
+    def recent_logs(self, obj):
+        # The newest few from accesslog_url_time_idx, instead of an inline of every row.
+        if obj is None or obj.pk is None:
+            return '-'
+        logs = obj.logs.order_by('-accessed_at')[: settings.SHORTURL_ADMIN_RECENT_LOGS]
+        rows = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            (
+                (log.accessed_at, log.ip_address or '-', log.user_agent, log.referer or '-')
+                for log in logs
+            ),
+        )
+        changelist = reverse('admin:shorturl_accesslog_changelist')
+        return format_html(
+            '<table><tr><th>accessed at</th><th>IP</th><th>user agent</th><th>referer</th></tr>'
+            '{}</table><a href="{}?short_url_id={}">All access logs of this link</a>',
+            rows,
+            changelist,
+            obj.pk,
+        )
 
     list_filter = ['is_deleted', 'is_active']
     list_per_page = 25
-    search_fields = ('original_url',)
-    ordering = (
-        'create_at',
-        '-clicks_count',
-    )
+    # No COUNT(*) over the whole table: estimated page count, no "N total" link.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ('original_url', '=alias')
+    # The primary key follows creation order and, unlike create_at, is indexed.
+    ordering = ('id',)
 
+    readonly_fields = ['recent_logs']
     fieldsets = [
         (
             None,
             {'fields': ['original_url', 'expires_at', 'is_active']},
         ),
+        (
+            'Access logs',
+            {'fields': ['recent_logs']},
+        ),
     ]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ShortUrlCache.set(obj)
+
+    def delete_model(self, request, obj):
+        short_url_id = obj.id
+        super().delete_model(request, obj)
+        ShortUrlCache.invalidate(short_url_id)
+
+    def delete_queryset(self, request, queryset):
+        short_url_ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        ShortUrlCache.invalidate_many(short_url_ids)
+
 
 @admin.register(AccessLog)
 class AccessLogAdmin(admin.ModelAdmin):
     list_display = ['short_url_id', 'accessed_at', 'ip_address', 'user_agent', 'referer']
+    list_select_related = ['short_url_id']
+    raw_id_fields = ['short_url_id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ('id',)
+
+    def get_ordering(self, request):
+        # One link's logs (the "recent access logs" link) read accesslog_url_time_idx.
+        if 'short_url_id' in request.GET:
+            return ('-accessed_at',)
+        return super().get_ordering(request)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ShorturlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shorturl'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_query_metrics
+
+        connection_created.connect(install_query_metrics, dispatch_uid='shorturl_query_metrics')
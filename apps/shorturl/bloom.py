@@ -0,0 +1,221 @@
+"""In-process Bloom filter of existing ShortUrls ids for the redirect path.
+
+It answers "certainly unknown" for ids that were never issued, so scanners
+probing random codes get their 404 without a cache or DB round trip. The filter
+is built from the DB in a background thread on first use, extended every
+SHORTURL_BLOOM_REFRESH_INTERVAL seconds and rebuilt every
+SHORTURL_BLOOM_REBUILD_INTERVAL seconds (which drops ids the reaper deleted).
+Requests never wait for this: they keep using the current snapshot, or skip
+the filter until the first one is built, and a new snapshot is swapped in
+whole.
+
+Two bounds keep it from ever rejecting a live id:
+
+* ``watermark``: only ids up to it were added. Rows younger than
+  SHORTURL_BLOOM_SETTLE_SECONDS are left out, so a transaction that committed
+  late cannot slip under the watermark unseen. Ids above it are not judged.
+  With leased id blocks (ids.py) an id can be inserted well after larger ones,
+  so the watermark only counts rows older than the settle time plus the block
+  lifetime; the newer settled rows are added but not trusted yet.
+* ``ceiling``: the largest id in the table, or leased by the id allocator,
+  plus SHORTURL_BLOOM_ID_HEADROOM. Ids above it do not exist yet, but only
+  while the ceiling is less than SHORTURL_BLOOM_MIN_REFRESH_SECONDS old. Past
+  that, such an id is looked up as usual and the ceiling re-measured in the
+  background.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from functools import cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .ids import get_id_allocator, insert_delay
+from .models import ShortUrls
+from .pagination import estimate_count
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+_HASH_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+
+
+class BloomFilter:
+    """Bit array sized for ``capacity`` items at ``error_rate``, capped at ``max_bytes``."""
+
+    def __init__(self, capacity: int, error_rate: float, max_bytes: int):
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        if bits > max_bytes * 8:
+            logger.warning(
+                'Bloom filter for %s ids needs %s bytes, capped at %s; expect more false positives',
+                capacity,
+                bits // 8,
+                max_bytes,
+            )
+            bits = max_bytes * 8
+
+        self.size = max(bits, 64)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: int):
+        # Double hashing with two multiplicative hashes: integer math only.
+        first = (value * _HASH_MULTIPLIERS[0]) & _MASK64
+        second = ((value * _HASH_MULTIPLIERS[1]) & _MASK64) | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value: int) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value)
+        )
+
+
+class BloomSnapshot(NamedTuple):
+    filter: BloomFilter
+    watermark: int
+    ceiling: int
+    # time.monotonic() when the ceiling was measured
+    measured_at: float
+
+
+class ShortUrlBloom:
+    def __init__(self):
+        # Held by the one refresh running at a time; requests never wait for it.
+        self._lock = threading.Lock()
+        self.snapshot = None
+        self._built_at = self._extended_at = -math.inf
+
+    def might_exist(self, short_url_id: int) -> bool:
+        """False only if ``short_url_id`` is certainly not a ShortUrls id."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return True
+        if short_url_id > snapshot.ceiling:
+            age = time.monotonic() - snapshot.measured_at
+            return age >= settings.SHORTURL_BLOOM_MIN_REFRESH_SECONDS
+        return short_url_id > snapshot.watermark or short_url_id in snapshot.filter
+
+    def refresh_due(self, short_url_id: int) -> bool:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return True
+        now = time.monotonic()
+        if short_url_id > snapshot.ceiling:
+            return now - snapshot.measured_at >= settings.SHORTURL_BLOOM_MIN_REFRESH_SECONDS
+        return now - self._extended_at >= settings.SHORTURL_BLOOM_REFRESH_INTERVAL
+
+    def schedule_refresh(self, short_url_id: int) -> None:
+        """Start a background refresh if one is due and none is running."""
+        # Not from inside a transaction: the refresh reads on its own connection,
+        # which cannot see what that transaction has not committed yet.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or not self.refresh_due(short_url_id):
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(
+                target=self._run, args=(short_url_id,), name='shorturl-bloom', daemon=True
+            ).start()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def _run(self, short_url_id: int) -> None:
+        try:
+            self._refresh(short_url_id)
+        except Exception:
+            logger.exception('Bloom filter refresh failed; keeping the previous snapshot')
+        finally:
+            self._lock.release()
+            connections.close_all()
+
+    def refresh(self, short_url_id: int) -> None:
+        """Refresh in the calling thread, e.g. to warm the filter up before serving."""
+        with self._lock:
+            self._refresh(short_url_id)
+
+    def _refresh(self, short_url_id: int) -> None:
+        # Another refresh may have run since this one was scheduled.
+        if not self.refresh_due(short_url_id):
+            return
+        now = time.monotonic()
+        if now - self._built_at >= settings.SHORTURL_BLOOM_REBUILD_INTERVAL:
+            self.snapshot = self._rebuild()
+            self._built_at = self._extended_at = now
+        elif now - self._extended_at >= settings.SHORTURL_BLOOM_REFRESH_INTERVAL:
+            self.snapshot = self._extend(self.snapshot)
+            self._extended_at = now
+        else:
+            # Early refresh for an id above the ceiling: one indexed MAX(id).
+            self.snapshot = self.snapshot._replace(
+                ceiling=self._ceiling(), measured_at=time.monotonic()
+            )
+
+    @staticmethod
+    def _settled():
+        """Rows past the settle time; ``trusted`` ones may raise the watermark."""
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.SHORTURL_BLOOM_SETTLE_SECONDS)
+        trusted = cutoff - timedelta(seconds=insert_delay())
+        return ShortUrls._base_manager.filter(create_at__lte=cutoff).annotate(
+            trusted=Q(create_at__lte=trusted)
+        )
+
+    @staticmethod
+    def _ceiling() -> int:
+        allocator = get_id_allocator()
+        if allocator is not None:
+            max_id = allocator.issued_max()
+        else:
+            # From the primary: a lagging replica would turn away brand-new ids.
+            rows = ShortUrls._base_manager.using(DEFAULT_DB_ALIAS)
+            max_id = rows.aggregate(max_id=Max('pk'))['max_id'] or 0
+        return max_id + settings.SHORTURL_BLOOM_ID_HEADROOM
+
+    def _rebuild(self) -> BloomSnapshot:
+        # Every row, not only live ones: an expired link can still be extended.
+        bloom = BloomFilter(
+            int(estimate_count(ShortUrls._base_manager.all()) * settings.SHORTURL_BLOOM_GROWTH)
+            + 1024,
+            settings.SHORTURL_BLOOM_ERROR_RATE,
+            settings.SHORTURL_BLOOM_MAX_BYTES,
+        )
+        watermark = 0
+        rows = self._settled().values_list('pk', 'trusted').iterator(chunk_size=10_000)
+        for pk, trusted in rows:
+            bloom.add(pk)
+            if trusted:
+                watermark = max(watermark, pk)
+
+        return BloomSnapshot(bloom, watermark, self._ceiling(), time.monotonic())
+
+    def _extend(self, snapshot: BloomSnapshot) -> BloomSnapshot:
+        # Bits are only ever set, so readers of the shared filter stay correct;
+        # the new watermark is published with the snapshot, after its ids.
+        watermark = snapshot.watermark
+        rows = self._settled().filter(pk__gt=watermark).values_list('pk', 'trusted')
+        for pk, trusted in rows:
+            snapshot.filter.add(pk)
+            if trusted:
+                watermark = max(watermark, pk)
+
+        return BloomSnapshot(snapshot.filter, watermark, self._ceiling(), time.monotonic())
+
+
+@cache
+def get_bloom() -> ShortUrlBloom:
+    return ShortUrlBloom()
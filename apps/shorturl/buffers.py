@@ -0,0 +1,380 @@
+import atexit
+import ipaddress
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import UTC, datetime
+from functools import cache
+from itertools import batched
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from . import rollups
+from .models import AccessLog, ShortUrls
+from .redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LocalClickBuffer:
+    """In-process click accumulator, used when Redis is not configured.
+
+    A Celery worker cannot see another process's memory, so this buffer flushes
+    itself from the request path once SHORTURL_CLICK_FLUSH_INTERVAL has elapsed,
+    and once more when the process exits. Clicks wait for the next redirect in
+    the same process past the interval, and a killed process loses them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._last_flush = time.monotonic()
+        # Worker recycling and redeploys end the process without another redirect.
+        atexit.register(self._flush)
+
+    def _add(self, short_url_id: int, amount: int) -> bool:
+        with self._lock:
+            self._pending[short_url_id] += amount
+            due = time.monotonic() - self._last_flush >= settings.SHORTURL_CLICK_FLUSH_INTERVAL
+            if due:
+                self._last_flush = time.monotonic()
+        return due
+
+    def _flush(self) -> None:
+        # Runs inside a redirect, which must not fail because of it: flush_clicks
+        # keeps the deltas of a failed flush for the next one.
+        if not self._pending:
+            return
+        try:
+            flush_clicks(self)
+        except Exception:
+            logger.exception('Click flush failed; deltas kept for the next flush')
+
+    def incr(self, short_url_id: int, amount: int = 1) -> None:
+        if self._add(short_url_id, amount):
+            self._flush()
+
+    async def aincr(self, short_url_id: int, amount: int = 1) -> None:
+        if self._add(short_url_id, amount):
+            await sync_to_async(self._flush)()
+
+    def pending(self, short_url_id: int) -> int:
+        return self._pending.get(short_url_id, 0)
+
+    def pending_many(self, short_url_ids) -> dict[int, int]:
+        return {pk: self._pending.get(pk, 0) for pk in short_url_ids}
+
+    def drain(self) -> dict[int, int]:
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        return dict(pending)
+
+    def restore(self, deltas: dict[int, int]) -> None:
+        with self._lock:
+            self._pending.update(deltas)
+
+
+class RedisClickBuffer:
+    """Click counters kept in one Redis hash (HINCRBY per redirect)."""
+
+    KEY = 'shorturl:clicks:pending'
+
+    # HGETALL + DEL in one step so increments that race the flush are never lost.
+    DRAIN_SCRIPT = """
+    local pending = redis.call('HGETALL', KEYS[1])
+    redis.call('DEL', KEYS[1])
+    return pending
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._drain = client.register_script(self.DRAIN_SCRIPT)
+
+    def incr(self, short_url_id: int, amount: int = 1) -> None:
+        self.client.hincrby(self.KEY, short_url_id, amount)
+
+    async def aincr(self, short_url_id: int, amount: int = 1) -> None:
+        await get_async_redis().hincrby(self.KEY, short_url_id, amount)
+
+    def pending(self, short_url_id: int) -> int:
+        return int(self.client.hget(self.KEY, short_url_id) or 0)
+
+    def pending_many(self, short_url_ids) -> dict[int, int]:
+        short_url_ids = list(short_url_ids)
+        if not short_url_ids:
+            return {}
+        values = self.client.hmget(self.KEY, short_url_ids)
+        return {pk: int(value or 0) for pk, value in zip(short_url_ids, values, strict=True)}
+
+    def drain(self) -> dict[int, int]:
+        flat = self._drain(keys=[self.KEY])
+        return {int(pk): int(delta) for pk, delta in batched(flat, 2, strict=True)}
+
+    def restore(self, deltas: dict[int, int]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for pk, delta in deltas.items():
+            pipe.hincrby(self.KEY, pk, delta)
+        pipe.execute()
+
+
+@cache
+def get_click_buffer() -> LocalClickBuffer | RedisClickBuffer:
+    client = get_redis()
+    return RedisClickBuffer(client) if client else LocalClickBuffer()
+
+
+def flush_clicks(buffer=None) -> int:
+    """Apply pending click deltas to ShortUrls.clicks_count, one UPDATE per batch."""
+    buffer = buffer or get_click_buffer()
+    deltas = buffer.drain()
+
+    # Sorted ids keep row lock order stable between concurrent flushes.
+    chunks = list(
+        batched(sorted(deltas.items()), settings.SHORTURL_CLICK_FLUSH_BATCH, strict=False)
+    )
+    flushed = 0
+    for index, chunk in enumerate(chunks):
+        try:
+            # _base_manager: clicks on a link that expired meanwhile still count.
+            ShortUrls._base_manager.filter(pk__in=[pk for pk, _ in chunk]).update(
+                clicks_count=F('clicks_count')
+                + Case(*(When(pk=pk, then=Value(delta)) for pk, delta in chunk), default=0)
+            )
+        except Exception:
+            buffer.restore({pk: delta for rest in chunks[index:] for pk, delta in rest})
+            raise
+        flushed += sum(delta for _, delta in chunk)
+
+    return flushed
+
+
+class LocalLogBuffer:
+    """In-process access log queue, used when Redis is not configured.
+
+    Like LocalClickBuffer it drains itself from the request path, once it holds
+    SHORTURL_LOG_BATCH_SIZE records or SHORTURL_LOG_FLUSH_INTERVAL has elapsed,
+    and drains what is left when the process exits. A killed process loses its
+    queued records.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = deque()
+        self._last_flush = time.monotonic()
+        atexit.register(self._drain_all)
+
+    def _append(self, record: list) -> bool:
+        with self._lock:
+            self._records.append(record)
+            due = (
+                len(self._records) >= settings.SHORTURL_LOG_BATCH_SIZE
+                or time.monotonic() - self._last_flush >= settings.SHORTURL_LOG_FLUSH_INTERVAL
+            )
+            if due:
+                self._last_flush = time.monotonic()
+        return due
+
+    def _drain(self) -> None:
+        # One chunk per trigger: under steady traffic a full drain would never end,
+        # and the request that triggered it would wait the whole time. Errors are
+        # logged, not raised into the redirect; the chunk stays queued.
+        try:
+            drain_access_logs(self, max_chunks=1)
+        except Exception:
+            logger.exception('Access log drain failed; records kept for the next drain')
+
+    def _drain_all(self) -> None:
+        # At exit there is no later trigger: everything, within the drain time limit.
+        if not self._records:
+            return
+        try:
+            drain_access_logs(self)
+        except Exception:
+            logger.exception('Access log drain at exit failed; %s records lost', self.depth())
+
+    def push(self, record: list) -> None:
+        if self._append(record):
+            self._drain()
+
+    async def apush(self, record: list) -> None:
+        if self._append(record):
+            await sync_to_async(self._drain)()
+
+    def pop(self, count: int) -> list[list]:
+        with self._lock:
+            return [self._records.popleft() for _ in range(min(count, len(self._records)))]
+
+    def requeue(self, records: list[list]) -> None:
+        with self._lock:
+            self._records.extendleft(reversed(records))
+
+    def depth(self) -> int:
+        return len(self._records)
+
+    def oldest(self) -> float | None:
+        """Timestamp of the oldest queued record."""
+        records = self._records
+        return records[0][1] if records else None
+
+
+class RedisLogBuffer:
+    """Access log records kept as compact JSON arrays in one Redis list."""
+
+    KEY = 'shorturl:logs:pending'
+
+    def __init__(self, client):
+        self.client = client
+
+    def push(self, record: list) -> None:
+        self.client.rpush(self.KEY, json.dumps(record, separators=(',', ':')))
+
+    async def apush(self, record: list) -> None:
+        await get_async_redis().rpush(self.KEY, json.dumps(record, separators=(',', ':')))
+
+    def pop(self, count: int) -> list[list]:
+        return [json.loads(item) for item in self.client.lpop(self.KEY, count) or []]
+
+    def requeue(self, records: list[list]) -> None:
+        if records:
+            self.client.lpush(self.KEY, *(json.dumps(record) for record in reversed(records)))
+
+    def depth(self) -> int:
+        return self.client.llen(self.KEY)
+
+    def oldest(self) -> float | None:
+        record = self.client.lindex(self.KEY, 0)
+        return json.loads(record)[1] if record else None
+
+
+@cache
+def get_log_buffer() -> LocalLogBuffer | RedisLogBuffer:
+    client = get_redis()
+    return RedisLogBuffer(client) if client else LocalLogBuffer()
+
+
+def _valid_ip(value: str | None) -> str | None:
+    try:
+        return str(ipaddress.ip_address(value.strip())) if value else None
+    except ValueError:
+        return None
+
+
+def access_record(short_url_id: int, ip_address, user_agent: str, referer) -> list:
+    # Clean up front: one invalid IP or over-long value would otherwise fail the
+    # whole bulk insert.
+    return [
+        short_url_id,
+        time.time(),
+        _valid_ip(ip_address),
+        user_agent[:1024],
+        referer[:2048] if referer else referer,
+    ]
+
+
+LOG_STATS_KEY = 'shorturl:logs:stats'
+
+
+def _access_logs(records: list[list]) -> list[AccessLog]:
+    # One query per chunk instead of a ShortUrls.objects.get per record;
+    # links that were hard-deleted meanwhile are dropped.
+    known_ids = set(
+        ShortUrls._base_manager.filter(pk__in={record[0] for record in records}).values_list(
+            'pk', flat=True
+        )
+    )
+    return [
+        AccessLog(
+            short_url_id_id=short_url_id,
+            accessed_at=datetime.fromtimestamp(accessed_at, tz=UTC),
+            # Also cleans records queued before access_record() validated IPs.
+            ip_address=_valid_ip(ip_address),
+            user_agent=user_agent,
+            referer=referer,
+        )
+        for short_url_id, accessed_at, ip_address, user_agent, referer in records
+        if short_url_id in known_ids
+    ]
+
+
+def _store_access_logs(records: list[list]) -> list[AccessLog]:
+    logs = _access_logs(records)
+    # Logs and rollups commit together, so a requeued chunk is never counted twice.
+    with transaction.atomic():
+        AccessLog.objects.bulk_create(logs, batch_size=settings.SHORTURL_LOG_BATCH_SIZE)
+        rollups.record(logs)
+    return logs
+
+
+def _store_each(buffer, records: list[list]) -> list[AccessLog]:
+    stored = []
+    for index, record in enumerate(records):
+        try:
+            stored += _store_access_logs([record])
+        except (ValueError, DataError, IntegrityError):
+            logger.exception('Discarding access log record %r', record)
+        except Exception:
+            buffer.requeue(records[index:])
+            raise
+    return stored
+
+
+def drain_access_logs(buffer=None, max_chunks: int | None = None) -> dict:
+    """Move queued access records into AccessLog with bulk_create, in chunks.
+
+    Each chunk also updates the click rollups (shorturl.rollups).
+
+    A chunk that fails on a database or connection error goes back to the head
+    of the queue and the error is raised. A chunk that fails on bad data is
+    stored record by record, and the failing records are discarded (counted as
+    dropped).
+
+    Stops when the queue is empty, after ``max_chunks`` chunks or after
+    SHORTURL_LOG_DRAIN_MAX_SECONDS, and returns the run's throughput and the
+    remaining queue depth.
+    """
+    buffer = buffer or get_log_buffer()
+    batch_size = settings.SHORTURL_LOG_BATCH_SIZE
+    started = time.monotonic()
+    stored = dropped = chunks = 0
+
+    while time.monotonic() - started < settings.SHORTURL_LOG_DRAIN_MAX_SECONDS:
+        if max_chunks is not None and chunks >= max_chunks:
+            break
+        chunks += 1
+        records = buffer.pop(batch_size)
+        if not records:
+            break
+
+        try:
+            logs = _store_access_logs(records)
+        except (ValueError, DataError, IntegrityError):
+            # A bad record would fail its chunk forever if requeued: store the
+            # chunk record by record and discard the ones that fail.
+            logs = _store_each(buffer, records)
+        except Exception:
+            buffer.requeue(records)
+            raise
+
+        stored += len(logs)
+        dropped += len(records) - len(logs)
+
+    elapsed = time.monotonic() - started
+    stats = {
+        'stored': stored,
+        'dropped': dropped,
+        'seconds': round(elapsed, 4),
+        'logs_per_second': round(stored / elapsed, 1) if elapsed else 0.0,
+        'queue_depth': buffer.depth(),
+    }
+    if stored or dropped:
+        caches[settings.SHORTURL_CACHE_ALIAS].set(LOG_STATS_KEY, stats, None)
+        logger.info(
+            'Stored %(stored)s access logs (%(logs_per_second)s/s), %(queue_depth)s queued', stats
+        )
+    return stats
@@ -0,0 +1,252 @@
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .bloom import get_bloom
+from .metrics import CACHE_LOOKUPS
+from .models import ShortUrls
+from .replicas import afirst_or_primary, first_or_primary
+from .stampede import SingleFlight, Stamped, refresh_early
+
+
+class RedirectEntry(NamedTuple):
+    id: int
+    original_url: str
+    is_active: bool
+    expires_at: datetime
+
+    def is_live(self) -> bool:
+        return self.is_active and self.expires_at > timezone.now()
+
+
+class ShortUrlCache:
+    """Read-through cache for the redirect path, keyed by the decoded ShortUrls id.
+
+    Ids without a live row are cached as MISSING for SHORTURL_NEGATIVE_CACHE_TIMEOUT
+    seconds, and ids the Bloom filter rules out are not looked up at all. Entries
+    are stored Stamped, so a hot one is reloaded just before it expires, and
+    concurrent misses for one id share a single DB query (see shorturl.stampede).
+    """
+
+    KEY_PREFIX = 'shorturl:redirect:'
+    # Alias -> id. Aliases never change, so the mapping needs no invalidation on updates.
+    ALIAS_KEY_PREFIX = 'shorturl:alias:'
+    # Stored for ids without a live row; None already means "not cached".
+    MISSING = False
+
+    _flights = SingleFlight()
+
+    @staticmethod
+    def _cache():
+        return caches[settings.SHORTURL_CACHE_ALIAS]
+
+    @classmethod
+    def key(cls, short_url_id: int) -> str:
+        return f'{cls.KEY_PREFIX}{short_url_id}'
+
+    @classmethod
+    def alias_key(cls, alias: str) -> str:
+        return f'{cls.ALIAS_KEY_PREFIX}{alias}'
+
+    @staticmethod
+    def timeout_for(expires_at: datetime) -> int:
+        # 0 tells the Django cache API not to store the value at all.
+        remaining = int((expires_at - timezone.now()).total_seconds())
+        return max(0, min(remaining, settings.SHORTURL_CACHE_TIMEOUT))
+
+    @staticmethod
+    def _queryset(short_url_id: int):
+        return ShortUrls.objects.filter(pk=short_url_id).values_list(
+            'id', 'original_url', 'is_active', 'expires_at'
+        )
+
+    @classmethod
+    def _load(cls, short_url_id: int) -> RedirectEntry | None:
+        row = first_or_primary(cls._queryset(short_url_id))
+        return RedirectEntry(*row) if row else None
+
+    @classmethod
+    async def _aload(cls, short_url_id: int) -> RedirectEntry | None:
+        row = await afirst_or_primary(cls._queryset(short_url_id))
+        return RedirectEntry(*row) if row else None
+
+    @staticmethod
+    def _alias_queryset(alias: str):
+        return ShortUrls.objects.filter(alias=alias).values_list(
+            'id', 'original_url', 'is_active', 'expires_at'
+        )
+
+    @staticmethod
+    def _unknown(short_url_id: int) -> bool:
+        if not settings.SHORTURL_BLOOM_ENABLED:
+            return False
+        bloom = get_bloom()
+        bloom.schedule_refresh(short_url_id)
+        return not bloom.might_exist(short_url_id)
+
+    @classmethod
+    def _store(cls, cache, key: str, entry: RedirectEntry | None, delta: float = 0.0) -> None:
+        if entry is None:
+            cache.set(key, cls.MISSING, settings.SHORTURL_NEGATIVE_CACHE_TIMEOUT)
+            return
+        timeout = cls.timeout_for(entry.expires_at)
+        cache.set(key, Stamped.wrap(entry, delta, timeout), timeout)
+
+    @classmethod
+    def _fill(cls, cache, key: str, short_url_id: int) -> RedirectEntry | None:
+        started = time.perf_counter()
+        entry = cls._load(short_url_id)
+        cls._store(cache, key, entry, time.perf_counter() - started)
+        return entry
+
+    @classmethod
+    async def _afill(cls, cache, key: str, short_url_id: int) -> RedirectEntry | None:
+        started = time.perf_counter()
+        entry = await cls._aload(short_url_id)
+        delta = time.perf_counter() - started
+        if entry is None:
+            await cache.aset(key, cls.MISSING, settings.SHORTURL_NEGATIVE_CACHE_TIMEOUT)
+        else:
+            timeout = cls.timeout_for(entry.expires_at)
+            await cache.aset(key, Stamped.wrap(entry, delta, timeout), timeout)
+        return entry
+
+    @staticmethod
+    def _cached(value) -> RedirectEntry | None:
+        """The cached entry or MISSING; None when not cached or due for an early refresh."""
+        if value is None:
+            CACHE_LOOKUPS.inc('miss')
+            return None
+        if isinstance(value, Stamped):
+            if refresh_early(value):
+                CACHE_LOOKUPS.inc('early_refresh')
+                return None
+            value = value.value
+        CACHE_LOOKUPS.inc('hit' if value else 'negative')
+        return value
+
+    @classmethod
+    def get(cls, short_url_id: int) -> RedirectEntry | None:
+        """Return the live entry for ``short_url_id``, loading it from the DB on a miss."""
+        if cls._unknown(short_url_id):
+            CACHE_LOOKUPS.inc('bloom_reject')
+            return None
+        return cls._get(short_url_id)
+
+    @classmethod
+    def _get(cls, short_url_id: int) -> RedirectEntry | None:
+        cache = cls._cache()
+        key = cls.key(short_url_id)
+
+        entry = cls._cached(cache.get(key))
+        if entry is None:
+            entry = cls._flights.do(key, lambda: cls._fill(cache, key, short_url_id))
+
+        return entry if entry and entry.is_live() else None
+
+    @classmethod
+    async def aget(cls, short_url_id: int) -> RedirectEntry | None:
+        """Async counterpart of get() for the ASGI redirect view."""
+        if cls._unknown(short_url_id):
+            CACHE_LOOKUPS.inc('bloom_reject')
+            return None
+        return await cls._aget(short_url_id)
+
+    @classmethod
+    async def _aget(cls, short_url_id: int) -> RedirectEntry | None:
+        cache = cls._cache()
+        key = cls.key(short_url_id)
+
+        entry = cls._cached(await cache.aget(key))
+        if entry is None:
+            entry = await cls._flights.ado(key, lambda: cls._afill(cache, key, short_url_id))
+
+        return entry if entry and entry.is_live() else None
+
+    @classmethod
+    def _fill_alias(cls, cache, key: str, row) -> RedirectEntry | None:
+        if row is None:
+            cache.set(key, cls.MISSING, settings.SHORTURL_NEGATIVE_CACHE_TIMEOUT)
+            return None
+        entry = RedirectEntry(*row)
+        cache.set(key, entry.id, settings.SHORTURL_CACHE_TIMEOUT)
+        cls._store(cache, cls.key(entry.id), entry)
+        return entry
+
+    @classmethod
+    def get_alias(cls, alias: str) -> RedirectEntry | None:
+        """get() for a vanity alias: one unique-index lookup on a miss, then cached by id."""
+        cache = cls._cache()
+        key = cls.alias_key(alias)
+
+        short_url_id = cache.get(key)
+        if short_url_id is None:
+            CACHE_LOOKUPS.inc('miss')
+            entry = cls._flights.do(
+                key,
+                lambda: cls._fill_alias(cache, key, first_or_primary(cls._alias_queryset(alias))),
+            )
+            return entry if entry and entry.is_live() else None
+        if short_url_id is cls.MISSING:
+            CACHE_LOOKUPS.inc('negative')
+            return None
+        # The id comes from the table itself: no Bloom filter check.
+        return cls._get(short_url_id)
+
+    @classmethod
+    async def _afill_alias(cls, cache, key: str, alias: str) -> RedirectEntry | None:
+        row = await afirst_or_primary(cls._alias_queryset(alias))
+        if row is None:
+            await cache.aset(key, cls.MISSING, settings.SHORTURL_NEGATIVE_CACHE_TIMEOUT)
+            return None
+        entry = RedirectEntry(*row)
+        await cache.aset(key, entry.id, settings.SHORTURL_CACHE_TIMEOUT)
+        timeout = cls.timeout_for(entry.expires_at)
+        await cache.aset(cls.key(entry.id), Stamped.wrap(entry, 0.0, timeout), timeout)
+        return entry
+
+    @classmethod
+    async def aget_alias(cls, alias: str) -> RedirectEntry | None:
+        """Async counterpart of get_alias()."""
+        cache = cls._cache()
+        key = cls.alias_key(alias)
+
+        short_url_id = await cache.aget(key)
+        if short_url_id is None:
+            CACHE_LOOKUPS.inc('miss')
+            entry = await cls._flights.ado(key, lambda: cls._afill_alias(cache, key, alias))
+            return entry if entry and entry.is_live() else None
+        if short_url_id is cls.MISSING:
+            CACHE_LOOKUPS.inc('negative')
+            return None
+        return await cls._aget(short_url_id)
+
+    @classmethod
+    def set(cls, instance: ShortUrls) -> None:
+        if instance.is_deleted:
+            cls.invalidate(instance.id)
+            return
+
+        entry = RedirectEntry(
+            instance.id, instance.original_url, instance.is_active, instance.expires_at
+        )
+        cls._store(cls._cache(), cls.key(instance.id), entry)
+
+    @classmethod
+    def invalidate(cls, short_url_id: int) -> None:
+        cls._cache().delete(cls.key(short_url_id))
+
+    @classmethod
+    def invalidate_many(cls, short_url_ids) -> None:
+        cls._cache().delete_many([cls.key(pk) for pk in short_url_ids])
+
+    @classmethod
+    def invalidate_aliases(cls, aliases) -> None:
+        """Drop alias mappings: negative entries after a create, stale ids after a delete."""
+        keys = [cls.alias_key(alias) for alias in aliases if alias]
+        if keys:
+            cls._cache().delete_many(keys)
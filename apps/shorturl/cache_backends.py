@@ -0,0 +1,183 @@
+"""Two-tier Django cache backend: a bounded in-process LRU in front of a shared cache.
+
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', ...},
+        'tiered': {
+            'BACKEND': 'shorturl.cache_backends.TieredCache',
+            'LOCATION': 'default',  # alias of the shared (L2) cache
+            'OPTIONS': {'MAX_ENTRIES': 10_000, 'L1_TIMEOUT': 5},
+        },
+    }
+
+Reads are served from L1 when possible and fill it from L2 otherwise; writes
+and deletes go to both. Other processes only see a write or delete in L2, so an
+L1 entry can be stale for at most L1_TIMEOUT seconds. Misses are never kept in
+L1. Counters (incr/decr) are left to L2, where Redis keeps them atomic.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Bounded LRU of pickled values with per-entry deadlines, shared by threads."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (pickled value, monotonic deadline), least recently used first.
+        self._items = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISSING
+            if item[1] <= time.monotonic():
+                del self._items[key]
+                return _MISSING
+            self._items.move_to_end(key)
+        return pickle.loads(item[0])
+
+    def set(self, key: str, value, ttl: float) -> None:
+        if ttl <= 0:
+            self.forget(key)
+            return
+        item = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.monotonic() + ttl)
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+# django.core.cache.caches builds a backend instance per thread; the L1 data
+# must be per process, so it lives here, keyed by LOCATION as in LocMemCache.
+_l1_stores = {}
+_l1_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._l2_alias = location
+        self._l1_timeout = params.get('OPTIONS', {}).get('L1_TIMEOUT', 5)
+        with _l1_stores_lock:
+            self._l1 = _l1_stores.setdefault(location, LocalLRU(self._max_entries))
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self._l2_alias]
+
+    def _l1_ttl(self, timeout) -> float:
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._l1_timeout
+        return min(timeout, self._l1_timeout)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        value = self._l1.get(l1_key)
+        if value is _MISSING:
+            value = self.l2.get(key, _MISSING, version=version)
+            if value is _MISSING:
+                return default
+            self._l1.set(l1_key, value, self._l1_timeout)
+        return value
+
+    async def aget(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        value = self._l1.get(l1_key)
+        if value is _MISSING:
+            value = await self.l2.aget(key, _MISSING, version=version)
+            if value is _MISSING:
+                return default
+            self._l1.set(l1_key, value, self._l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remaining = {}, []
+        for key in keys:
+            value = self._l1.get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        if remaining:
+            loaded = self.l2.get_many(remaining, version=version)
+            for key, value in loaded.items():
+                self._l1.set(self.make_key(key, version=version), value, self._l1_timeout)
+            found.update(loaded)
+        return found
+
+    def has_key(self, key, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        return self._l1.get(l1_key) is not _MISSING or self.l2.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1.set(l1_key, value, self._l1_ttl(timeout))
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        await self.l2.aset(key, value, timeout, version=version)
+        self._l1.set(l1_key, value, self._l1_ttl(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1.set(l1_key, value, self._l1_ttl(timeout))
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        ttl = self._l1_ttl(timeout)
+        for key, value in data.items():
+            self._l1.set(self.make_and_validate_key(key, version=version), value, ttl)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1.forget(self.make_and_validate_key(key, version=version))
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1.forget(self.make_and_validate_key(key, version=version))
+        return self.l2.delete(key, version=version)
+
+    async def adelete(self, key, version=None):
+        self._l1.forget(self.make_and_validate_key(key, version=version))
+        return await self.l2.adelete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._l1.forget(self.make_and_validate_key(key, version=version))
+        self.l2.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1.forget(self.make_and_validate_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1.forget(self.make_and_validate_key(key, version=version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        self._l1.clear()
+        self.l2.clear()
@@ -0,0 +1,6 @@
+"""PostgreSQL backend that times connection checkouts for /metrics.
+
+    DATABASES = {'default': {'ENGINE': 'shorturl.db_backends', ...}}
+
+Otherwise identical to django.db.backends.postgresql, including OPTIONS['pool'].
+"""
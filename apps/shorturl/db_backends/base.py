@@ -0,0 +1,15 @@
+import time
+
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        # Not at import: metrics imports the models, which load this backend.
+        from ..metrics import DB_CHECKOUT
+
+        # A new server connection, or with OPTIONS['pool'] a checkout from the pool.
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        DB_CHECKOUT.observe(time.perf_counter() - started, self.alias)
+        return connection
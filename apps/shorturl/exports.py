@@ -0,0 +1,162 @@
+"""Streaming CSV/NDJSON exports of ShortUrls and AccessLog.
+
+Rows are read with QuerySet.iterator(chunk_size=...), a server-side cursor on
+PostgreSQL, and written out one chunk at a time, optionally gzip-compressed, so
+memory stays flat however many rows an export has. The cursor is read inside a
+transaction: in autocommit Django declares it WITH HOLD, and PostgreSQL would
+then copy the whole result set aside before the first row is sent. With
+SHORTURL_DB_CONNECTIONS='pgbouncer' server-side cursors are disabled, so the
+database result is fetched whole before it is streamed.
+
+Used by the export actions of ShortUrlsViewSet and the export_data command.
+"""
+
+import csv
+import json
+import zlib
+from collections.abc import Iterator
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AccessLog, ShortUrls
+from .services import ShortUrlService
+
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+SHORT_URL_COLUMNS = (
+    'id',
+    'short_code',
+    'original_url',
+    'alias',
+    'create_at',
+    'expires_at',
+    'is_active',
+    'clicks_count',
+)
+ACCESS_LOG_COLUMNS = ('id', 'short_url_id', 'accessed_at', 'ip_address', 'user_agent', 'referer')
+
+
+def parse_moment(value: str | None) -> datetime | None:
+    """ISO 8601 date-time from a filter argument; naive values are in TIME_ZONE."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"'{value}' is not an ISO 8601 date-time.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _time_range(queryset, field: str, since: datetime | None, until: datetime | None):
+    if since is not None:
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{field}__lt': until})
+    return queryset
+
+
+def _iterate(queryset, chunk_size: int | None) -> Iterator[tuple]:
+    with transaction.atomic(using=queryset.db):
+        yield from queryset.iterator(chunk_size=chunk_size or settings.SHORTURL_EXPORT_CHUNK_SIZE)
+
+
+def short_url_rows(since=None, until=None, chunk_size=None) -> Iterator[tuple]:
+    """Live links created in [since, until), by id, as SHORT_URL_COLUMNS."""
+    queryset = _time_range(ShortUrls.objects.order_by('id'), 'create_at', since, until)
+    queryset = queryset.values_list(
+        'id', 'alias', 'original_url', 'create_at', 'expires_at', 'is_active', 'clicks_count'
+    )
+    for pk, alias, *rest in _iterate(queryset, chunk_size):
+        yield (pk, alias or ShortUrlService.encode(pk), rest[0], alias, *rest[1:])
+
+
+def access_log_rows(short_url=None, since=None, until=None, chunk_size=None) -> Iterator[tuple]:
+    """Clicks in [since, until) as ACCESS_LOG_COLUMNS.
+
+    For one short URL the rows come in time order (accesslog_url_time_idx);
+    otherwise in table order, which spares the database a sort of the whole range.
+    """
+    queryset = AccessLog.objects.order_by()
+    if short_url is not None:
+        queryset = queryset.filter(short_url_id=short_url).order_by('accessed_at')
+    queryset = _time_range(queryset, 'accessed_at', since, until)
+    yield from _iterate(queryset.values_list(*ACCESS_LOG_COLUMNS), chunk_size)
+
+
+class _Echo:
+    """File-like target for csv.writer: writerow() returns the formatted line."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _csv_cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def render(columns, rows, output: str, chunk_size: int | None = None) -> Iterator[bytes]:
+    """Encode ``rows`` as CSV (with a header line) or NDJSON, ``chunk_size`` rows per piece."""
+    if output == 'csv':
+        writer = csv.writer(_Echo())
+        lines = [writer.writerow(columns)]
+
+        def encode(row):
+            return writer.writerow([_csv_cell(value) for value in row])
+
+    elif output == 'ndjson':
+        lines = []
+
+        def encode(row):
+            return json.dumps(dict(zip(columns, row, strict=True)), cls=DjangoJSONEncoder) + '\n'
+
+    else:
+        raise ValueError(f"Unknown output format '{output}'.")
+
+    chunk_size = chunk_size or settings.SHORTURL_EXPORT_CHUNK_SIZE
+    for row in rows:
+        lines.append(encode(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines).encode()
+            lines = []
+    if lines:
+        yield ''.join(lines).encode()
+
+
+def gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(kind: str, output: str, *, compress=False, chunk_size=None, **filters):
+    """Bytes of a ``shorturls`` or ``logs`` export; ``filters`` go to its row function."""
+    if kind == 'shorturls':
+        columns, rows = SHORT_URL_COLUMNS, short_url_rows(chunk_size=chunk_size, **filters)
+    elif kind == 'logs':
+        columns, rows = ACCESS_LOG_COLUMNS, access_log_rows(chunk_size=chunk_size, **filters)
+    else:
+        raise ValueError(f"Unknown export '{kind}'.")
+    chunks = render(columns, rows, output, chunk_size)
+    return gzipped(chunks) if compress else chunks
+
+
+async def aiterate(chunks: Iterator[bytes]):
+    """Async view of a sync export for ASGI, one worker-thread hop per chunk.
+
+    An ASGI StreamingHttpResponse would otherwise read a sync iterator to the end
+    before sending anything. thread_sensitive keeps the cursor on one connection.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
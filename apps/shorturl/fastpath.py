@@ -0,0 +1,93 @@
+"""Redirect fast path: answer /<short_code>/ before the rest of the middleware.
+
+Sessions, CSRF, auth, messages, clickjacking and URL resolution do nothing for
+a redirect, yet they cost more CPU than the cache lookup itself. This
+middleware sits right after SecurityMiddleware (so HTTPS redirects and HSTS
+still apply) and hands GET/HEAD requests for a single path segment straight to
+the redirect view. Everything else goes down the normal stack, including
+unsafe methods, which must still meet CsrfViewMiddleware.
+
+Segments claimed by other routes in ROOT_URLCONF (``admin``, ``api``,
+``metrics``, ...) are never treated as short codes.
+"""
+
+import re
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import ResolverMatch, get_resolver
+from django.utils.functional import cached_property
+
+from .redirect_urls import redirect_view
+
+SAFE_METHODS = frozenset({'GET', 'HEAD'})
+REDIRECT_ROUTE = '<str:short_code>/'
+_LITERAL_SEGMENT = re.compile(r'[\w.-]+')
+
+
+def reserved_segments(urlconf=None) -> frozenset[str]:
+    """Leading path segments that belong to routes other than the redirect."""
+    segments = set()
+    for pattern in get_resolver(urlconf).url_patterns:
+        segment = str(pattern.pattern).removeprefix('^').split('/', 1)[0]
+        if _LITERAL_SEGMENT.fullmatch(segment):
+            segments.add(segment)
+    return frozenset(segments)
+
+
+class FastRedirectMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SHORTURL_FAST_REDIRECT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        view_is_async = iscoroutinefunction(redirect_view)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.view = redirect_view if view_is_async else sync_to_async(redirect_view)
+        else:
+            self.view = async_to_sync(redirect_view) if view_is_async else redirect_view
+
+    @cached_property
+    def reserved(self) -> frozenset[str]:
+        # Resolved on first use: the URLconf may import this module's neighbours.
+        return reserved_segments()
+
+    def short_code(self, request) -> str | None:
+        if request.method not in SAFE_METHODS:
+            return None
+        path = request.path_info
+        if len(path) < 3 or path[0] != '/' or path[-1] != '/':
+            return None
+        short_code = path[1:-1]
+        if '/' in short_code or short_code in self.reserved:
+            return None
+        return short_code
+
+    def _prepare(self, request, short_code: str) -> None:
+        # CommonMiddleware would reject a disallowed Host; keep that behaviour.
+        request.get_host()
+        # What URL resolution would have set; MetricsMiddleware labels by it.
+        request.resolver_match = ResolverMatch(
+            redirect_view, (), {'short_code': short_code}, url_name='redirect', route=REDIRECT_ROUTE
+        )
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        short_code = self.short_code(request)
+        if short_code is None:
+            return self.get_response(request)
+        self._prepare(request, short_code)
+        return self.view(request, short_code)
+
+    async def __acall__(self, request):
+        short_code = self.short_code(request)
+        if short_code is None:
+            return await self.get_response(request)
+        self._prepare(request, short_code)
+        return await self.view(request, short_code)
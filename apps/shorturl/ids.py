@@ -0,0 +1,159 @@
+"""Hi-Lo allocation of ShortUrls ids: each process leases blocks of ids.
+
+With SHORTURL_ID_ALLOCATOR set, a new link gets its id (and so its short code)
+before the INSERT, from a block of SHORTURL_ID_BLOCK_SIZE ids leased in one
+round trip. Bulk creates lease everything they need at once.
+
+* ``sequence``: the table's own PostgreSQL identity sequence,
+  ``nextval()`` over ``generate_series``. Rows inserted without an id (raw SQL,
+  other tools) keep drawing from the same sequence, so nothing can collide.
+* ``redis``: INCRBY on one counter in SHORTURL_REDIS_URL, raised to MAX(id)
+  on every lease. Every insert must then go through ShortUrls.save() or the
+  serializers, which take their ids from here.
+
+Ids left in a block are dropped after SHORTURL_ID_BLOCK_MAX_AGE seconds, and by
+a forked child. This bounds how long after its lease an id can still be
+inserted, and the Bloom filter (bloom.py) lags its watermark by that long. Ids
+are not dense: dropped and unused ids leave gaps.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from functools import cache, cached_property
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connections, router
+from django.db.models import Max
+from django.dispatch import receiver
+
+from .redis_client import get_redis
+
+
+class IdAllocator(ABC):
+    """Hands out ids from leased blocks; shared by the threads of a process."""
+
+    def __init__(self, block_size: int, max_age: float):
+        self.block_size = block_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._ids = deque()
+        self._leased_at = -max_age
+        self._pid = os.getpid()
+
+    def allocate(self) -> int:
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> list[int]:
+        with self._lock:
+            now = time.monotonic()
+            if self._pid != os.getpid() or now - self._leased_at > self.max_age:
+                self._ids.clear()
+                self._pid = os.getpid()
+            if len(self._ids) < count:
+                # Leftovers are dropped, not topped up: they keep their older lease time.
+                self._ids = deque(self._lease(max(count, self.block_size)))
+                self._leased_at = now
+            return [self._ids.popleft() for _ in range(count)]
+
+    @abstractmethod
+    def _lease(self, count: int) -> list[int]:
+        """``count`` new ids, in increasing order."""
+
+    @abstractmethod
+    def issued_max(self) -> int:
+        """Upper bound of every id leased so far, by any process."""
+
+
+class SequenceIdAllocator(IdAllocator):
+    def __init__(self, model, block_size: int, max_age: float):
+        super().__init__(block_size, max_age)
+        self.model = model
+
+    @cached_property
+    def _sequence(self) -> str:
+        # Looked up once: the sequence of a table does not change while it runs.
+        using = router.db_for_write(self.model)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)',
+                [self.model._meta.db_table, self.model._meta.pk.column],
+            )
+            return cursor.fetchone()[0]
+
+    def _execute(self, sql: str, params=()):
+        sequence = self._sequence
+        with connections[router.db_for_write(self.model)].cursor() as cursor:
+            cursor.execute(sql, [sequence, *params])
+            return cursor.fetchall()
+
+    def _lease(self, count: int) -> list[int]:
+        rows = self._execute('SELECT nextval(%s::regclass) FROM generate_series(1, %s)', [count])
+        return sorted(row[0] for row in rows)
+
+    def issued_max(self) -> int:
+        return self._execute('SELECT pg_sequence_last_value(%s::regclass)')[0][0] or 0
+
+
+class RedisIdAllocator(IdAllocator):
+    KEY = 'shorturl:ids'
+
+    # KEYS[1]: counter; ARGV: block size and the current MAX(id) as a floor.
+    LEASE_SCRIPT = """
+    if tonumber(redis.call('GET', KEYS[1]) or 0) < tonumber(ARGV[2]) then
+        redis.call('SET', KEYS[1], ARGV[2])
+    end
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+    """
+
+    def __init__(self, client, model, block_size: int, max_age: float):
+        super().__init__(block_size, max_age)
+        self.client = client
+        self.model = model
+        self._lease_script = client.register_script(self.LEASE_SCRIPT)
+
+    def _max_id(self) -> int:
+        return self.model._base_manager.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+    def _lease(self, count: int) -> list[int]:
+        high = int(self._lease_script(keys=[self.KEY], args=[count, self._max_id()]))
+        return list(range(high - count + 1, high + 1))
+
+    def issued_max(self) -> int:
+        return max(int(self.client.get(self.KEY) or 0), self._max_id())
+
+
+@cache
+def get_id_allocator() -> IdAllocator | None:
+    """The allocator selected by SHORTURL_ID_ALLOCATOR, or None (ids from the INSERT)."""
+    from .models import ShortUrls
+
+    kind = settings.SHORTURL_ID_ALLOCATOR
+    options = (settings.SHORTURL_ID_BLOCK_SIZE, settings.SHORTURL_ID_BLOCK_MAX_AGE)
+    if not kind:
+        return None
+    if kind == 'sequence':
+        if connections[router.db_for_write(ShortUrls)].vendor != 'postgresql':
+            raise ImproperlyConfigured("SHORTURL_ID_ALLOCATOR='sequence' requires PostgreSQL.")
+        return SequenceIdAllocator(ShortUrls, *options)
+    if kind == 'redis':
+        client = get_redis()
+        if client is None:
+            raise ImproperlyConfigured("SHORTURL_ID_ALLOCATOR='redis' requires SHORTURL_REDIS_URL.")
+        return RedisIdAllocator(client, ShortUrls, *options)
+    raise ImproperlyConfigured(f"Unknown SHORTURL_ID_ALLOCATOR '{kind}'.")
+
+
+def insert_delay() -> float:
+    """Longest time between an id's lease and its INSERT."""
+    return settings.SHORTURL_ID_BLOCK_MAX_AGE if settings.SHORTURL_ID_ALLOCATOR else 0
+
+
+@receiver(setting_changed)
+def _reset_allocator(*, setting, **kwargs):
+    if setting.startswith('SHORTURL_ID_'):
+        get_id_allocator.cache_clear()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shorturl import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming AccessLog partitions and drop the ones past retention.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            help='Override SHORTURL_ACCESSLOG_RETENTION_DAYS for this run.',
+        )
+        parser.add_argument(
+            '--list', action='store_true', help='Only list the existing partitions.'
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            self.stdout.write('AccessLog partitioning requires PostgreSQL; nothing to do.')
+            return
+
+        if not options['list']:
+            for name in partitions.ensure_partitions():
+                self.stdout.write(self.style.SUCCESS(f'Created {name}'))
+            for name in partitions.drop_expired_partitions(options['retention_days']):
+                self.stdout.write(self.style.WARNING(f'Dropped {name}'))
+
+        for name, lower, upper in partitions.list_partitions():
+            self.stdout.write(f'{name}: [{lower}, {upper})')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from shorturl.models import ShortUrls
+from shorturl.services import url_hash
+
+
+class Command(BaseCommand):
+    help = 'Fill ShortUrls.url_hash on rows created before the column existed, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        missing = ShortUrls._base_manager.filter(url_hash__isnull=True).order_by('pk')
+        filled = last_pk = 0
+        while True:
+            rows = list(
+                missing.filter(pk__gt=last_pk).only('pk', 'original_url')[: options['batch_size']]
+            )
+            if not rows:
+                break
+            for row in rows:
+                row.url_hash = url_hash(row.original_url)
+            ShortUrls._base_manager.bulk_update(rows, ['url_hash'])
+            filled += len(rows)
+            last_pk = rows[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f'Filled url_hash on {filled} links.'))
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shorturl import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream live short URLs or access logs as CSV or NDJSON, optionally gzipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['shorturls', 'logs'])
+        parser.add_argument('--output-format', choices=list(exports.CONTENT_TYPES), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument(
+            '--file', help='Write to this path instead of standard output.', default=None
+        )
+        parser.add_argument('--short-url', type=int, help='Only the logs of this short URL id.')
+        parser.add_argument('--since', help='ISO 8601 lower bound (inclusive).')
+        parser.add_argument('--until', help='ISO 8601 upper bound (exclusive).')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        filters = {}
+        try:
+            for name in ('since', 'until'):
+                filters[name] = exports.parse_moment(options[name])
+        except ValueError as error:
+            raise CommandError(error) from None
+        if options['short_url'] is not None:
+            if options['kind'] != 'logs':
+                raise CommandError('--short-url only applies to logs.')
+            filters['short_url'] = options['short_url']
+
+        chunks = exports.export(
+            options['kind'],
+            options['output_format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+            **filters,
+        )
+        if options['file'] is None:
+            self._write(chunks, sys.stdout.buffer)
+        else:
+            with open(options['file'], 'wb') as target:
+                self._write(chunks, target)
+
+    @staticmethod
+    def _write(chunks, target) -> None:
+        for chunk in chunks:
+            target.write(chunk)
+        target.flush()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shorturl import reaper
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete soft-deleted and long-expired short URLs in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Delete without copying the rows to ShortUrlArchive.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only count the links that would be reaped.'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{reaper.dead_links().count()} links would be reaped.')
+            return
+
+        stats = reaper.reap(archive=not options['no_archive'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Reaped {stats["links"]} links ({stats["archived"]} archived) and '
+                f'{stats["logs"]} access logs in {stats["batches"]} batches, '
+                f'{stats["seconds"]}s; about {stats["remaining"]} left.'
+            )
+        )
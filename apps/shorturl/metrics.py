@@ -0,0 +1,366 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+A small registry instead of prometheus_client: counters and histograms with
+labels, a lock per metric, and gauges computed at scrape time. Each worker
+process exposes its own values on /metrics; Prometheus sums them per job.
+
+MetricsMiddleware times every request. A database execute wrapper, installed
+on each new connection, counts queries and their time. The execute wrapper
+also adds them to the current request's totals through a ContextVar, which
+follows ORM calls into sync_to_async threads.
+"""
+
+import bisect
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .buffers import get_log_buffer
+
+# Label values for request methods; anything else a client sends is 'other'.
+HTTP_METHODS = frozenset(
+    ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT')
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return sum(state[0]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total)) for key, (counts, total) in self._values.items()
+            )
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts, strict=True):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Gauge:
+    """Read from ``callback`` at scrape time: (label values, value) pairs."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+
+    def samples(self):
+        for label_values, value in self.callback():
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:  # One broken gauge must not fail the whole scrape.
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        'shorturl_http_request_duration_seconds',
+        'Request latency by view.',
+        ('view', 'method', 'status'),
+    )
+)
+REQUEST_QUERIES = REGISTRY.register(
+    Histogram(
+        'shorturl_http_request_db_queries',
+        'Database queries per request by view.',
+        ('view',),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_DB_SECONDS = REGISTRY.register(
+    Histogram(
+        'shorturl_http_request_db_seconds',
+        'Time spent in database queries per request by view.',
+        ('view',),
+    )
+)
+DB_QUERIES = REGISTRY.register(
+    Counter('shorturl_db_queries_total', 'Database queries executed.', ('alias',))
+)
+DB_QUERY_SECONDS = REGISTRY.register(
+    Counter('shorturl_db_query_seconds_total', 'Time spent in database queries.', ('alias',))
+)
+DB_CHECKOUT = REGISTRY.register(
+    Histogram(
+        'shorturl_db_connection_checkout_seconds',
+        'Time to open a database connection, or to take one from the pool.',
+        ('alias',),
+    )
+)
+CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        'shorturl_redirect_cache_lookups_total',
+        'Redirect cache lookups by result (hit, miss, negative, early_refresh, bloom_reject).',
+        ('result',),
+    )
+)
+LOG_ENQUEUE = REGISTRY.register(
+    Histogram(
+        'shorturl_access_log_enqueue_seconds',
+        'Time to queue one access log record on the redirect path.',
+        buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+    )
+)
+
+
+def _log_queue():
+    yield (), get_log_buffer().depth()
+
+
+def _log_queue_lag():
+    oldest = get_log_buffer().oldest()
+    yield (), round(time.time() - oldest, 3) if oldest is not None else 0
+
+
+def _pools(wrappers=None):
+    """(alias, stats) of each psycopg pool, in ``wrappers`` or else django.db.connections."""
+    for connection in connections.all() if wrappers is None else wrappers:
+        # .pool is None without OPTIONS['pool'], and missing on other backends.
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            yield connection.alias, pool.get_stats()
+
+
+def _pool_connections(wrappers=None):
+    for alias, stats in _pools(wrappers):
+        for state, key in (('open', 'pool_size'), ('idle', 'pool_available'), ('max', 'pool_max')):
+            yield (alias, state), stats.get(key, 0)
+
+
+def _pool_waiting(wrappers=None):
+    for alias, stats in _pools(wrappers):
+        yield (alias,), stats.get('requests_waiting', 0)
+
+
+def _pool_wait_seconds(wrappers=None):
+    for alias, stats in _pools(wrappers):
+        yield (alias,), stats.get('requests_wait_ms', 0) / 1000
+
+
+REGISTRY.register(
+    Gauge('shorturl_access_log_queue_depth', 'Access log records waiting to be stored.', _log_queue)
+)
+REGISTRY.register(
+    Gauge(
+        'shorturl_access_log_queue_lag_seconds',
+        'Age of the oldest queued access log record.',
+        _log_queue_lag,
+    )
+)
+
+
+REGISTRY.register(
+    Gauge(
+        'shorturl_db_pool_connections',
+        'Connections of the psycopg pool: open, idle, max.',
+        _pool_connections,
+        ('alias', 'state'),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        'shorturl_db_pool_requests_waiting',
+        'Requests queued for a pooled connection.',
+        _pool_waiting,
+        ('alias',),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        'shorturl_db_pool_wait_seconds',
+        'Total time requests waited for a pooled connection (grows like a counter).',
+        _pool_wait_seconds,
+        ('alias',),
+    )
+)
+
+
+# [queries, seconds] of the request being handled in this context.
+_request_db = ContextVar('shorturl_request_db', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    """Database execute wrapper; see install_query_metrics()."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        alias = context['connection'].alias
+        DB_QUERIES.inc(alias)
+        DB_QUERY_SECONDS.inc(alias, amount=elapsed)
+        totals = _request_db.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def install_query_metrics(sender, connection, **kwargs):
+    """connection_created receiver: wrap every query on the new connection."""
+    if settings.SHORTURL_METRICS_ENABLED and record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class MetricsMiddleware:
+    """Records latency and query count per view; sync and async capable."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.SHORTURL_METRICS_ENABLED:
+            return self.get_response(request)
+
+        token = _request_db.set([0, 0.0])
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self._record(request, response, started)
+        finally:
+            _request_db.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.SHORTURL_METRICS_ENABLED:
+            return await self.get_response(request)
+
+        token = _request_db.set([0, 0.0])
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self._record(request, response, started)
+        finally:
+            _request_db.reset(token)
+        return response
+
+    @staticmethod
+    def _record(request, response, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        # Route names (or patterns), not paths: one series per view, not per short code.
+        view = (match.view_name or match.route) if match else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUEST_LATENCY.observe(elapsed, view, method, response.status_code)
+        queries, seconds = _request_db.get()
+        REQUEST_QUERIES.observe(queries, view)
+        REQUEST_DB_SECONDS.observe(seconds, view)
+
+
+def metrics_view(request):
+    """Staff users, or scrapes with the SHORTURL_METRICS_TOKEN bearer token."""
+    token = settings.SHORTURL_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    user = getattr(request, 'user', None)
+    if not (scraper or (user is not None and user.is_staff)):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0006_alter_shorturls_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accesslog',
+            name='accessed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0007_alter_accesslog_accessed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shorturls',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-is_active', 'create_at', 'id'], name='shorturl_list_keyset_idx'),
+        ),
+    ]
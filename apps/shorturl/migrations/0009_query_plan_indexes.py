@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0008_shorturls_shorturl_list_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shorturls',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['expires_at'], name='shorturl_live_expires_idx'),
+        ),
+        # Add the composite index before dropping the FK index it replaces.
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['short_url_id', '-accessed_at'], name='accesslog_url_time_idx'),
+        ),
+        migrations.AlterField(
+            model_name='accesslog',
+            name='short_url_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='shorturl.shorturls'),
+        ),
+    ]
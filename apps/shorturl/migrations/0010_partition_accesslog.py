@@ -0,0 +1,193 @@
+# Converts shorturl_accesslog into a table range-partitioned on accessed_at.
+# PostgreSQL only; other backends keep the plain table. The Django model is
+# unchanged, so this migration carries no state operations.
+#
+# Everything the migration needs is inlined here, not taken from
+# shorturl.partitions or the SHORTURL_ACCESSLOG_* settings, so later changes
+# to those cannot change what it does. It creates monthly partitions on UTC
+# month boundaries, from the oldest row to PARTITIONS_AHEAD months ahead. The
+# partitions task continues from the last bound with the configured interval.
+# Partitions created here are named by their full lower date (_pYYYYMMDD), so
+# they never clash with the names the task gives.
+#
+# Locking: the swap takes ACCESS EXCLUSIVE on shorturl_accesslog only for the
+# rename and the creation of the new table, which hold no rows yet. Log writes
+# go to the new table as soon as that commits. The existing rows are then
+# copied in batches of COPY_BATCH ids, one transaction each, so no lock is
+# held for the whole copy. Until the copy ends, older logs are missing from
+# shorturl_accesslog, so exports and history see them arrive over time.
+# The migration is not atomic for that reason. If it is interrupted during the
+# copy, running it again resumes the copy (rows are copied ON CONFLICT DO
+# NOTHING). The reverse migration still copies under one lock.
+
+from datetime import UTC, datetime
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+PARTITIONS_AHEAD = 3
+COPY_BATCH = 50_000
+
+PARENT_SQL = """
+CREATE TABLE shorturl_accesslog (
+    id bigint NOT NULL,
+    accessed_at timestamp with time zone NOT NULL,
+    ip_address inet NULL,
+    user_agent varchar(1024) NOT NULL,
+    referer varchar(2048) NULL,
+    short_url_id_id bigint NOT NULL,
+    -- The partition key has to be part of every unique constraint.
+    PRIMARY KEY (id, accessed_at)
+) PARTITION BY RANGE (accessed_at);
+CREATE TABLE shorturl_accesslog_default PARTITION OF shorturl_accesslog DEFAULT;
+"""
+
+# The old table lives on during the copy: free the names the new table uses.
+# The primary key and id sequence names differ between databases (identity or
+# serial column, earlier reverse migrations), so they are looked up.
+LEGACY_SQL = """
+ALTER TABLE shorturl_accesslog RENAME TO shorturl_accesslog_legacy;
+ALTER INDEX IF EXISTS accesslog_url_time_idx RENAME TO accesslog_url_time_legacy_idx;
+DO $$
+DECLARE
+    pkey text := (
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'shorturl_accesslog_legacy'::regclass AND contype = 'p'
+    );
+    seq text := pg_get_serial_sequence('shorturl_accesslog_legacy', 'id');
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE shorturl_accesslog_legacy RENAME CONSTRAINT %I TO %I',
+        pkey, 'shorturl_accesslog_legacy_pkey'
+    );
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s RENAME TO shorturl_accesslog_legacy_id_seq', seq);
+    END IF;
+END
+$$;
+"""
+
+PARTITION_SQL = """
+CREATE TABLE {name} PARTITION OF shorturl_accesslog FOR VALUES FROM (%s) TO (%s);
+"""
+
+COPY_SQL = """
+INSERT INTO shorturl_accesslog (id, accessed_at, ip_address, user_agent, referer, short_url_id_id)
+SELECT id, accessed_at, ip_address, user_agent, referer, short_url_id_id
+FROM shorturl_accesslog_legacy
+WHERE id > %s AND id <= %s
+ON CONFLICT DO NOTHING;
+"""
+
+FINISH_SQL = """
+CREATE SEQUENCE shorturl_accesslog_id_seq OWNED BY shorturl_accesslog.id;
+SELECT setval('shorturl_accesslog_id_seq', GREATEST(%s, 1), %s > 0);
+ALTER TABLE shorturl_accesslog ALTER COLUMN id SET DEFAULT nextval('shorturl_accesslog_id_seq');
+ALTER TABLE shorturl_accesslog
+    ADD CONSTRAINT shorturl_accesslog_short_url_id_id_fk_shorturl_shorturls_id
+    FOREIGN KEY (short_url_id_id) REFERENCES shorturl_shorturls (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX accesslog_url_time_idx ON shorturl_accesslog (short_url_id_id, accessed_at DESC);
+"""
+
+REVERSE_SQL = """
+ALTER TABLE shorturl_accesslog RENAME TO shorturl_accesslog_partitioned;
+ALTER SEQUENCE shorturl_accesslog_id_seq RENAME TO shorturl_accesslog_partitioned_id_seq;
+ALTER INDEX accesslog_url_time_idx RENAME TO accesslog_url_time_partitioned_idx;
+CREATE TABLE shorturl_accesslog (
+    id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    accessed_at timestamp with time zone NOT NULL,
+    ip_address inet NULL,
+    user_agent varchar(1024) NOT NULL,
+    referer varchar(2048) NULL,
+    short_url_id_id bigint NOT NULL
+);
+INSERT INTO shorturl_accesslog (id, accessed_at, ip_address, user_agent, referer, short_url_id_id)
+SELECT id, accessed_at, ip_address, user_agent, referer, short_url_id_id
+FROM shorturl_accesslog_partitioned;
+SELECT setval(
+    pg_get_serial_sequence('shorturl_accesslog', 'id'),
+    GREATEST((SELECT max(id) FROM shorturl_accesslog), 1)
+);
+DROP TABLE shorturl_accesslog_partitioned;
+CREATE INDEX accesslog_url_time_idx ON shorturl_accesslog (short_url_id_id, accessed_at DESC);
+ALTER TABLE shorturl_accesslog
+    ADD CONSTRAINT shorturl_accesslog_short_url_id_id_fk_shorturl_shorturls_id
+    FOREIGN KEY (short_url_id_id) REFERENCES shorturl_shorturls (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+def _month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(UTC)
+    return datetime(moment.year, moment.month, 1, tzinfo=UTC)
+
+
+def _next_month(start: datetime) -> datetime:
+    year, month = divmod(start.month, 12)
+    return datetime(start.year + year, month + 1, 1, tzinfo=UTC)
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    return cursor.fetchone()[0]
+
+
+def _swap_tables(cursor) -> None:
+    cursor.execute('LOCK TABLE shorturl_accesslog IN ACCESS EXCLUSIVE MODE')
+    cursor.execute('SELECT min(accessed_at), coalesce(max(id), 0) FROM shorturl_accesslog')
+    since, max_id = cursor.fetchone()
+
+    cursor.execute(LEGACY_SQL)
+    cursor.execute(PARENT_SQL)
+
+    # Partitions cover the existing rows, so the copy never lands in DEFAULT.
+    now = timezone.now()
+    lower, end = _month_start(since or now), _month_start(now)
+    for _ in range(PARTITIONS_AHEAD + 1):
+        end = _next_month(end)
+    while lower < end:
+        upper = _next_month(lower)
+        name = f'shorturl_accesslog_p{lower:%Y%m%d}'
+        cursor.execute(PARTITION_SQL.format(name=name), [lower, upper])
+        lower = upper
+
+    # New rows get ids above the copied ones.
+    cursor.execute(FINISH_SQL, [max_id, max_id])
+
+
+def partition_access_log(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not _table_exists(cursor, 'shorturl_accesslog_legacy'):
+            _swap_tables(cursor)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT coalesce(max(id), 0) FROM shorturl_accesslog_legacy')
+        max_id = cursor.fetchone()[0]
+        for low in range(0, max_id, COPY_BATCH):
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(COPY_SQL, [low, low + COPY_BATCH])
+        cursor.execute('DROP TABLE shorturl_accesslog_legacy')
+
+
+def unpartition_access_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(REVERSE_SQL)
+
+
+class Migration(migrations.Migration):
+    # The rows are copied in batches, one transaction each (see the top).
+    atomic = False
+
+    dependencies = [
+        ('shorturl', '0009_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_access_log, unpartition_access_log),
+    ]
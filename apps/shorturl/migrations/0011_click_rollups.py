@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0010_partition_accesslog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.IntegerField(default=0)),
+                ('visitors', models.BinaryField(default=b'')),
+                ('short_url', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='click_rollups', to='shorturl.shorturls')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('short_url', 'period', 'bucket'), name='clickrollup_unique_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DimensionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('dimension', models.CharField(choices=[('referer', 'Referer'), ('user_agent', 'User Agent')], max_length=16)),
+                ('value', models.CharField(blank=True, max_length=255)),
+                ('clicks', models.IntegerField(default=0)),
+                ('short_url', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='dimension_rollups', to='shorturl.shorturls')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('short_url', 'dimension', 'day', 'value'), name='dimensionrollup_unique_value')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0011_click_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortUrlArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('original_url', models.URLField(max_length=2048)),
+                ('create_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('is_deleted', models.BooleanField()),
+                ('clicks_count', models.IntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
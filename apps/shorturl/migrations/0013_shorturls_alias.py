@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0012_shorturlarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shorturls',
+            name='alias',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='shorturlarchive',
+            name='alias',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorturl', '0013_shorturls_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shorturls',
+            name='url_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='shorturls',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['url_hash'], name='shorturl_url_hash_idx'),
+        ),
+    ]
@@ -3,6 +3,9 @@ from datetime import timedelta
 from django.db import models
 from django.utils import timezone
 
+from .ids import get_id_allocator
+from .services import url_hash
+
 
 class ActiveManager(models.Manager):
     def get_queryset(self):
@@ -12,6 +15,12 @@ class ActiveManager(models.Manager):
 class ShortUrls(models.Model):
     # short_code = models.fields.CharField(max_length=64, unique=True, db_index=True)
     original_url = models.fields.URLField(max_length=2048)
+    # Optional vanity code, set at creation (ShortUrlService.is_valid_alias); the
+    # unique index is its lookup path on redirects.
+    alias = models.fields.CharField(max_length=64, unique=True, null=True, blank=True)
+    # services.url_hash(original_url), kept by save() and the bulk create paths;
+    # NULL on rows from before it existed until backfill_url_hashes runs.
+    url_hash = models.fields.CharField(max_length=64, null=True, blank=True, editable=False)
     create_at = models.fields.DateTimeField(auto_now_add=True)
     expires_at = models.fields.DateTimeField(default=timezone.now() + timedelta(days=10))
     is_active = models.BooleanField(default=True)
@@ -20,13 +29,120 @@ class ShortUrls(models.Model):
 
     objects = ActiveManager()
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the shorturls list (ShortUrlsCursorPagination).
+            models.Index(
+                fields=['-is_active', 'create_at', 'id'],
+                condition=models.Q(is_deleted=False),
+                name='shorturl_list_keyset_idx',
+            ),
+            # Live rows by expiry: ActiveManager's expires_at range and expired-link scans.
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(is_deleted=False),
+                name='shorturl_live_expires_idx',
+            ),
+            # Existing link for a URL ("reuse existing" creates). Not unique: links
+            # created without reuse may share a URL.
+            models.Index(
+                fields=['url_hash'],
+                condition=models.Q(is_deleted=False),
+                name='shorturl_url_hash_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.original_url
 
+    def save(self, *args, **kwargs):
+        self.url_hash = url_hash(self.original_url)
+        if self._state.adding and self.pk is None and (allocator := get_id_allocator()):
+            self.pk = allocator.allocate()
+            # With the pk set, Django would otherwise try an UPDATE first.
+            kwargs['force_insert'] = True
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'original_url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'url_hash'}
+        super().save(*args, **kwargs)
+
 
 class AccessLog(models.Model):
-    short_url_id = models.ForeignKey(ShortUrls, on_delete=models.CASCADE, related_name='logs')
-    accessed_at = models.fields.DateTimeField(auto_now=True)
+    # Covered by accesslog_url_time_idx, so no separate single-column FK index.
+    short_url_id = models.ForeignKey(
+        ShortUrls, on_delete=models.CASCADE, related_name='logs', db_index=False
+    )
+    # Set by the writer: batched inserts carry the time of the click, not of the flush.
+    accessed_at = models.fields.DateTimeField(default=timezone.now)
     ip_address = models.fields.GenericIPAddressField(null=True, blank=True)
     user_agent = models.fields.CharField(blank=True, max_length=1024)
     referer = models.fields.URLField(null=True, blank=True, max_length=2048)
+
+    class Meta:
+        indexes = [
+            # Per-link history, newest first: admin inline, exports, cascades.
+            models.Index(fields=['short_url_id', '-accessed_at'], name='accesslog_url_time_idx'),
+        ]
+
+
+class ClickRollup(models.Model):
+    """Clicks and unique visitors per short URL and hour/day, maintained by shorturl.rollups."""
+
+    class Period(models.TextChoices):
+        HOUR = 'hour'
+        DAY = 'day'
+
+    short_url = models.ForeignKey(
+        ShortUrls, on_delete=models.CASCADE, related_name='click_rollups', db_index=False
+    )
+    period = models.fields.CharField(max_length=4, choices=Period.choices)
+    bucket = models.fields.DateTimeField()
+    clicks = models.fields.IntegerField(default=0)
+    # HyperLogLog registers of the client IPs (shorturl.hll); empty until the first IP.
+    visitors = models.BinaryField(default=b'')
+
+    class Meta:
+        constraints = [
+            # Also serves the per-link range reads, so no separate FK index.
+            models.UniqueConstraint(
+                fields=['short_url', 'period', 'bucket'], name='clickrollup_unique_bucket'
+            ),
+        ]
+
+
+class DimensionRollup(models.Model):
+    """Daily clicks per short URL and referer or user agent, maintained by shorturl.rollups."""
+
+    class Dimension(models.TextChoices):
+        REFERER = 'referer'
+        USER_AGENT = 'user_agent'
+
+    short_url = models.ForeignKey(
+        ShortUrls, on_delete=models.CASCADE, related_name='dimension_rollups', db_index=False
+    )
+    day = models.fields.DateField()
+    dimension = models.fields.CharField(max_length=16, choices=Dimension.choices)
+    # Empty for direct visits (no referer) and clients without a user agent.
+    value = models.fields.CharField(max_length=255, blank=True)
+    clicks = models.fields.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['short_url', 'dimension', 'day', 'value'],
+                name='dimensionrollup_unique_value',
+            ),
+        ]
+
+
+class ShortUrlArchive(models.Model):
+    """Copy of a ShortUrls row removed by the reaper (shorturl.reaper), under its original id."""
+
+    id = models.BigIntegerField(primary_key=True)
+    original_url = models.fields.URLField(max_length=2048)
+    alias = models.fields.CharField(max_length=64, null=True, blank=True)
+    create_at = models.fields.DateTimeField()
+    expires_at = models.fields.DateTimeField()
+    is_deleted = models.BooleanField()
+    clicks_count = models.fields.IntegerField()
+    archived_at = models.fields.DateTimeField(auto_now_add=True)
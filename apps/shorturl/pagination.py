@@ -0,0 +1,245 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Field, Func, Q, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset, exact_below: int = 0) -> int:
+    """Planner row estimate for ``queryset``, without running a COUNT(*).
+
+    On PostgreSQL this reads "Plan Rows" from EXPLAIN. That is pg_class.reltuples
+    scaled by the selectivity of the WHERE clause, so it costs the same for any
+    table size. Other backends get an exact count, as do estimates below
+    ``exact_below``, where counting is cheap.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count() if estimate < exact_below else estimate
+
+
+class Row(Func):
+    """SQL row value ``(a, b, ...)``, for row comparisons like ``(a, b) > (x, y)``."""
+
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+def keyset_ranges(model, key, ordering) -> list[Q]:
+    """Rows after ``key`` (the ``ordering`` values of the last row seen), as index ranges.
+
+    ``ordering`` is split into runs of fields sorted the same way, and each
+    range fixes the earlier runs and compares one run as a row value:
+
+        ('-a', 'b', 'c') after (x, y, z):  [a = x AND (b, c) > (y, z),  a < x]
+
+    Unlike the equivalent OR of all ranges, each one is an Index Cond of an
+    index on ``ordering``, so reading the next rows seeks instead of filtering
+    out every row before the key. Their rows follow one another in ``ordering``,
+    so a page is read by querying them in turn until it is full.
+    """
+    runs = []
+    for field, value in zip(ordering, key, strict=True):
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        value = Value(value, output_field=model._meta.get_field(name))
+        if runs and runs[-1][0] == descending:
+            runs[-1][1].append((name, value))
+        else:
+            runs.append((descending, [(name, value)]))
+
+    ranges = []
+    equal = Q()
+    for descending, fields in runs:
+        names, values = zip(*fields, strict=True)
+        if len(fields) == 1:
+            after = Q(**{f'{names[0]}__{"lt" if descending else "gt"}': values[0]})
+        else:
+            compare = LessThan if descending else GreaterThan
+            after = Q(compare(Row(*map(F, names)), Row(*values)))
+        ranges.append(equal & after)
+        equal &= Q(**dict(fields))
+    # Most specific range first: its rows come right after the key.
+    return ranges[::-1]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django Paginator counting with estimate_count, for admin changelists.
+
+    The page count is approximate on large tables; pages past the real end come
+    back empty instead of costing a COUNT(*) on every changelist view.
+    """
+
+    exact_count_below = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        return estimate_count(self.object_list, exact_below=self.exact_count_below)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a composite ordering.
+
+    Unlike DRF's CursorPagination, which positions on the first ordering field
+    plus an offset, the cursor holds the full key of the boundary row. Each page
+    is then at most one index range scan per keyset_ranges() range, however deep
+    it is. The last ordering field must be unique.
+
+    The total is only computed on request: ``?count=exact`` or ``?count=estimate``.
+    """
+
+    ordering: tuple[str, ...] = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        key, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self._reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        self.count = self._get_count(queryset, request)
+
+        if key is None:
+            results = list(queryset[: page_size + 1])
+        else:
+            results = []
+            for condition in keyset_ranges(queryset.model, key, ordering):
+                results += queryset.filter(condition)[: page_size + 1 - len(results)]
+                if len(results) > page_size:
+                    break
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        # Going backwards, "more" lies before the page and the cursor row after it.
+        has_next = key is not None if reverse else has_more
+        has_previous = has_more if reverse else key is not None
+        self.next_key = self._key(results[-1]) if results and has_next else None
+        self.previous_key = self._key(results[0]) if results and has_previous else None
+
+        return results
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {
+                    'type': 'integer',
+                    'description': f'Only with ?{self.count_query_param}=',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        return self._link(self.next_key, reverse=False)
+
+    def get_previous_link(self):
+        return self._link(self.previous_key, reverse=True)
+
+    def encode_cursor(self, key: list, reverse: bool) -> str:
+        raw = json.dumps({'k': key, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request, model) -> tuple[list | None, bool]:
+        """The boundary key, as ``model`` values of the ordering fields, and its direction."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            key, reverse = cursor['k'], bool(cursor['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound('Invalid cursor') from None
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        # A tampered cursor must not reach the query: bad values fail here, not in SQL.
+        values = []
+        for field, value in zip(self.ordering, key, strict=True):
+            field = model._meta.get_field(field.lstrip('-'))
+            try:
+                value = field.to_python(value)
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound('Invalid cursor') from None
+            if value is None and not field.null:
+                raise NotFound('Invalid cursor')
+            values.append(value)
+        return values, reverse
+
+    def _get_count(self, queryset, request) -> int | None:
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def _reversed_ordering(self) -> tuple[str, ...]:
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering)
+
+    def _key(self, instance) -> list:
+        key = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            key.append(value.isoformat() if isinstance(value, datetime) else value)
+        return key
+
+    def _link(self, key, reverse: bool):
+        if key is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(key, reverse)
+        )
+
+
+class ShortUrlsCursorPagination(KeysetPagination):
+    # Matches ShortUrlsViewSet.get_queryset plus an id tie-breaker; backed by
+    # the shorturl_list_keyset_idx index.
+    ordering = ('-is_active', 'create_at', 'id')
+    max_page_size = settings.SHORTURL_MAX_PAGE_SIZE
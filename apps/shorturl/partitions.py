@@ -0,0 +1,141 @@
+"""Monthly/daily range partitions of AccessLog on accessed_at (PostgreSQL only).
+
+Migration 0010 turns shorturl_accesslog into a partitioned table with a DEFAULT
+partition as a safety net. New partitions are created ahead of time by the
+maintain_access_log_partitions beat task or the accesslog_partitions command.
+Retention detaches and drops whole partitions instead of running DELETE.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+TABLE = 'shorturl_accesslog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def is_supported(using: str = 'default') -> bool:
+    return connections[using].vendor == 'postgresql'
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    local = timezone.localtime(moment)
+    day = 1 if interval == 'month' else local.day
+    return timezone.make_aware(datetime(local.year, local.month, day))
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    local = timezone.localtime(start)
+    if interval == 'day':
+        following = local.date() + timedelta(days=1)
+        return timezone.make_aware(datetime(following.year, following.month, following.day))
+    year, month = divmod(local.month, 12)
+    return timezone.make_aware(datetime(local.year + year, month + 1, 1))
+
+
+def partition_name(lower: datetime, interval: str) -> str:
+    local = timezone.localtime(lower)
+    return f'{TABLE}_p{local:%Y%m%d}' if interval == 'day' else f'{TABLE}_p{local:%Y%m}'
+
+
+def list_partitions(using: str = 'default') -> list[tuple[str, datetime, datetime]]:
+    """(name, lower, upper) of every range partition, oldest first."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        if match:
+            lower, upper = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(lower: datetime, upper: datetime, interval: str, using: str = 'default'):
+    name = partition_name(lower, interval)
+    bounds = f"FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        # Build the partition standalone, move any rows the DEFAULT partition caught
+        # for this range, then attach. Attaching directly would fail on such rows.
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE accessed_at >= %s AND accessed_at < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [lower, upper],
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}')
+    return name
+
+
+def ensure_partitions(
+    since: datetime | None = None,
+    now: datetime | None = None,
+    using: str = 'default',
+) -> list[str]:
+    """Create missing partitions up to SHORTURL_ACCESSLOG_PARTITIONS_AHEAD periods after now."""
+    if not is_supported(using):
+        return []
+
+    interval = settings.SHORTURL_ACCESSLOG_PARTITION_INTERVAL
+    now = now or timezone.now()
+
+    existing = list_partitions(using)
+    lower = existing[-1][2] if existing else period_start(since or now, interval)
+
+    end = period_start(now, interval)
+    for _ in range(settings.SHORTURL_ACCESSLOG_PARTITIONS_AHEAD + 1):
+        end = next_period(end, interval)
+
+    created = []
+    while lower < end:
+        upper = next_period(lower, interval)
+        created.append(create_partition(lower, upper, interval, using))
+        lower = upper
+    return created
+
+
+def drop_expired_partitions(
+    retention_days: int | None = None,
+    now: datetime | None = None,
+    using: str = 'default',
+) -> list[str]:
+    """Detach and drop partitions entirely older than the retention window."""
+    retention_days = retention_days or settings.SHORTURL_ACCESSLOG_RETENTION_DAYS
+    if not retention_days or not is_supported(using):
+        return []
+
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    dropped = []
+    with connections[using].cursor() as cursor:
+        for name, _, upper in list_partitions(using):
+            if upper > cutoff:
+                break
+            with transaction.atomic(using=using):
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+
+        # Stragglers caught by the DEFAULT partition are expected to be rare.
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE accessed_at < %s', [cutoff])
+    return dropped
@@ -0,0 +1,115 @@
+"""Batched removal of soft-deleted and long-expired ShortUrls.
+
+ActiveManager only hides these rows. The reaper deletes them a batch at a time:
+the access logs of the batch first, in small LIMIT-ed deletes that each commit
+on their own, then the links themselves, locked with SKIP LOCKED so a batch
+never waits on rows a request is updating. No single statement cascades over
+an unbounded number of rows.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import ShortUrlCache
+from .models import AccessLog, ShortUrlArchive, ShortUrls
+from .pagination import estimate_count
+
+logger = logging.getLogger(__name__)
+
+REAPER_STATS_KEY = 'shorturl:reaper:stats'
+
+ARCHIVE_FIELDS = (
+    'id',
+    'original_url',
+    'alias',
+    'create_at',
+    'expires_at',
+    'is_deleted',
+    'clicks_count',
+)
+
+
+def dead_links(now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=settings.SHORTURL_REAPER_GRACE_DAYS)
+    return ShortUrls._base_manager.filter(Q(is_deleted=True) | Q(expires_at__lt=cutoff))
+
+
+def _delete_logs(short_url_ids: list[int]) -> int:
+    deleted = 0
+    batch_size = settings.SHORTURL_REAPER_LOG_BATCH_SIZE
+    while True:
+        chunk = AccessLog.objects.filter(short_url_id__in=short_url_ids).values('pk')[:batch_size]
+        count, _ = AccessLog.objects.filter(pk__in=chunk).delete()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def _reap_batch(archive: bool, now) -> list[dict]:
+    with transaction.atomic():
+        rows = list(
+            dead_links(now)
+            .select_for_update(skip_locked=True)
+            .order_by('pk')
+            .values(*ARCHIVE_FIELDS)[: settings.SHORTURL_REAPER_BATCH_SIZE]
+        )
+        if not rows:
+            return rows
+
+        ids = [row['id'] for row in rows]
+        if archive:
+            ShortUrlArchive.objects.bulk_create(
+                [ShortUrlArchive(**row) for row in rows], ignore_conflicts=True
+            )
+        # Only stragglers are left for the cascade: the logs went in _delete_logs.
+        ShortUrls._base_manager.filter(pk__in=ids).delete()
+        aliases = [row['alias'] for row in rows]
+        transaction.on_commit(lambda: ShortUrlCache.invalidate_many(ids))
+        # The alias is free again; a stale mapping would hide its next owner.
+        transaction.on_commit(lambda: ShortUrlCache.invalidate_aliases(aliases))
+    return rows
+
+
+def reap(archive: bool | None = None, now=None) -> dict:
+    """Archive and delete dead links until none are left or SHORTURL_REAPER_MAX_SECONDS pass."""
+    archive = settings.SHORTURL_REAPER_ARCHIVE if archive is None else archive
+    started = time.monotonic()
+    stats = {'links': 0, 'archived': 0, 'logs': 0, 'batches': 0}
+
+    while time.monotonic() - started < settings.SHORTURL_REAPER_MAX_SECONDS:
+        # Logs before links: the cascade of the link delete then stays small.
+        candidates = list(
+            dead_links(now)
+            .order_by('pk')
+            .values_list('pk', flat=True)[: settings.SHORTURL_REAPER_BATCH_SIZE]
+        )
+        if not candidates:
+            break
+        stats['logs'] += _delete_logs(candidates)
+
+        rows = _reap_batch(archive, now)
+        if not rows:
+            # Everything left is locked by someone else; try again next run.
+            break
+        stats['batches'] += 1
+        stats['links'] += len(rows)
+        stats['archived'] += len(rows) if archive else 0
+
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 4)
+    stats['remaining'] = estimate_count(dead_links(now))
+    if stats['batches']:
+        caches[settings.SHORTURL_CACHE_ALIAS].set(REAPER_STATS_KEY, stats, None)
+        logger.info(
+            'Reaped %(links)s dead links and %(logs)s access logs in %(seconds)ss, '
+            '%(remaining)s left',
+            stats,
+        )
+    return stats
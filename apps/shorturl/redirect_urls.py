@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
 
 # from .views import RedirectView
-from .views import redirectShortCode
+from .views import redirectShortCode, redirectShortCodeAsync
+
+# Pick per deployment: the async view only pays off when served by an ASGI server.
+redirect_view = redirectShortCodeAsync if settings.SHORTURL_ASYNC_REDIRECT else redirectShortCode
 
 urlpatterns = [
-    path('<str:short_code>/', redirectShortCode, name='redirect')
+    path('<str:short_code>/', redirect_view, name='redirect')
     # path('<str:short_code>/', RedirectView.as_view(), name='redirect')
 ]
@@ -0,0 +1,34 @@
+import asyncio
+import weakref
+from functools import cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+
+@cache
+def get_redis() -> redis.Redis | None:
+    """Shared client for SHORTURL_REDIS_URL, or None when Redis is not configured."""
+    if not settings.SHORTURL_REDIS_URL:
+        return None
+    return redis.Redis.from_url(settings.SHORTURL_REDIS_URL, **settings.SHORTURL_REDIS_POOL_OPTIONS)
+
+
+# Event loop -> its client. An asyncio connection can only be used on the loop
+# that opened it, and besides the ASGI server's loop every async_to_sync() call
+# runs its own.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> redis.asyncio.Redis | None:
+    """asyncio client for the running event loop; same server as get_redis()."""
+    if not settings.SHORTURL_REDIS_URL:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(
+            settings.SHORTURL_REDIS_URL, **settings.SHORTURL_REDIS_POOL_OPTIONS
+        )
+    return client
@@ -0,0 +1,185 @@
+"""Read-replica routing: reads from HTTP requests go to replicas, everything else to the primary.
+
+SHORTURL_DB_REPLICAS lists the DATABASES aliases of the replicas. ReplicaRouter
+sends a read to one of them, picked at random, only when all of these hold:
+
+* it happens while ReplicaMiddleware handles a request. Celery tasks and
+  management commands keep reading the primary, since they read what they
+  have just written.
+* the request has not written anything yet (read your own writes), and did
+  not come with the sticky cookie. That cookie is set for
+  SHORTURL_DB_STICKY_SECONDS after a write, so the client's next requests see
+  its new link too.
+* the primary is not inside a transaction.
+* the replica lagged at most SHORTURL_DB_REPLICA_MAX_LAG seconds at its last
+  check. The lag is measured every SHORTURL_DB_LAG_CHECK_INTERVAL seconds per
+  process; a replica that cannot be reached counts as lagging.
+
+Otherwise, or when no replica qualifies, reads go to the primary. A row
+missing on a replica may simply not have arrived yet; first_or_primary() asks
+the primary before a miss is reported (and negatively cached).
+"""
+
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+STICKY_COOKIE = 'shorturl_primary'
+
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class _Reads:
+    __slots__ = ('primary', 'wrote')
+
+    def __init__(self, primary: bool):
+        self.primary = primary
+        self.wrote = False
+
+
+# Set by ReplicaMiddleware for the duration of a request; None elsewhere.
+_reads: ContextVar[_Reads | None] = ContextVar('shorturl_reads', default=None)
+
+
+class LagMonitor:
+    """Replica lag in seconds per alias, re-measured when older than the check interval."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # alias -> (monotonic time of the check, lag or None if unreachable)
+        self.lags = {}
+
+    def healthy(self, alias: str) -> bool:
+        checked_at, lag = self.lags.get(alias, (-float('inf'), None))
+        if time.monotonic() - checked_at >= settings.SHORTURL_DB_LAG_CHECK_INTERVAL:
+            # One thread measures; the others go on with the previous value.
+            if self._lock.acquire(blocking=False):
+                try:
+                    lag = self.measure(alias)
+                    self.lags[alias] = (time.monotonic(), lag)
+                finally:
+                    self._lock.release()
+        return lag is not None and lag <= settings.SHORTURL_DB_REPLICA_MAX_LAG
+
+    @staticmethod
+    def measure(alias: str) -> float | None:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                return float(cursor.fetchone()[0])
+        except DatabaseError:
+            connection.close()
+            return None
+
+
+@cache
+def get_lag_monitor() -> LagMonitor:
+    return LagMonitor()
+
+
+def read_alias() -> str:
+    """The database the next read of the current context should use."""
+    reads = _reads.get()
+    if (
+        reads is None
+        or reads.primary
+        or not settings.SHORTURL_DB_REPLICAS
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+    monitor = get_lag_monitor()
+    healthy = [alias for alias in settings.SHORTURL_DB_REPLICAS if monitor.healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        reads = _reads.get()
+        if reads is not None:
+            reads.primary = reads.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.SHORTURL_DB_REPLICAS else None
+
+
+def first_or_primary(queryset):
+    """queryset.first(), asking the primary again if a replica has no row (yet)."""
+    using = queryset.db
+    row = queryset.using(using).first()
+    if row is None and using != DEFAULT_DB_ALIAS:
+        row = queryset.using(DEFAULT_DB_ALIAS).first()
+    return row
+
+
+async def afirst_or_primary(queryset):
+    # The router may measure replica lag, which is a blocking query.
+    return await sync_to_async(first_or_primary)(queryset)
+
+
+class ReplicaMiddleware:
+    """Lets the reads of a request use replicas and sets the sticky cookie after writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SHORTURL_DB_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _finish(reads: _Reads, response):
+        if reads.wrote:
+            response.set_cookie(
+                STICKY_COOKIE,
+                '1',
+                max_age=settings.SHORTURL_DB_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        reads = _Reads(primary=STICKY_COOKIE in request.COOKIES)
+        token = _reads.set(reads)
+        try:
+            return self._finish(reads, self.get_response(request))
+        finally:
+            _reads.reset(token)
+
+    async def __acall__(self, request):
+        reads = _Reads(primary=STICKY_COOKIE in request.COOKIES)
+        token = _reads.set(reads)
+        try:
+            return self._finish(reads, await self.get_response(request))
+        finally:
+            _reads.reset(token)
@@ -0,0 +1,178 @@
+"""Incremental click rollups, updated from each batch of stored access logs.
+
+ClickRollup keeps hourly and daily click counts per short URL, plus a
+HyperLogLog sketch of the client IPs for unique visitors. DimensionRollup keeps
+daily counts per referer and per user agent. The stats endpoint reads only
+these tables, never AccessLog.
+"""
+
+from collections import Counter, defaultdict
+from datetime import UTC, datetime, timedelta
+from itertools import batched
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+
+from .hll import HyperLogLog
+from .models import AccessLog, ClickRollup, DimensionRollup
+
+# Values are truncated to the column size; longer ones share a row.
+DIMENSION_MAX_LENGTH = 255
+
+
+def _buckets(accessed_at: datetime) -> tuple[datetime, datetime]:
+    hour = accessed_at.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+    return hour, hour.replace(hour=0)
+
+
+def record(logs: list[AccessLog]) -> None:
+    """Fold a batch of logs into the rollup tables, a fixed number of queries per batch."""
+    if not logs:
+        return
+
+    clicks = Counter()
+    # Raw IPs per bucket: adding them to the stored sketch costs per click, while
+    # merging a sketch would cost all registers per bucket.
+    visitors = defaultdict(set)
+    dimensions = Counter()
+    for log in logs:
+        short_url_id = log.short_url_id_id
+        hour, day = _buckets(log.accessed_at)
+        for key in (
+            (short_url_id, ClickRollup.Period.HOUR, hour),
+            (short_url_id, ClickRollup.Period.DAY, day),
+        ):
+            clicks[key] += 1
+            if log.ip_address:
+                visitors[key].add(log.ip_address)
+
+        day = day.date()
+        dimensions[
+            (
+                short_url_id,
+                day,
+                DimensionRollup.Dimension.REFERER,
+                (log.referer or '')[:DIMENSION_MAX_LENGTH],
+            )
+        ] += 1
+        dimensions[
+            (
+                short_url_id,
+                day,
+                DimensionRollup.Dimension.USER_AGENT,
+                log.user_agent[:DIMENSION_MAX_LENGTH],
+            )
+        ] += 1
+
+    with transaction.atomic():
+        _upsert_clicks(clicks, visitors)
+        _upsert_dimensions(dimensions)
+
+
+def _lock_rows(model, keys, key_fields: tuple[str, ...]) -> dict:
+    # Insert the missing rows empty, then lock and update them all. Unlike an
+    # overwriting upsert, concurrent batches for the same bucket cannot lose counts.
+    # Both passes go in the same key order: inserts wait on each other's
+    # uncommitted unique-index entries just as the locks wait on rows, so
+    # concurrent batches touching the same new keys would otherwise deadlock.
+    keys = sorted(keys)
+    batch_size = settings.SHORTURL_LOG_BATCH_SIZE
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key, strict=True))) for key in keys],
+        ignore_conflicts=True,
+        batch_size=batch_size,
+    )
+
+    # Exactly the keys, never a superset, taken in key order across the chunks.
+    rows = {}
+    for chunk in batched(keys, batch_size, strict=False):
+        condition = Q()
+        for key in chunk:
+            condition |= Q(**dict(zip(key_fields, key, strict=True)))
+        for row in model.objects.select_for_update().filter(condition).order_by(*key_fields):
+            rows[tuple(getattr(row, field) for field in key_fields)] = row
+    return rows
+
+
+def _save_rows(model, rows, fields: tuple[str, ...]) -> None:
+    batch_size = settings.SHORTURL_LOG_BATCH_SIZE
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_update(rows, fields, batch_size=batch_size)
+        return
+
+    # bulk_update builds one CASE WHEN per row and field, which costs seconds of
+    # Python per thousand rows; an UPDATE ... FROM (VALUES ...) only binds values.
+    table = model._meta.db_table
+    columns = [model._meta.get_field(field).column for field in fields]
+    assignments = ', '.join(f'{column} = v.{column}' for column in columns)
+    row_placeholder = f'({", ".join(["%s"] * (len(fields) + 1))})'
+    with connection.cursor() as cursor:
+        for chunk in batched(rows, batch_size, strict=False):
+            cursor.execute(
+                f'UPDATE {table} SET {assignments} '
+                f'FROM (VALUES {", ".join([row_placeholder] * len(chunk))}) '
+                f'AS v (id, {", ".join(columns)}) WHERE {table}.id = v.id',
+                [value for row in chunk for value in (row.pk, *(getattr(row, f) for f in fields))],
+            )
+
+
+def _upsert_clicks(clicks: Counter, visitors: dict) -> None:
+    rows = _lock_rows(ClickRollup, clicks, ('short_url_id', 'period', 'bucket'))
+    for key, row in rows.items():
+        row.clicks += clicks[key]
+        if key in visitors:
+            sketch = HyperLogLog(bytes(row.visitors) or None)
+            for ip_address in visitors[key]:
+                sketch.add(ip_address)
+            row.visitors = bytes(sketch)
+    _save_rows(ClickRollup, rows.values(), ('clicks', 'visitors'))
+
+
+def _upsert_dimensions(dimensions: Counter) -> None:
+    rows = _lock_rows(DimensionRollup, dimensions, ('short_url_id', 'day', 'dimension', 'value'))
+    for key, row in rows.items():
+        row.clicks += dimensions[key]
+    _save_rows(DimensionRollup, rows.values(), ('clicks',))
+
+
+def stats(short_url_id: int, period: str, buckets: int, top: int = 10) -> dict:
+    """Totals, a per-bucket series and the top referers/user agents over the last ``buckets``."""
+    hour, day = _buckets(datetime.now(UTC))
+    if period == ClickRollup.Period.HOUR:
+        since = hour - timedelta(hours=buckets - 1)
+    else:
+        since = day - timedelta(days=buckets - 1)
+
+    visitors = HyperLogLog()
+    series = []
+    for bucket, clicks, registers in (
+        ClickRollup.objects.filter(short_url_id=short_url_id, period=period, bucket__gte=since)
+        .order_by('bucket')
+        .values_list('bucket', 'clicks', 'visitors')
+    ):
+        sketch = HyperLogLog(bytes(registers) or None)
+        visitors.merge(sketch)
+        series.append({'bucket': bucket, 'clicks': clicks, 'unique_visitors': sketch.count()})
+
+    def top_values(dimension):
+        return [
+            {'value': value, 'clicks': clicks}
+            for value, clicks in DimensionRollup.objects.filter(
+                short_url_id=short_url_id, dimension=dimension, day__gte=since.date()
+            )
+            .values('value')
+            .annotate(total=Sum('clicks'))
+            .order_by('-total', 'value')
+            .values_list('value', 'total')[:top]
+        ]
+
+    return {
+        'period': period,
+        'since': since,
+        'clicks': sum(point['clicks'] for point in series),
+        'unique_visitors': visitors.count(),
+        'series': series,
+        'top_referers': top_values(DimensionRollup.Dimension.REFERER),
+        'top_user_agents': top_values(DimensionRollup.Dimension.USER_AGENT),
+    }
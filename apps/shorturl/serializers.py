@@ -1,12 +1,159 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.urls import reverse
 from rest_framework import serializers
 
+from .buffers import get_click_buffer
+from .cache import ShortUrlCache
+from .ids import get_id_allocator
 from .models import AccessLog, ShortUrls
-from .services import ShortUrlService
+from .services import ShortUrlService, normalize_url, url_hash
+
+
+ALIAS_TAKEN = 'This alias is already taken.'
+
+
+def _alias_claimed(aliases) -> bool:
+    """Whether one of ``aliases`` is in the table, e.g. after its INSERT failed.
+
+    Tells a concurrent claim of the alias apart from any other IntegrityError,
+    which must not be reported as "alias taken".
+    """
+    aliases = [alias for alias in aliases if alias]
+    return bool(aliases) and ShortUrls._base_manager.filter(alias__in=aliases).exists()
+
+
+def alias_availability(aliases, check_taken: bool = True) -> dict[str, str | None]:
+    """Map each alias to None if it can be claimed, else 'invalid', 'reserved' or 'taken'.
+
+    One query for the whole batch. Soft-deleted and expired rows keep their alias
+    until the reaper removes them, so they are checked too.
+    """
+    from .fastpath import reserved_segments  # The URLconf imports this module.
+
+    reserved = reserved_segments()
+    results = {}
+    for alias in aliases:
+        if not ShortUrlService.is_valid_alias(alias):
+            results[alias] = 'invalid'
+        elif alias in reserved:
+            results[alias] = 'reserved'
+        else:
+            results[alias] = None
+
+    candidates = [alias for alias, reason in results.items() if reason is None]
+    if check_taken and candidates:
+        for alias in ShortUrls._base_manager.filter(alias__in=candidates).values_list(
+            'alias', flat=True
+        ):
+            results[alias] = 'taken'
+    return results
+
+
+def existing_links(urls) -> dict[str, ShortUrls]:
+    """Live, active links keyed by url_hash, found through its index in one query."""
+    wanted = {url_hash(url): normalize_url(url) for url in urls}
+    found = {}
+    # Several links may share a URL; the one that lives longest is reused.
+    for instance in ShortUrls.objects.filter(url_hash__in=wanted, is_active=True).order_by(
+        '-expires_at'
+    ):
+        # Equal hashes of different URLs would take a SHA-256 collision; compare anyway.
+        if normalize_url(instance.original_url) == wanted[instance.url_hash]:
+            found.setdefault(instance.url_hash, instance)
+    return found
+
+
+def _reuse(attrs: dict) -> bool:
+    reuse = attrs.pop('reuse_existing', None)
+    if reuse is None:
+        reuse = settings.SHORTURL_REUSE_EXISTING
+    # A requested alias, or an inactive link, always gets its own link.
+    return reuse and not attrs.get('alias') and attrs.get('is_active', True)
+
+
+def _serves(instance: ShortUrls | None, attrs: dict) -> bool:
+    """Whether an existing link can stand in for the one ``attrs`` asks for."""
+    expires_at = attrs.get('expires_at')
+    return instance is not None and (expires_at is None or instance.expires_at >= expires_at)
+
+
+class ShortUrlsListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One HMGET for the whole page instead of one lookup per row.
+        instances = list(data.all() if hasattr(data, 'all') else data)
+        self.child.pending_clicks = get_click_buffer().pending_many(
+            instance.id for instance in instances
+        )
+        try:
+            return super().to_representation(instances)
+        finally:
+            self.child.pending_clicks = None
+
+    def validate(self, attrs):
+        # The children skip the uniqueness query; one query covers the whole batch.
+        aliases = [item['alias'] for item in attrs if item.get('alias')]
+        if len(set(aliases)) != len(aliases):
+            raise serializers.ValidationError('Aliases must be unique within a request.')
+        taken = sorted(alias for alias, reason in alias_availability(aliases).items() if reason)
+        if taken:
+            raise serializers.ValidationError(f'Aliases already taken: {", ".join(taken)}.')
+        return attrs
+
+    def create(self, validated_data):
+        reuse = [_reuse(attrs) for attrs in validated_data]
+        existing = existing_links(
+            attrs['original_url']
+            for attrs, reused in zip(validated_data, reuse, strict=True)
+            if reused
+        )
+        for instance in existing.values():
+            instance.created = False
+
+        # One INSERT per batch instead of one objects.create per item.
+        instances, new = [], []
+        for attrs, reused in zip(validated_data, reuse, strict=True):
+            key = url_hash(attrs['original_url'])
+            instance = existing.get(key) if reused else None
+            if not _serves(instance, attrs):
+                instance = ShortUrls(**attrs, url_hash=key, clicks_count=0)
+                instance.created = True
+                new.append(instance)
+                if reused:
+                    # Repeats of a URL within the batch share the new link.
+                    existing[key] = instance
+            instances.append(instance)
+
+        if new and (allocator := get_id_allocator()):
+            # Ids (and short codes) known before the INSERT, from one block lease.
+            for instance, pk in zip(new, allocator.allocate_many(len(new)), strict=True):
+                instance.id = pk
+
+        try:
+            with transaction.atomic():
+                ShortUrls.objects.bulk_create(
+                    new, batch_size=settings.SHORTURL_BULK_CREATE_BATCH_SIZE
+                )
+        except IntegrityError:
+            # An alias claimed by a concurrent request since validation.
+            if not _alias_claimed(instance.alias for instance in new):
+                raise
+            raise serializers.ValidationError(ALIAS_TAKEN) from None
+        # Drop negative cache entries left by requests that probed these ids early.
+        ShortUrlCache.invalidate_many(instance.id for instance in new)
+        ShortUrlCache.invalidate_aliases(instance.alias for instance in new)
+        return instances
 
 
 class ShortUrlsSerializer(serializers.ModelSerializer):
     short_url = serializers.SerializerMethodField()
+    # Return the existing live link for the same URL instead of a new one;
+    # defaults to SHORTURL_REUSE_EXISTING.
+    reuse_existing = serializers.BooleanField(
+        write_only=True, required=False, allow_null=True, default=None
+    )
+
+    pending_clicks: dict[int, int] | None = None
 
     def get_short_url(self, obj) -> None | str:
         if not obj.id:
@@ -16,7 +163,7 @@ class ShortUrlsSerializer(serializers.ModelSerializer):
         if not request:
             return None
 
-        short_code = ShortUrlService.encode(obj.id)
+        short_code = obj.alias or ShortUrlService.encode(obj.id)
         relative_url = reverse('redirect', kwargs={'short_code': short_code})
         return request.build_absolute_uri(relative_url)
 
@@ -26,26 +173,105 @@ class ShortUrlsSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'original_url',
+            'alias',
             'short_url',
             'create_at',
             'expires_at',
             'is_active',
             'clicks_count',
+            'reuse_existing',
         ]
         read_only_fields = ['clicks_count', 'short_url']
+        # validate_alias() replaces the UniqueValidator, whose ActiveManager queryset
+        # would miss aliases held by deleted or expired rows.
+        extra_kwargs = {'alias': {'validators': []}}
+        list_serializer_class = ShortUrlsListSerializer
+
+    def validate_alias(self, alias):
+        if not alias:
+            return None
+        if self.instance is not None:
+            if alias != self.instance.alias:
+                raise serializers.ValidationError('An alias cannot be changed.')
+            return alias
+
+        # Children of ShortUrlsListSerializer leave 'taken' to its one query per batch.
+        in_batch = isinstance(self.parent, serializers.ListSerializer)
+        reason = alias_availability([alias], check_taken=not in_batch)[alias]
+        if reason == 'invalid':
+            raise serializers.ValidationError(
+                "Use 3-64 letters, digits, '-' or '_', with at least one '-' or '_' "
+                'unless longer than any generated code.'
+            )
+        if reason == 'reserved':
+            raise serializers.ValidationError('This alias is reserved.')
+        if reason == 'taken':
+            raise serializers.ValidationError(ALIAS_TAKEN)
+        return alias
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.id:
+            # DB value + clicks still waiting in the buffer for the next flush.
+            if self.pending_clicks is not None:
+                data['clicks_count'] += self.pending_clicks.get(instance.id, 0)
+            else:
+                data['clicks_count'] += get_click_buffer().pending(instance.id)
+        # Set by create(): False when an existing link was returned (reuse_existing).
+        created = getattr(instance, 'created', None)
+        if created is not None:
+            data['created'] = created
+        return data
 
     def create(self: ShortUrlsSerializer, validated_data):
+        if _reuse(validated_data):
+            existing = existing_links([validated_data['original_url']])
+            instance = next(iter(existing.values()), None)
+            if _serves(instance, validated_data):
+                instance.created = False
+                return instance
+
         validated_data['clicks_count'] = 0
-        return ShortUrls.objects.create(**validated_data)
+        try:
+            with transaction.atomic():
+                instance = ShortUrls.objects.create(**validated_data)
+        except IntegrityError:
+            if not _alias_claimed([validated_data.get('alias')]):
+                raise
+            raise serializers.ValidationError({'alias': [ALIAS_TAKEN]}) from None
+        ShortUrlCache.invalidate(instance.id)
+        ShortUrlCache.invalidate_aliases([instance.alias])
+        instance.created = True
+
+        return instance
 
     def update(self: ShortUrlsSerializer, instance: ShortUrls, validated_data):
         instance.is_active = validated_data.get('is_active', instance.is_active)
         instance.original_url = validated_data.get('original_url', instance.original_url)
         instance.save()
+        ShortUrlCache.set(instance)
 
         return instance
 
 
+class AliasAvailabilitySerializer(serializers.Serializer):
+    aliases = serializers.ListField(
+        child=serializers.CharField(max_length=64, trim_whitespace=False),
+        allow_empty=False,
+        max_length=settings.SHORTURL_ALIAS_CHECK_MAX_ITEMS,
+    )
+
+    def create(self, validated_data):
+        availability = alias_availability(validated_data['aliases'])
+        return {
+            'results': [
+                {'alias': alias, 'available': reason is None}
+                | ({'reason': reason} if reason else {})
+                for alias, reason in availability.items()
+            ]
+        }
+
+
 class AccessLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = AccessLog
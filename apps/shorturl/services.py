@@ -1,31 +1,239 @@
+import hashlib
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CHAR_SET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+BASE = len(CHAR_SET)
+
+# Lookup tables, built once at import instead of on every call.
+# _DIGIT_PAIRS[n] is the two-digit code of n < BASE**2 (least significant first),
+# so encode() emits two digits per division.
+_PAIR_BASE = BASE * BASE
+_DIGIT_PAIRS = [low + high for high in CHAR_SET for low in CHAR_SET]
+_INVALID = 0xFF
+_DECODE_TABLE = bytes(
+    CHAR_SET.index(chr(byte)) if chr(byte) in CHAR_SET else _INVALID for byte in range(256)
+)
+
+# Vanity aliases share the /<code>/ namespace with encoded ids, but never collide
+# with them: an alias contains '-' or '_', or is longer than any encoded id.
+ALIAS_PATTERN = re.compile(r'[0-9A-Za-z_-]{3,64}')
+# ShortUrls.id is a BigAutoField.
+_MAX_ID = 2**63 - 1
+
+_DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def normalize_url(url: str) -> str:
+    """Form compared for duplicates: scheme and host lowercased, default port dropped."""
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    scheme = scheme.lower()
+    userinfo, at, host = netloc.rpartition('@')
+    host = host.lower()
+    if scheme in _DEFAULT_PORTS:
+        host = host.removesuffix(_DEFAULT_PORTS[scheme])
+    return urlunsplit((scheme, userinfo + at + host, path or '/', query, fragment))
+
+
+def url_hash(url: str) -> str:
+    """SHA-256 hex digest of normalize_url(url); ShortUrls.url_hash."""
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+class IdScrambler:
+    """Keyed bijection on [0, BASE**width) so consecutive ids give unrelated codes.
+
+    A small Feistel network over the bits of the id, cycle-walked back into the
+    domain. Both directions are pure arithmetic: no table and no DB lookup.
+    """
+
+    ROUNDS = 4
+    _MULTIPLIER = 0x9E3779B97F4A7C15
+
+    def __init__(self, key: str, width: int):
+        self.modulus = BASE**width
+        self._half_bits = ((self.modulus - 1).bit_length() + 1) // 2
+        self._mask = (1 << self._half_bits) - 1
+
+        digest = hashlib.blake2b(
+            key.encode(), digest_size=8 * self.ROUNDS, person=b'shorturl-ids'
+        ).digest()
+        self._round_keys = [
+            int.from_bytes(digest[i * 8 : (i + 1) * 8], 'big') & self._mask
+            for i in range(self.ROUNDS)
+        ]
+
+    def _round(self, value: int, round_key: int) -> int:
+        value = ((value ^ round_key) * self._MULTIPLIER) & self._mask
+        return value ^ (value >> (self._half_bits // 2))
+
+    def _forward(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._mask
+        for round_key in self._round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self._half_bits) | right
+
+    def _backward(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._mask
+        for round_key in reversed(self._round_keys):
+            left, right = right ^ self._round(left, round_key), left
+        return (left << self._half_bits) | right
+
+    def scramble(self, id_num: int) -> int:
+        value = self._forward(id_num)
+        while value >= self.modulus:
+            value = self._forward(value)
+        return value
+
+    def unscramble(self, value: int) -> int:
+        id_num = self._backward(value)
+        while id_num >= self.modulus:
+            id_num = self._backward(id_num)
+        return id_num
+
+
+# (width, scrambler, legacy max id), read from settings on first use and dropped
+# when they change. A module global, not an lru_cache: encode() and decode() read
+# it on every call, and settings access or a cached call would dominate their cost.
+_config: tuple[int | None, IdScrambler | None, int | None] | None = None
+
+
+def _load_code_config() -> tuple[int | None, IdScrambler | None, int | None]:
+    global _config
+    width = settings.SHORTURL_CODE_WIDTH
+    key = settings.SHORTURL_SCRAMBLE_KEY
+    scrambler = IdScrambler(key, width) if width and key else None
+    _config = (width, scrambler, settings.SHORTURL_SCRAMBLE_LEGACY_MAX_ID)
+    return _config
+
+
+@lru_cache(maxsize=1)
+def _max_code_length() -> int:
+    width, _, _ = _config or _load_code_config()
+    return max(width or 0, len(ShortUrlService._encode(_MAX_ID)))
+
+
+@receiver(setting_changed)
+def _reset_code_config(*, setting, **kwargs):
+    global _config
+    if setting.startswith('SHORTURL_'):
+        _config = None
+        _max_code_length.cache_clear()
+
+
 class ShortUrlService:
-    CHAR_SET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    BASE = len(CHAR_SET)
+    """Base62 short codes for ShortUrls ids.
+
+    With SHORTURL_CODE_WIDTH set, codes are padded to that width. With
+    SHORTURL_SCRAMBLE_KEY set as well, ids are scrambled before encoding, and
+    every code of exactly that width is treated as scrambled. Shorter codes
+    predate scrambling and keep decoding as plain ids. Ids too large for the
+    width get plain codes that are longer than the width.
+    """
+
+    CHAR_SET = CHAR_SET
+    BASE = BASE
 
     @classmethod
     def encode(cls, id_num: int) -> str:
-        if id_num == 0:
-            return cls.CHAR_SET[0]
+        config = _config or _load_code_config()
+        # Default settings (no width): skip straight to the plain code.
+        return cls._encode_with(id_num, config) if config[0] else cls._encode(id_num)
+
+    @classmethod
+    def decode(cls, short_code: str) -> int:
+        config = _config or _load_code_config()
+        return cls._decode_with(short_code, config) if config[1] else cls._decode(short_code)
 
-        short_code = ''
-        base_id = id_num
-        while base_id > 0:
-            char_index = base_id % cls.BASE
-            short_code += cls.CHAR_SET[char_index]
-            base_id //= cls.BASE
+    @classmethod
+    def _encode_with(cls, id_num: int, config) -> str:
+        width, scrambler, _ = config
+        if not width or id_num >= BASE**width:
+            return cls._encode(id_num)
+
+        if scrambler:
+            id_num = scrambler.scramble(id_num)
 
-        return short_code
+        # Padding goes on the most significant end, which is the right-hand side.
+        return cls._encode(id_num).ljust(width, CHAR_SET[0])
 
     @classmethod
-    def decode(cls, short_code: str) -> int:
-        original_id = 0
-        char_to_index = {char: i for i, char in enumerate(cls.CHAR_SET)}
+    def _decode_with(cls, short_code: str, config) -> int:
+        original_id = cls._decode(short_code)
 
-        for i, char in enumerate(short_code):
-            char_value = char_to_index.get(char)
-            if char_value is None:
-                raise ValueError(f"Invalid character '{char}' in short_code '{short_code}'")
+        width, scrambler, legacy_max_id = config
+        if not scrambler:
+            return original_id
 
-            original_id += char_value * (cls.BASE**i)
+        if len(short_code) == width:
+            return scrambler.unscramble(original_id)
+
+        if len(short_code) < width and legacy_max_id is not None and original_id > legacy_max_id:
+            # Refuse plain codes for ids issued after scrambling was enabled.
+            raise ValueError(f"Unknown short_code '{short_code}'")
 
         return original_id
+
+    @staticmethod
+    def is_alias(code: str) -> bool:
+        """True if ``code`` belongs to the alias namespace; it is then never decoded."""
+        return '-' in code or '_' in code or len(code) > _max_code_length()
+
+    @classmethod
+    def is_valid_alias(cls, alias: str) -> bool:
+        return bool(ALIAS_PATTERN.fullmatch(alias)) and cls.is_alias(alias)
+
+    @staticmethod
+    def _encode(id_num: int) -> str:
+        # Least significant digit first, same layout as the original codes. Codes
+        # are a few pairs long: appending to a str beats a list and join(), and
+        # % and // beat a divmod() call.
+        code = ''
+        while id_num >= _PAIR_BASE:
+            code += _DIGIT_PAIRS[id_num % _PAIR_BASE]
+            id_num //= _PAIR_BASE
+
+        return code + (_DIGIT_PAIRS[id_num] if id_num >= BASE else CHAR_SET[id_num])
+
+    @staticmethod
+    def _decode(short_code: str) -> int:
+        try:
+            raw = short_code.encode('ascii')
+        except UnicodeEncodeError:
+            raise ValueError(f"Invalid character in short_code '{short_code}'") from None
+
+        # Horner's rule, walking from the most significant (last) digit.
+        original_id = 0
+        for byte in reversed(raw):
+            char_value = _DECODE_TABLE[byte]
+            if char_value == _INVALID:
+                raise ValueError(f"Invalid character '{chr(byte)}' in short_code '{short_code}'")
+
+            original_id = original_id * BASE + char_value
+
+        return original_id
+
+    @classmethod
+    def encode_many(cls, id_nums) -> list[str]:
+        config = _config or _load_code_config()
+        width, _, _ = config
+        if not width:
+            encode = cls._encode
+            return [encode(id_num) for id_num in id_nums]
+        encode = cls._encode_with
+        return [encode(id_num, config) for id_num in id_nums]
+
+    @classmethod
+    def decode_many(cls, short_codes) -> list[int]:
+        config = _config or _load_code_config()
+        _, scrambler, _ = config
+        if not scrambler:
+            decode = cls._decode
+            return [decode(short_code) for short_code in short_codes]
+        decode = cls._decode_with
+        return [decode(short_code, config) for short_code in short_codes]
@@ -0,0 +1,105 @@
+"""Stampede protection for read-through cache entries.
+
+Two complementary guards, usable with any Django cache:
+
+* Single flight: concurrent misses for one key in this process wait for the
+  first caller's load instead of each running it.
+* Probabilistic early refresh (XFetch): an entry is stored as ``Stamped`` with
+  the time its load took and its expiry. Each read refreshes it early with a
+  probability that grows as expiry approaches and with the cost of the load,
+  so a hot key is reloaded by one request shortly before it expires instead
+  of by all of them just after.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Any, NamedTuple, Self
+
+from django.conf import settings
+
+
+class Stamped(NamedTuple):
+    value: Any
+    # Seconds the load took; 0 disables early refresh for the entry.
+    delta: float
+    expires_at: float
+
+    @classmethod
+    def wrap(cls, value, delta: float, timeout: float) -> Self:
+        return cls(value, delta, time.time() + timeout)
+
+
+def refresh_early(stamped: Stamped) -> bool:
+    """XFetch: true if this reader should reload ``stamped`` before it expires."""
+    if not stamped.delta:
+        return False
+    jitter = -math.log(1.0 - random.random())  # Exponential(1); 1 - random() is never 0.
+    return time.time() + stamped.delta * settings.SHORTURL_CACHE_XFETCH_BETA * jitter >= (
+        stamped.expires_at
+    )
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one load per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+    def do(self, key: str, load):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = load()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: str, load):
+        """Async counterpart of do(); ``load`` is a coroutine function."""
+        future = self._async_calls.get(key)
+        if future is not None and future.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(future)
+
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await load()
+        except BaseException as error:
+            future.set_exception(error)
+            # Nobody may be waiting; do not log "exception was never retrieved".
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._async_calls.get(key) is future:
+                del self._async_calls[key]
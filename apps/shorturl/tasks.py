@@ -1,12 +1,38 @@
 from celery import shared_task
 
+from . import buffers, partitions, reaper, rollups
 from .models import AccessLog, ShortUrls
 
 
+# Kept so messages queued before the batching pipeline still get consumed.
 @shared_task
 def store_log(short_url_id, **kwargs):
     try:
         short_url_instance = ShortUrls.objects.get(pk=short_url_id)
-        AccessLog.objects.create(short_url_id=short_url_instance, **kwargs)
+        log = AccessLog.objects.create(short_url_id=short_url_instance, **kwargs)
+        rollups.record([log])
     except ShortUrls.DoesNotExist:
         print(f'Could not find ShortUrls with id={short_url_id} to store access log.')
+
+
+@shared_task
+def flush_clicks():
+    return buffers.flush_clicks()
+
+
+@shared_task
+def drain_access_logs():
+    return buffers.drain_access_logs()
+
+
+@shared_task
+def maintain_access_log_partitions():
+    return {
+        'created': partitions.ensure_partitions(),
+        'dropped': partitions.drop_expired_partitions(),
+    }
+
+
+@shared_task
+def reap_dead_links():
+    return reaper.reap()
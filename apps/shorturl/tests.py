@@ -1,12 +1,69 @@
+import asyncio
+import base64
+import gzip
+import importlib.util
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
 from datetime import timedelta
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import DatabaseError, DataError, IntegrityError, OperationalError, connection
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.test import APITestCase
 
-from .models import ShortUrls
-from .services import ShortUrlService
+from . import exports, fastpath, metrics, partitions, reaper
+from .bloom import BloomFilter, get_bloom
+from .buffers import (
+    LocalClickBuffer,
+    LocalLogBuffer,
+    access_record,
+    drain_access_logs,
+    flush_clicks,
+    get_click_buffer,
+    get_log_buffer,
+)
+from .cache import ShortUrlCache
+from .db_backends.base import DatabaseWrapper
+from .hll import HyperLogLog
+from .ids import IdAllocator, SequenceIdAllocator, get_id_allocator
+from .models import AccessLog, ClickRollup, DimensionRollup, ShortUrlArchive, ShortUrls
+from .pagination import EstimatedCountPaginator, keyset_ranges
+from .redis_client import get_async_redis
+from .replicas import STICKY_COOKIE, LagMonitor, ReplicaMiddleware, ReplicaRouter, get_lag_monitor
+from .serializers import ShortUrlsSerializer
+from .services import ShortUrlService, normalize_url, url_hash
+from .stampede import SingleFlight, Stamped, refresh_early
+from .throttling import LocalRateLimiter, get_rate_limiter
+from .views import redirectShortCodeAsync
+
+
+def reset_buffers():
+    """清空快取與程序內的點擊 / 存取紀錄緩衝區，避免測試間互相影響"""
+    cache.clear()
+    get_click_buffer().drain()
+    get_log_buffer().pop(10**6)
+    get_bloom.cache_clear()
+    get_rate_limiter.cache_clear()
+
+
+# 避免程序內緩衝區在測試中途自行 flush
+buffered = override_settings(SHORTURL_CLICK_FLUSH_INTERVAL=3600, SHORTURL_LOG_FLUSH_INTERVAL=3600)
+
+# 非同步視圖會在背景建立 Bloom filter，但背景連線看不到測試交易內的資料
+without_bloom = override_settings(SHORTURL_BLOOM_ENABLED=False)
 
 
 class ShortUrlServiceTests(APITestCase):
@@ -33,6 +90,75 @@ class ShortUrlServiceTests(APITestCase):
         with self.assertRaises(ValueError):
             ShortUrlService.decode(invalid_code)
 
+        # 非 ASCII 字元也應視為無效
+        with self.assertRaises(ValueError):
+            ShortUrlService.decode('ab中')
+
+    def test_encode_keeps_existing_codes(self):
+        """查表加速後產生的短碼必須與既有短碼完全相同 (低位在前)"""
+        self.assertEqual(ShortUrlService.encode(61), 'Z')
+        self.assertEqual(ShortUrlService.encode(62), '01')
+        self.assertEqual(ShortUrlService.encode(3844), '001')
+        self.assertEqual(ShortUrlService.encode(12345), '7d3')
+
+    def test_encode_many_and_decode_many(self):
+        """批次 API 應保持輸入順序"""
+        ids = [5, 0, 987654321, 62]
+        codes = ShortUrlService.encode_many(ids)
+
+        self.assertEqual(codes, [ShortUrlService.encode(i) for i in ids])
+        self.assertEqual(ShortUrlService.decode_many(codes), ids)
+
+
+@override_settings(SHORTURL_CODE_WIDTH=7, SHORTURL_SCRAMBLE_KEY='test-key')
+class ScrambledShortCodeTests(APITestCase):
+    """
+    1-1. 測試不可枚舉的固定長度短碼 (ID 打散)
+    """
+
+    def test_round_trip_and_fixed_width(self):
+        """打散後的短碼應為固定長度，且能解回原本的 ID"""
+        for original_id in [0, 1, 2, 61, 62, 12345, 987654321, 62**7 - 1]:
+            with self.subTest(original_id=original_id):
+                short_code = ShortUrlService.encode(original_id)
+                self.assertEqual(len(short_code), 7)
+                self.assertEqual(ShortUrlService.decode(short_code), original_id)
+
+    def test_codes_are_not_sequential(self):
+        """連續的 ID 不應產生相鄰的短碼"""
+        codes = ShortUrlService.encode_many(range(1, 101))
+        self.assertEqual(len(set(codes)), 100)
+        decoded = [ShortUrlService._decode(code) for code in codes]
+        self.assertNotEqual(decoded, sorted(decoded))
+
+    def test_legacy_codes_keep_resolving(self):
+        """啟用打散前發出的短碼 (較短) 仍可解回原 ID"""
+        with self.settings(SHORTURL_CODE_WIDTH=None, SHORTURL_SCRAMBLE_KEY=None):
+            legacy_code = ShortUrlService.encode(12345)
+
+        self.assertEqual(ShortUrlService.decode(legacy_code), 12345)
+
+        with self.settings(SHORTURL_SCRAMBLE_LEGACY_MAX_ID=100), self.assertRaises(ValueError):
+            ShortUrlService.decode(legacy_code)
+
+    def test_ids_beyond_width_fall_back_to_plain_codes(self):
+        """超出固定長度範圍的 ID 使用較長的一般短碼"""
+        short_code = ShortUrlService.encode(62**7 + 5)
+        self.assertGreater(len(short_code), 7)
+        self.assertEqual(ShortUrlService.decode(short_code), 62**7 + 5)
+
+    def test_redirect_with_scrambled_code(self):
+        """API 回傳的打散短碼可以正常重定向"""
+        reset_buffers()
+        response = self.client.post(
+            reverse('shorturls-list'), {'original_url': 'https://docs.python.org'}, format='json'
+        )
+        short_code = response.data['short_url'].rstrip('/').rsplit('/', 1)[-1]
+        self.assertEqual(len(short_code), 7)
+
+        redirect_response = self.client.get(reverse('redirect', kwargs={'short_code': short_code}))
+        self.assertEqual(redirect_response.url, 'https://docs.python.org')
+
 
 class ShortUrlsAPITests(APITestCase):
     """
@@ -42,6 +168,8 @@ class ShortUrlsAPITests(APITestCase):
 
     def setUp(self):
         """在每個測試方法執行前，先建立一些測試資料"""
+        # 節流紀錄也存在快取中，清掉以免其他測試用完額度
+        reset_buffers()
         self.url1 = ShortUrls.objects.create(original_url='https://www.google.com')
         self.url2 = ShortUrls.objects.create(original_url='https://www.djangoproject.com')
 
@@ -103,6 +231,7 @@ class RedirectViewTests(APITestCase):
     """
 
     def setUp(self):
+        reset_buffers()
         self.google_url = 'https://www.google.com'
         self.short_url_instance = ShortUrls.objects.create(original_url=self.google_url)
         self.short_code = ShortUrlService.encode(self.short_url_instance.id)
@@ -118,12 +247,14 @@ class RedirectViewTests(APITestCase):
         # 2. 驗證重定向的目標 URL 是否正確
         self.assertEqual(response.url, self.google_url)
 
-        # 3. 驗證點擊次數是否增加
+        # 3. 驗證點擊次數是否增加 (點擊先進緩衝區，flush 後才寫回資料庫)
+        flush_clicks()
         self.short_url_instance.refresh_from_db()
         self.assertEqual(self.short_url_instance.clicks_count, 1)
 
         # 再次存取，驗證點擊次數會累加
         self.client.get(url)
+        flush_clicks()
         self.short_url_instance.refresh_from_db()
         self.assertEqual(self.short_url_instance.clicks_count, 2)
 
@@ -160,3 +291,1791 @@ class RedirectViewTests(APITestCase):
 
         # 因為 ActiveManager 會過濾掉過期的 URL，所以應該找不到
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@buffered
+class RedirectCacheTests(APITestCase):
+    """
+    4. 測試重定向快取 (Read-through cache)
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_cache_hit_skips_select(self):
+        """第一次重定向後，之後的請求不應再 SELECT ShortUrls"""
+        self.client.get(self.url)
+
+        # 點擊數與存取紀錄都進緩衝區，不應有任何查詢
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.url, 'https://www.google.com')
+
+    def test_update_rewrites_cache(self):
+        """透過 API 更新 original_url 後，快取應被改寫"""
+        self.client.get(self.url)
+
+        detail_url = reverse('shorturls-detail', kwargs={'pk': self.instance.pk})
+        self.client.patch(detail_url, {'original_url': 'https://docs.python.org'}, format='json')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.url, 'https://docs.python.org')
+
+    def test_update_inactive_is_not_served_from_cache(self):
+        """停用後即使快取仍有資料也應回傳 404"""
+        self.client.get(self.url)
+
+        detail_url = reverse('shorturls-detail', kwargs={'pk': self.instance.pk})
+        self.client.patch(detail_url, {'is_active': False}, format='json')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_destroy_invalidates_cache(self):
+        """軟刪除後快取應失效"""
+        self.client.get(self.url)
+
+        self.client.delete(reverse('shorturls-detail', kwargs={'pk': self.instance.pk}))
+
+        self.assertIsNone(cache.get(ShortUrlCache.key(self.instance.id)))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_timeout_follows_expires_at(self):
+        """快取存活時間不應超過 expires_at"""
+        soon = timezone.now() + timedelta(seconds=30)
+        self.assertLessEqual(ShortUrlCache.timeout_for(soon), 30)
+        self.assertEqual(ShortUrlCache.timeout_for(timezone.now() - timedelta(seconds=1)), 0)
+
+
+@buffered
+class ClickBufferTests(APITestCase):
+    """
+    5. 測試點擊數緩衝與批次寫回
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.buffer = get_click_buffer()
+        self.url1 = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url2 = ShortUrls.objects.create(original_url='https://www.djangoproject.com')
+
+    def test_redirect_does_not_update_row(self):
+        """重定向只累加緩衝區，不直接 UPDATE clicks_count"""
+        url = reverse('redirect', kwargs={'short_code': ShortUrlService.encode(self.url1.id)})
+        self.client.get(url)
+        self.client.get(url)
+
+        self.url1.refresh_from_db()
+        self.assertEqual(self.url1.clicks_count, 0)
+        self.assertEqual(self.buffer.pending(self.url1.id), 2)
+
+    def test_flush_applies_all_deltas(self):
+        """flush_clicks 應一次把所有累積的點擊數寫回"""
+        self.buffer.incr(self.url1.id, 3)
+        self.buffer.incr(self.url2.id, 5)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_clicks(), 8)
+
+        self.url1.refresh_from_db()
+        self.url2.refresh_from_db()
+        self.assertEqual(self.url1.clicks_count, 3)
+        self.assertEqual(self.url2.clicks_count, 5)
+        self.assertEqual(self.buffer.pending(self.url1.id), 0)
+
+    def test_serializer_includes_pending_clicks(self):
+        """API 回傳的 clicks_count 應為資料庫值 + 尚未寫回的點擊數"""
+        ShortUrls.objects.filter(pk=self.url1.pk).update(clicks_count=10)
+        self.buffer.incr(self.url1.id, 2)
+
+        detail = self.client.get(reverse('shorturls-detail', kwargs={'pk': self.url1.pk}))
+        self.assertEqual(detail.data['clicks_count'], 12)
+
+        listing = self.client.get(reverse('shorturls-list'))
+        counts = {row['id']: row['clicks_count'] for row in listing.data['results']}
+        self.assertEqual(counts[self.url1.id], 12)
+        self.assertEqual(counts[self.url2.id], 0)
+
+    @override_settings(SHORTURL_CLICK_FLUSH_INTERVAL=0)
+    def test_failed_inline_flush_does_not_fail_redirect(self):
+        """程序內緩衝區在重定向中 flush 失敗時，重定向照常完成，點擊數留待下次寫回"""
+        url = reverse('redirect', kwargs={'short_code': ShortUrlService.encode(self.url1.id)})
+        with (
+            mock.patch.object(ShortUrls._base_manager, 'filter', side_effect=DatabaseError),
+            self.assertLogs('shorturl.buffers', 'ERROR'),
+        ):
+            self.buffer.incr(self.url1.id)
+        self.assertEqual(self.buffer.pending(self.url1.id), 1)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.url1.refresh_from_db()
+        self.assertEqual(self.url1.clicks_count, 2)
+
+    def test_local_buffer_flushes_on_exit(self):
+        """程序內緩衝區應在程序結束時寫回剩餘的點擊數，沒有流量時也不會遺失"""
+        with mock.patch('atexit.register') as register:
+            buffer = LocalClickBuffer()
+        register.assert_called_once_with(buffer._flush)
+
+        buffer.incr(self.url1.id, 4)
+        with self.assertNumQueries(1):
+            buffer._flush()
+        with self.assertNumQueries(0):
+            buffer._flush()
+
+        self.url1.refresh_from_db()
+        self.assertEqual(self.url1.clicks_count, 4)
+
+
+@buffered
+class AccessLogPipelineTests(APITestCase):
+    """
+    6. 測試存取紀錄的批次寫入
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_redirect_queues_log_record(self):
+        """重定向只把紀錄放進佇列，不直接寫入 AccessLog"""
+        self.client.get(self.url, HTTP_USER_AGENT='test-agent', HTTP_REFERER='https://example.com')
+
+        self.assertEqual(AccessLog.objects.count(), 0)
+        self.assertEqual(get_log_buffer().depth(), 1)
+
+    def test_drain_bulk_creates_logs(self):
+        """drain_access_logs 應以單次 bulk_create 寫入整批紀錄"""
+        for _ in range(5):
+            self.client.get(self.url, HTTP_USER_AGENT='test-agent')
+
+        # 1 次查詢確認 short_url 存在 + 1 次 bulk INSERT + 兩張 rollup 表各 3 次查詢
+        # (補建空列、鎖定、bulk UPDATE) + 測試交易內的 4 次 SAVEPOINT/RELEASE；
+        # 查詢數與批次大小無關
+        with self.assertNumQueries(12):
+            stats = drain_access_logs()
+
+        self.assertEqual(stats['stored'], 5)
+        self.assertEqual(stats['queue_depth'], 0)
+        logs = AccessLog.objects.filter(short_url_id=self.instance)
+        self.assertEqual(logs.count(), 5)
+        self.assertEqual(logs.first().user_agent, 'test-agent')
+
+    def test_drain_drops_unknown_short_urls(self):
+        """已被實體刪除的 short_url 紀錄應被略過，而非讓整批失敗"""
+        self.client.get(self.url)
+        ShortUrls._base_manager.filter(pk=self.instance.pk).delete()
+
+        stats = drain_access_logs()
+        self.assertEqual(stats['stored'], 0)
+        self.assertEqual(stats['dropped'], 1)
+
+    def test_forwarded_for_uses_first_valid_hop(self):
+        """X-Forwarded-For 只取第一個位址，無效的位址存成 None"""
+        self.client.get(self.url, HTTP_X_FORWARDED_FOR='203.0.113.1, 10.0.0.1')
+        self.client.get(self.url, HTTP_X_FORWARDED_FOR='unknown')
+        drain_access_logs()
+
+        ips = list(AccessLog.objects.order_by('accessed_at').values_list('ip_address', flat=True))
+        self.assertEqual(ips, ['203.0.113.1', None])
+
+    def test_bad_record_is_discarded(self):
+        """寫入失敗的單筆紀錄應被捨棄，而非讓整批一直退回佇列開頭"""
+        for agent in ('good', 'bad', 'good'):
+            self.client.get(self.url, HTTP_USER_AGENT=agent)
+        bulk_create = AccessLog.objects.bulk_create
+
+        def failing_bulk_create(logs, **kwargs):
+            if any(log.user_agent == 'bad' for log in logs):
+                raise DataError('bad row')
+            return bulk_create(logs, **kwargs)
+
+        with (
+            mock.patch.object(AccessLog.objects, 'bulk_create', failing_bulk_create),
+            self.assertLogs('shorturl.buffers', 'ERROR'),
+        ):
+            stats = drain_access_logs()
+
+        self.assertEqual((stats['stored'], stats['dropped'], stats['queue_depth']), (2, 1, 0))
+        self.assertEqual(AccessLog.objects.filter(user_agent='good').count(), 2)
+
+    @override_settings(SHORTURL_LOG_BATCH_SIZE=1)
+    def test_failed_inline_drain_does_not_fail_redirect(self):
+        """程序內佇列在重定向中寫入失敗時，重定向照常完成，紀錄留在佇列"""
+        with (
+            mock.patch.object(AccessLog.objects, 'bulk_create', side_effect=OperationalError),
+            self.assertLogs('shorturl.buffers', 'ERROR'),
+        ):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(get_log_buffer().depth(), 1)
+
+    @override_settings(SHORTURL_LOG_BATCH_SIZE=2)
+    def test_local_buffer_drains_on_exit(self):
+        """程序內佇列應在程序結束時寫入全部剩餘紀錄，而不只一個 chunk"""
+        with mock.patch('atexit.register') as register:
+            buffer = LocalLogBuffer()
+        register.assert_called_once_with(buffer._drain_all)
+
+        for _ in range(5):
+            buffer._records.append(access_record(self.instance.id, '10.0.0.1', 'agent', None))
+        buffer._drain_all()
+
+        self.assertEqual(buffer.depth(), 0)
+        self.assertEqual(AccessLog.objects.filter(short_url_id=self.instance).count(), 5)
+
+
+@buffered
+@without_bloom
+class AsyncRedirectViewTests(APITestCase):
+    """
+    7. 測試非同步 (ASGI) 重定向視圖
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.short_code = ShortUrlService.encode(self.instance.id)
+        self.factory = AsyncRequestFactory()
+
+    async def test_async_redirect_success(self):
+        """非同步視圖應與同步版本行為一致：重定向並累加點擊與紀錄"""
+        request = self.factory.get(f'/{self.short_code}/')
+        response = await redirectShortCodeAsync(request, self.short_code)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, 'https://www.google.com')
+        self.assertEqual(get_click_buffer().pending(self.instance.id), 1)
+        self.assertEqual(get_log_buffer().depth(), 1)
+
+    async def test_async_redirect_not_found(self):
+        """不存在或無效的 short_code 應回傳 404"""
+        request = self.factory.get('/x/')
+        with self.assertRaises(Http404):
+            await redirectShortCodeAsync(request, ShortUrlService.encode(99999))
+
+        response = await redirectShortCodeAsync(request, '$$$')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrent_alias_misses_share_one_query(self):
+        """同一個別名同時未命中時，非同步路徑也只查詢一次資料庫"""
+        ShortUrls.objects.create(original_url='https://www.djangoproject.com', alias='my-link')
+
+        async def lookups():
+            return await asyncio.gather(*(ShortUrlCache.aget_alias('my-link') for _ in range(5)))
+
+        with self.assertNumQueries(1):
+            entries = async_to_sync(lookups)()
+        self.assertEqual(
+            {entry.original_url for entry in entries}, {'https://www.djangoproject.com'}
+        )
+
+    @override_settings(SHORTURL_REDIS_URL='redis://localhost:6379/0')
+    def test_async_redis_client_per_event_loop(self):
+        """asyncio Redis 客戶端依事件迴圈區分，不會跨迴圈共用連線"""
+
+        async def clients():
+            return get_async_redis(), get_async_redis()
+
+        first, same = async_to_sync(clients)()
+        second, _ = async_to_sync(clients)()
+        self.assertIs(first, same)
+        self.assertIsNot(first, second)
+
+
+class BulkCreateTests(APITestCase):
+    """
+    8. 測試批次建立短網址 POST /api/shorturls/bulk/
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.url = reverse('shorturls-bulk-create')
+
+    @override_settings(SHORTURL_BULK_CREATE_BATCH_SIZE=2)
+    def test_bulk_create_json_list(self):
+        """JSON 陣列應依序回傳 short_url，並以批次 INSERT 寫入"""
+        data = [{'original_url': f'https://example.com/{i}'} for i in range(5)]
+
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [row['original_url'] for row in response.data], [d['original_url'] for d in data]
+        )
+        for row in response.data:
+            self.assertIn(ShortUrlService.encode(row['id']), row['short_url'])
+        self.assertEqual(ShortUrls.objects.count(), 5)
+
+    def test_bulk_create_is_all_or_nothing(self):
+        """任一筆驗證失敗時，整批都不應寫入"""
+        data = [{'original_url': 'https://example.com'}, {'original_url': 'not a url'}]
+
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ShortUrls.objects.count(), 0)
+
+    @override_settings(SHORTURL_BULK_MAX_ITEMS=2)
+    def test_bulk_create_rejects_oversized_list(self):
+        """超過 SHORTURL_BULK_MAX_ITEMS 的 JSON 陣列應被拒絕"""
+        data = [{'original_url': f'https://example.com/{i}'} for i in range(3)]
+
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SHORTURL_BULK_CREATE_BATCH_SIZE=2)
+    def test_bulk_create_ndjson_stream(self):
+        """NDJSON 逐行處理，每行輸出一筆結果，錯誤的行不影響其他行"""
+        body = '\n'.join(
+            [
+                json.dumps({'original_url': 'https://example.com/a'}),
+                '{broken',
+                json.dumps({'original_url': 'https://example.com/b'}),
+                '',
+                json.dumps({'original_url': 'nope'}),
+            ]
+        )
+
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['line'] for row in rows], [1, 2, 3, 5])
+        self.assertEqual(rows[0]['original_url'], 'https://example.com/a')
+        self.assertIn('errors', rows[1])
+        self.assertIn(ShortUrlService.encode(rows[2]['id']), rows[2]['short_url'])
+        self.assertIn('original_url', rows[3]['errors'])
+        self.assertEqual(ShortUrls.objects.count(), 2)
+
+
+@override_settings(SHORTURL_LIST_PAGINATION='cursor')
+class KeysetPaginationTests(APITestCase):
+    """
+    9. 測試 keyset (cursor) 分頁
+    """
+
+    def setUp(self):
+        reset_buffers()
+        now = timezone.now()
+        for i in range(7):
+            instance = ShortUrls.objects.create(
+                original_url=f'https://example.com/{i}', is_active=i % 3 != 0
+            )
+            # 讓部分資料的 create_at 相同，驗證 id 作為 tie-breaker
+            ShortUrls.objects.filter(pk=instance.pk).update(
+                create_at=now + timedelta(minutes=i // 2)
+            )
+        self.expected = list(
+            ShortUrls.objects.order_by('-is_active', 'create_at', 'id').values_list('id', flat=True)
+        )
+        self.url = reverse('shorturls-list')
+
+    def test_walk_forward_and_backward(self):
+        """沿著 next 走完所有頁面，再沿著 previous 走回來，順序應一致且不重複"""
+        seen, pages = [], []
+        next_url = f'{self.url}?page_size=3'
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([row['id'] for row in response.data['results']])
+            seen.extend(pages[-1])
+            last = response.data
+            next_url = last['next']
+
+        self.assertEqual(seen, self.expected)
+
+        previous_url = last['previous']
+        for page in reversed(pages[:-1]):
+            response = self.client.get(previous_url)
+            self.assertEqual([row['id'] for row in response.data['results']], page)
+            previous_url = response.data['previous']
+        self.assertIsNone(previous_url)
+
+    def test_count_is_optional(self):
+        """只有在 ?count= 時才計算總數"""
+        response = self.client.get(f'{self.url}?count=exact')
+        self.assertEqual(response.data['count'], 7)
+
+        response = self.client.get(f'{self.url}?count=estimate')
+        self.assertIn('count', response.data)
+
+    def test_page_size_is_capped(self):
+        """page_size 不可超過 SHORTURL_MAX_PAGE_SIZE"""
+        response = self.client.get(f'{self.url}?page_size=1000')
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_invalid_cursor(self):
+        """無效的 cursor 應回傳 404"""
+        response = self.client.get(f'{self.url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_values(self):
+        """格式正確但欄位值型別錯誤的 cursor 也應回傳 404，而不是 500"""
+        for key in ([True, 'not-a-date', 1], [True, '2024-01-01T00:00:00+00:00', 'x'], [None] * 3):
+            with self.subTest(key=key):
+                raw = json.dumps({'k': key, 'r': False}).encode()
+                cursor = base64.urlsafe_b64encode(raw).decode()
+                response = self.client.get(f'{self.url}?cursor={cursor}')
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are PostgreSQL-specific')
+class QueryPlanTests(APITestCase):
+    """
+    10. 查詢計畫回歸測試：在足量的種子資料上，主要查詢不可退化為 Seq Scan
+    """
+
+    URL_COUNT = 20_000
+    LOG_COUNT = 50_000
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        ShortUrls.objects.bulk_create(
+            [
+                ShortUrls(
+                    original_url=f'https://example.com/{i}',
+                    is_active=i % 10 != 0,
+                    is_deleted=i % 50 == 0,
+                    # 少數連結已過期，其餘在未來一年內陸續到期
+                    expires_at=now + timedelta(minutes=i * 20 - 2_000),
+                )
+                for i in range(cls.URL_COUNT)
+            ],
+            batch_size=5_000,
+        )
+        ids = list(ShortUrls._base_manager.values_list('id', flat=True))
+        cls.sample_id = ids[len(ids) // 2]
+        AccessLog.objects.bulk_create(
+            [
+                AccessLog(
+                    short_url_id_id=ids[i % len(ids)],
+                    accessed_at=now - timedelta(seconds=i),
+                    user_agent='seed',
+                )
+                for i in range(cls.LOG_COUNT)
+            ],
+            batch_size=5_000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE shorturl_shorturls')
+            cursor.execute('ANALYZE shorturl_accesslog')
+
+    def assertNoSeqScan(self, queryset):
+        """Seq Scan 只允許出現在空的資料表 (例如尚未寫入的未來分割區)"""
+        plan = json.loads(queryset.explain(format='json'))
+
+        def seq_scans(node):
+            if node['Node Type'] == 'Seq Scan':
+                yield node['Relation Name']
+            for child in node.get('Plans', []):
+                yield from seq_scans(child)
+
+        relations = list(seq_scans(plan[0]['Plan']))
+        if relations:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT relname FROM pg_class WHERE relname = ANY(%s) AND reltuples > 0',
+                    [relations],
+                )
+                scanned = [row[0] for row in cursor.fetchall()]
+            self.assertEqual(scanned, [], msg=f'\n{queryset.query}\n{queryset.explain()}')
+
+    def plan_nodes(self, queryset, **options) -> list[dict]:
+        """EXPLAIN (FORMAT JSON) 的所有節點"""
+        plan = json.loads(queryset.explain(format='json', **options))
+
+        def walk(node):
+            yield node
+            for child in node.get('Plans', []):
+                yield from walk(child)
+
+        return list(walk(plan[0]['Plan']))
+
+    def test_redirect_lookup(self):
+        """重定向查詢 (ShortUrlCache) 應走主鍵索引"""
+        self.assertNoSeqScan(
+            ShortUrls.objects.filter(pk=self.sample_id).values_list(
+                'id', 'original_url', 'is_active', 'expires_at'
+            )
+        )
+
+    def test_url_hash_lookup(self):
+        """「沿用既有連結」的查詢應走 url_hash 索引"""
+        self.assertNoSeqScan(
+            ShortUrls.objects.filter(url_hash__in=[url_hash('https://example.com')], is_active=True)
+        )
+
+    def test_alias_lookup(self):
+        """以別名重定向時應走 alias 的唯一索引"""
+        self.assertNoSeqScan(ShortUrlCache._alias_queryset('some-alias'))
+
+    def test_list_pages(self):
+        """列表的第一頁與深層頁面都應走 keyset 索引"""
+        ordering = ('-is_active', 'create_at', 'id')
+        queryset = ShortUrls.objects.order_by(*ordering)
+        self.assertNoSeqScan(queryset[:4])
+
+        boundary = queryset[self.URL_COUNT // 2]
+        key = [boundary.is_active, boundary.create_at, boundary.id]
+        # 同一個 is_active 內接續 cursor 的範圍，以及換到下一個 is_active 值的範圍
+        bounds = ['ROW(create_at, id) > ROW(', 'is_active < ']
+        for condition, bound in zip(keyset_ranges(ShortUrls, key, ordering), bounds, strict=True):
+            page = queryset.filter(condition)[:4]
+            self.assertNoSeqScan(page)
+            # cursor 的邊界必須是 Index Cond (索引定位)，而不是逐列過濾的 Filter；
+            # 否則深層頁面仍需讀過 cursor 之前的所有資料
+            nodes = self.plan_nodes(page, analyze=True)
+            index_conds = [node.get('Index Cond', '') for node in nodes]
+            self.assertTrue(
+                any(bound in index_cond for index_cond in index_conds),
+                msg=f'\n{page.explain()}',
+            )
+            removed = sum(node.get('Rows Removed by Filter', 0) for node in nodes)
+            self.assertLess(removed, 100, msg=f'\n{page.explain(analyze=True)}')
+
+    def test_expired_links(self):
+        """已過期但未刪除的連結應走 partial index"""
+        self.assertNoSeqScan(
+            ShortUrls._base_manager.filter(is_deleted=False, expires_at__lte=timezone.now())
+        )
+
+    def test_access_log_history(self):
+        """單一連結的存取紀錄 (依時間排序、時間區間) 應走複合索引"""
+        logs = AccessLog.objects.filter(short_url_id=self.sample_id)
+        self.assertNoSeqScan(logs.order_by('-accessed_at')[:20])
+        self.assertNoSeqScan(
+            logs.filter(accessed_at__gte=timezone.now() - timedelta(hours=1)).order_by(
+                'accessed_at'
+            )
+        )
+
+
+class PartitionPeriodTests(APITestCase):
+    """
+    11-1. 測試分割區的期間計算
+    """
+
+    def test_month_and_day_periods(self):
+        """月份與日期的邊界計算 (含跨年)"""
+        moment = timezone.make_aware(timezone.datetime(2026, 12, 18, 15, 30))
+
+        lower = partitions.period_start(moment, 'month')
+        upper = partitions.next_period(lower, 'month')
+        self.assertEqual(timezone.localtime(lower).date().isoformat(), '2026-12-01')
+        self.assertEqual(timezone.localtime(upper).date().isoformat(), '2027-01-01')
+        self.assertEqual(partitions.partition_name(lower, 'month'), 'shorturl_accesslog_p202612')
+
+        day = partitions.period_start(moment, 'day')
+        self.assertEqual(partitions.next_period(day, 'day') - day, timedelta(days=1))
+        self.assertEqual(partitions.partition_name(day, 'day'), 'shorturl_accesslog_p20261218')
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'AccessLog partitioning is PostgreSQL-only')
+class AccessLogPartitionTests(APITestCase):
+    """
+    11-2. 測試 AccessLog 分割區的建立與保留期限
+    """
+
+    def setUp(self):
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+
+    def test_current_period_is_partitioned(self):
+        """migration 後應已有涵蓋目前時間的分割區"""
+        now = timezone.now()
+        self.assertTrue(
+            any(lower <= now < upper for _, lower, upper in partitions.list_partitions())
+        )
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        """預先落入 DEFAULT 分割區的資料，在建立對應分割區時應被搬移"""
+        future = partitions.list_partitions()[-1][2] + timedelta(days=40)
+        log = AccessLog.objects.create(short_url_id=self.instance, accessed_at=future)
+
+        created = partitions.ensure_partitions(now=future)
+
+        self.assertTrue(created)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partitions.DEFAULT_PARTITION}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertTrue(AccessLog.objects.filter(pk=log.pk).exists())
+
+    def test_drop_expired_partitions(self):
+        """超過保留期限的分割區應整個被移除，而不是 DELETE"""
+        old_lower = partitions.period_start(timezone.now() - timedelta(days=800), 'month')
+        old_upper = partitions.next_period(old_lower, 'month')
+        name = partitions.create_partition(old_lower, old_upper, 'month')
+        AccessLog.objects.create(short_url_id=self.instance, accessed_at=old_lower)
+        recent = AccessLog.objects.create(short_url_id=self.instance)
+        with connection.cursor() as cursor:
+            # 測試在交易內執行；先檢查延遲的 FK，否則 DROP TABLE 會被擋下
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        dropped = partitions.drop_expired_partitions(retention_days=365)
+
+        self.assertEqual(dropped, [name])
+        self.assertEqual(list(AccessLog.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+@buffered
+class ClickRollupTests(APITestCase):
+    """
+    12. 測試點擊統計 rollup 與 stats 端點
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+        self.stats_url = reverse('shorturls-stats', kwargs={'pk': self.instance.id})
+
+    def visit(self, ip, user_agent='agent-a', referer=None):
+        extra = {'REMOTE_ADDR': ip, 'HTTP_USER_AGENT': user_agent}
+        if referer:
+            extra['HTTP_REFERER'] = referer
+        self.client.get(self.url, **extra)
+
+    def test_hyperloglog_estimate(self):
+        """HyperLogLog 的估計誤差應在合理範圍內，且合併結果等同聯集"""
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            first.add(f'10.0.{i // 256}.{i % 256}')
+        for i in range(2000, 5000):
+            second.add(f'10.0.{i // 256}.{i % 256}')
+
+        self.assertAlmostEqual(first.count(), 3000, delta=300)
+        first.merge(second)
+        self.assertAlmostEqual(first.count(), 5000, delta=500)
+        self.assertEqual(HyperLogLog(bytes(first)).count(), first.count())
+
+    def test_drain_updates_rollups_incrementally(self):
+        """每次 drain 都應累加到同一個時間區間，而不是覆寫"""
+        self.visit('10.0.0.1', referer='https://example.com')
+        self.visit('10.0.0.2')
+        drain_access_logs()
+        self.visit('10.0.0.1', user_agent='agent-b')
+        drain_access_logs()
+
+        rows = {row.period: row for row in ClickRollup.objects.filter(short_url=self.instance)}
+        self.assertEqual(set(rows), {'hour', 'day'})
+        self.assertEqual(rows['day'].clicks, 3)
+        self.assertEqual(HyperLogLog(bytes(rows['day'].visitors)).count(), 2)
+
+        user_agents = dict(
+            DimensionRollup.objects.filter(dimension='user_agent').values_list('value', 'clicks')
+        )
+        self.assertEqual(user_agents, {'agent-a': 2, 'agent-b': 1})
+
+    def test_stats_endpoint_reads_rollups(self):
+        """GET /api/shorturls/{id}/stats/ 只讀取 rollup 表"""
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.1'):
+            self.visit(ip, referer='https://example.com')
+        self.visit('10.0.0.3')
+        drain_access_logs()
+        AccessLog.objects.all().delete()
+
+        response = self.client.get(self.stats_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['clicks'], 4)
+        self.assertEqual(response.data['unique_visitors'], 3)
+        self.assertEqual(len(response.data['series']), 1)
+        self.assertEqual(
+            response.data['top_referers'],
+            [{'value': 'https://example.com', 'clicks': 3}, {'value': '', 'clicks': 1}],
+        )
+
+        hourly = self.client.get(self.stats_url, {'period': 'hour', 'buckets': 24})
+        self.assertEqual(hourly.data['series'][0]['clicks'], 4)
+
+    def test_stats_rejects_bad_parameters(self):
+        """不合法的 period 或 buckets 應回傳 400"""
+        for params in ({'period': 'week'}, {'buckets': 'x'}, {'buckets': 0}):
+            response = self.client.get(self.stats_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReaperTests(APITestCase):
+    """
+    13. 測試失效短網址的批次清除
+    """
+
+    def setUp(self):
+        reset_buffers()
+        now = timezone.now()
+        self.live = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.deleted = ShortUrls.objects.create(original_url='https://deleted.example.com')
+        self.expired = ShortUrls.objects.create(
+            original_url='https://expired.example.com', expires_at=now - timedelta(days=60)
+        )
+        # 剛過期的連結仍在寬限期內
+        self.recent = ShortUrls.objects.create(
+            original_url='https://recent.example.com', expires_at=now - timedelta(days=1)
+        )
+        ShortUrls._base_manager.filter(pk=self.deleted.pk).update(is_deleted=True)
+        for instance in (self.live, self.deleted, self.expired):
+            AccessLog.objects.bulk_create(AccessLog(short_url_id=instance) for _ in range(7))
+
+    @override_settings(SHORTURL_REAPER_BATCH_SIZE=1, SHORTURL_REAPER_LOG_BATCH_SIZE=3)
+    def test_reap_archives_and_purges_in_batches(self):
+        """應分批封存並刪除失效連結及其紀錄，保留仍有效或在寬限期內的連結"""
+        cache.set(ShortUrlCache.key(self.deleted.id), 'stale')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = reaper.reap()
+
+        self.assertEqual(stats['batches'], 2)
+        self.assertEqual(stats['links'], 2)
+        self.assertEqual(stats['logs'], 14)
+        # remaining 在 PostgreSQL 上是規劃器估計值，只確認有回報
+        self.assertIn('remaining', stats)
+        self.assertEqual(
+            set(ShortUrls._base_manager.values_list('pk', flat=True)),
+            {self.live.pk, self.recent.pk},
+        )
+        self.assertEqual(AccessLog.objects.count(), 7)
+        self.assertEqual(
+            set(ShortUrlArchive.objects.values_list('pk', flat=True)),
+            {self.deleted.pk, self.expired.pk},
+        )
+        self.assertIsNone(cache.get(ShortUrlCache.key(self.deleted.id)))
+
+    def test_reap_without_archive(self):
+        """關閉封存時只刪除，不寫入 ShortUrlArchive"""
+        stats = reaper.reap(archive=False)
+
+        self.assertEqual(stats['links'], 2)
+        self.assertEqual(stats['archived'], 0)
+        self.assertFalse(ShortUrlArchive.objects.exists())
+
+
+@buffered
+@override_settings(SHORTURL_BLOOM_SETTLE_SECONDS=0, SHORTURL_BLOOM_ID_HEADROOM=0)
+class UnknownShortCodeTests(APITestCase):
+    """
+    14. 測試未知短網址的 Bloom filter 與負向快取
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.links = [
+            ShortUrls.objects.create(original_url=f'https://example.com/{i}') for i in range(3)
+        ]
+
+    def redirect_url(self, short_url_id):
+        return reverse('redirect', kwargs={'short_code': ShortUrlService.encode(short_url_id)})
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """加入過的值一定回報存在，誤判率應接近設定值，且不超過記憶體上限"""
+        bloom = BloomFilter(10_000, 0.01, 1024 * 1024)
+        for value in range(0, 20_000, 2):
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in range(0, 20_000, 2)))
+        false_positives = sum(value in bloom for value in range(1, 20_000, 2))
+        self.assertLess(false_positives, 10_000 * 0.02)
+
+        capped = BloomFilter(10_000, 0.01, 256)
+        self.assertEqual(len(capped.bits), 256)
+
+    def test_unknown_ids_skip_the_database(self):
+        """Bloom filter 建好後，不存在的 id 不應再查詢資料庫"""
+        ShortUrls._base_manager.filter(pk=self.links[1].pk).delete()
+        get_bloom().refresh(self.links[0].id)
+
+        for short_url_id in (self.links[1].id, self.links[-1].id + 10**6):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.redirect_url(short_url_id))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SHORTURL_BLOOM_ENABLED=False)
+    def test_negative_cache(self):
+        """查無資料的 id 應在短時間內被快取為不存在"""
+        unknown = self.redirect_url(self.links[-1].id + 1)
+        self.assertEqual(self.client.get(unknown).status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(unknown)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_refresh_runs_in_the_background(self):
+        """請求不應同步建立 Bloom filter，且同一時間只啟動一個背景重建"""
+        bloom = get_bloom()
+        with (
+            mock.patch.object(connection, 'in_atomic_block', False),
+            mock.patch.object(threading, 'Thread') as thread,
+            self.assertNumQueries(0),
+        ):
+            bloom.schedule_refresh(self.links[0].id)
+            bloom.schedule_refresh(self.links[0].id)
+            self.assertTrue(bloom.might_exist(self.links[0].id + 10**6))
+        bloom._lock.release()
+
+        thread.assert_called_once()
+        self.assertTrue(thread.call_args.kwargs['daemon'])
+        self.assertIsNone(bloom.snapshot)
+
+    @override_settings(SHORTURL_BLOOM_MIN_REFRESH_SECONDS=0)
+    def test_new_link_after_probe_resolves(self):
+        """即使新 id 先前被探測過 (負向快取、Bloom filter 上限)，建立後也應可重定向"""
+        get_bloom().refresh(self.links[-1].id)
+        self.client.get(self.redirect_url(self.links[-1].id + 1))
+
+        response = self.client.post(
+            reverse('shorturls-list'), {'original_url': 'https://docs.python.org'}, format='json'
+        )
+        redirect = self.client.get(self.redirect_url(response.data['id']))
+
+        self.assertEqual(redirect.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(redirect.url, 'https://docs.python.org')
+
+
+@buffered
+class MetricsTests(APITestCase):
+    """
+    15. 測試 /metrics 與請求量測 middleware
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_request_latency_and_queries_per_view(self):
+        """每個請求應依 view 名稱記錄延遲與查詢數 (而非依短網址路徑)"""
+        latency_before = metrics.REQUEST_LATENCY.count('redirect', 'GET', 302)
+        queries_before = metrics.REQUEST_QUERIES.count('shorturls-list')
+        db_before = metrics.DB_QUERIES.value('default')
+
+        self.client.get(self.url)
+        self.client.get(reverse('shorturls-list'))
+
+        self.assertEqual(metrics.REQUEST_LATENCY.count('redirect', 'GET', 302), latency_before + 1)
+        self.assertEqual(metrics.REQUEST_QUERIES.count('shorturls-list'), queries_before + 1)
+        self.assertGreater(metrics.DB_QUERIES.value('default'), db_before)
+
+    def test_unknown_methods_share_one_label(self):
+        """非標準的 HTTP 方法應歸入 'other'，避免用戶端製造無上限的時間序列"""
+        before = metrics.REQUEST_LATENCY.count('shorturls-list', 'other', 405)
+
+        for method in ('FOO', 'BAR'):
+            self.client.generic(method, reverse('shorturls-list'))
+
+        self.assertEqual(metrics.REQUEST_LATENCY.count('shorturls-list', 'other', 405), before + 2)
+        self.assertEqual(metrics.REQUEST_LATENCY.count('shorturls-list', 'FOO', 405), 0)
+
+    def test_cache_lookups(self):
+        """重定向快取的命中與未命中應分別計數"""
+        hits = metrics.CACHE_LOOKUPS.value('hit')
+        misses = metrics.CACHE_LOOKUPS.value('miss')
+
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        self.assertEqual(metrics.CACHE_LOOKUPS.value('miss'), misses + 1)
+        self.assertEqual(metrics.CACHE_LOOKUPS.value('hit'), hits + 1)
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        """GET /metrics 應回傳 Prometheus 文字格式"""
+        self.client.get(self.url)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE shorturl_http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'shorturl_http_request_duration_seconds_bucket{view="redirect",method="GET",'
+            'status="302",le="+Inf"}',
+            body,
+        )
+        self.assertIn('shorturl_access_log_queue_depth 1', body)
+
+    def test_metrics_requires_staff_by_default(self):
+        """未設定 token 時，/metrics 只開放給 staff，匿名與一般使用者應被拒絕"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(User.objects.create_user('user', password='x'))
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(SHORTURL_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """設定 token 後，未帶 Bearer token 的抓取應被拒絕"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@buffered
+class FastRedirectTests(APITestCase):
+    """
+    16. 測試重定向快速路徑 (FastRedirectMiddleware)
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_redirect_skips_remaining_middleware(self):
+        """短網址請求應直接重定向，不經過 session / auth 等 middleware"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, 'https://www.google.com')
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertFalse(hasattr(response.wsgi_request, 'user'))
+        self.assertEqual(response.wsgi_request.resolver_match.view_name, 'redirect')
+        self.assertEqual(get_log_buffer().depth(), 1)
+
+    @without_bloom
+    async def test_async_stack(self):
+        """ASGI 下的 middleware 鏈也應走快速路徑"""
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, 'https://www.google.com')
+        self.assertFalse(hasattr(response.asgi_request, 'session'))
+
+    def test_unknown_and_invalid_codes(self):
+        """快速路徑對不存在或含無效字元的短網址仍應回傳 404"""
+        response = self.client.get(f'/{ShortUrlService.encode(99999)}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/$$$/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_other_routes_use_full_stack(self):
+        """其他路由與非 GET/HEAD 請求應走完整的 middleware 與 URL 解析"""
+        self.assertIn('api', fastpath.reserved_segments())
+        self.assertIn('admin', fastpath.reserved_segments())
+
+        response = self.client.get('/api/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(response.wsgi_request, 'user'))
+
+        response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertIn('/admin/login/', response.url)
+
+        response = self.client.post(self.url)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+    @override_settings(SHORTURL_FAST_REDIRECT=False)
+    def test_disabled(self):
+        """關閉 SHORTURL_FAST_REDIRECT 後，重定向應回到完整的 middleware 流程"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+
+class RateLimitTests(APITestCase):
+    """
+    17. 測試 GCRA 限流 (API 與重定向)
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_gcra_burst_and_recovery(self):
+        """連續請求超過 burst 後應被拒絕，並在一個間隔後恢復"""
+        limiter = LocalRateLimiter()
+
+        self.assertEqual(limiter.hit('k', 0.05, 2), 0)
+        self.assertEqual(limiter.hit('k', 0.05, 2), 0)
+        wait = limiter.hit('k', 0.05, 2)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.05)
+        # 其他 key 不受影響
+        self.assertEqual(limiter.hit('other', 0.05, 2), 0)
+
+        time.sleep(wait + 0.01)
+        self.assertEqual(limiter.hit('k', 0.05, 2), 0)
+
+    def test_api_anon_limit(self):
+        """匿名使用者超過 anon 速率後應回傳 429 與 Retry-After"""
+        url = reverse('shorturls-list')
+        for _ in range(5):
+            response = self.client.post(url, {'original_url': 'https://example.com'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, {'original_url': 'https://example.com'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_THROTTLE_RATES': {
+                **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+                'redirect': '2/minute',
+            },
+        },
+        SHORTURL_THROTTLE_BURST={'redirect': 3},
+    )
+    def test_redirect_limit_per_client(self):
+        """重定向依客戶端 IP 限流，burst 可另外設定"""
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_302_FOUND)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        response = self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+
+TIERED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tiered': {
+        'BACKEND': 'shorturl.cache_backends.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {'MAX_ENTRIES': 2, 'L1_TIMEOUT': 60},
+    },
+}
+
+
+@buffered
+@override_settings(CACHES=TIERED_CACHES, SHORTURL_CACHE_ALIAS='tiered')
+class TieredCacheTests(APITestCase):
+    """
+    18. 測試兩層快取 (L1 程序內 LRU + L2 共用快取) 與防止快取擊穿
+    """
+
+    def setUp(self):
+        reset_buffers()
+        caches['tiered'].clear()
+        self.instance = ShortUrls.objects.create(original_url='https://www.google.com')
+        self.url = reverse(
+            'redirect', kwargs={'short_code': ShortUrlService.encode(self.instance.id)}
+        )
+
+    def test_l1_serves_until_deleted(self):
+        """L1 命中時不讀 L2；經由兩層快取刪除時兩層都應清除"""
+        tiered = caches['tiered']
+        tiered.set('a', 1)
+        # 模擬其他程序只改了 L2
+        cache.delete('a')
+        self.assertEqual(tiered.get('a'), 1)
+
+        tiered.delete('a')
+        self.assertIsNone(tiered.get('a'))
+
+        # L1 未命中時從 L2 讀入
+        cache.set('b', 2)
+        self.assertEqual(tiered.get('b'), 2)
+        self.assertEqual(tiered.get_many(['b', 'missing']), {'b': 2})
+
+    def test_l1_is_bounded_lru(self):
+        """L1 超過 MAX_ENTRIES 時應淘汰最久未使用的項目"""
+        tiered = caches['tiered']
+        tiered.set('a', 1)
+        tiered.set('b', 2)
+        tiered.get('a')
+        tiered.set('c', 3)
+        cache.delete_many(['a', 'b', 'c'])
+
+        self.assertEqual(tiered.get('a'), 1)
+        self.assertIsNone(tiered.get('b'))
+        self.assertEqual(tiered.get('c'), 3)
+
+    def test_redirect_uses_tiered_cache(self):
+        """重定向快取改用兩層快取後，第二次請求不應查詢資料庫"""
+        self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.url, 'https://www.google.com')
+
+    def test_early_refresh(self):
+        """接近過期且載入成本高的項目應被提前重新載入"""
+        self.assertFalse(refresh_early(Stamped.wrap('v', 0.0, 0)))
+        self.assertFalse(refresh_early(Stamped.wrap('v', 0.001, 3600)))
+        self.assertTrue(refresh_early(Stamped.wrap('v', 3600.0, 0)))
+
+        self.client.get(self.url)
+        key = ShortUrlCache.key(self.instance.id)
+        cached = caches['tiered'].get(key)
+        stale = Stamped(cached.value._replace(original_url='https://old'), 3600.0, time.time() + 1)
+        caches['tiered'].set(key, stale)
+        refreshes = metrics.CACHE_LOOKUPS.value('early_refresh')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.url, 'https://www.google.com')
+        self.assertEqual(metrics.CACHE_LOOKUPS.value('early_refresh'), refreshes + 1)
+        self.assertLess(caches['tiered'].get(key).delta, 3600.0)
+
+    def test_single_flight(self):
+        """同一個 key 同時多個未命中時只應載入一次"""
+        flights = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flights.do('k', load))) for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+@buffered
+class AliasTests(APITestCase):
+    """
+    19. 測試自訂短網址別名 (vanity alias)
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.list_url = reverse('shorturls-list')
+
+    def test_create_and_redirect_by_alias(self):
+        """以別名建立的短網址應以別名重定向：未命中時一次索引查詢，之後零查詢"""
+        response = self.client.post(
+            self.list_url,
+            {'original_url': 'https://www.google.com', 'alias': 'my-link'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['short_url'].endswith('/my-link/'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/my-link/')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, 'https://www.google.com')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/my-link/').status_code, status.HTTP_302_FOUND)
+
+    def test_alias_namespace(self):
+        """別名不可能與數字編碼衝突：需含 '-' 或 '_'，或比任何編碼都長"""
+        self.assertTrue(ShortUrlService.is_valid_alias('my_link'))
+        self.assertTrue(ShortUrlService.is_valid_alias('averyveryverylongname'))
+        self.assertFalse(ShortUrlService.is_valid_alias('promo'))
+        self.assertFalse(ShortUrlService.is_valid_alias('a-'))
+        self.assertFalse(ShortUrlService.is_valid_alias('bad alias'))
+        self.assertFalse(ShortUrlService.is_alias(ShortUrlService.encode(2**63 - 1)))
+
+        response = self.client.post(
+            self.list_url, {'original_url': 'https://www.google.com', 'alias': 'promo'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('alias', response.data)
+
+    def test_taken_alias(self):
+        """已被使用的別名 (包含已軟刪除的) 不可再次使用，也不可修改"""
+        instance = ShortUrls.objects.create(
+            original_url='https://www.google.com', alias='taken-1', is_deleted=True
+        )
+        response = self.client.post(
+            self.list_url, {'original_url': 'https://example.com', 'alias': 'taken-1'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        instance.is_deleted = False
+        instance.save()
+        response = self.client.patch(
+            reverse('shorturls-detail', kwargs={'pk': instance.pk}),
+            {'alias': 'other-1'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_alias_claimed_after_validation(self):
+        """驗證後才被搶走的別名應回報已被使用；其他 IntegrityError 不可被誤報為別名衝突"""
+        serializer = ShortUrlsSerializer(
+            data={'original_url': 'https://example.com', 'alias': 'race-1'}
+        )
+        self.assertTrue(serializer.is_valid())
+        ShortUrls.objects.create(original_url='https://www.google.com', alias='race-1')
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+
+        serializer = ShortUrlsSerializer(data={'original_url': 'https://example.com'})
+        self.assertTrue(serializer.is_valid())
+        with (
+            mock.patch.object(ShortUrls.objects, 'create', side_effect=IntegrityError),
+            self.assertRaises(IntegrityError),
+        ):
+            serializer.save()
+
+    def test_create_clears_negative_entry(self):
+        """先前查詢過不存在的別名，建立後應立即可用"""
+        self.assertEqual(self.client.get('/new-link/').status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.post(
+            self.list_url,
+            {'original_url': 'https://example.com', 'alias': 'new-link'},
+            format='json',
+        )
+
+        self.assertEqual(self.client.get('/new-link/').status_code, status.HTTP_302_FOUND)
+
+    def test_bulk_create_checks_aliases_in_one_query(self):
+        """批次建立時，別名以一次查詢檢查，且同一批內不可重複"""
+        ShortUrls.objects.create(original_url='https://www.google.com', alias='taken-1')
+        url = reverse('shorturls-bulk-create')
+
+        response = self.client.post(
+            url,
+            [
+                {'original_url': 'https://example.com/1', 'alias': 'dup-1'},
+                {'original_url': 'https://example.com/2', 'alias': 'dup-1'},
+            ],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            url,
+            [
+                {'original_url': 'https://example.com/1', 'alias': 'taken-1'},
+                {'original_url': 'https://example.com/2'},
+            ],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        payload = [
+            {'original_url': f'https://example.com/{n}', 'alias': f'bulk-{n}'} for n in range(20)
+        ]
+        with self.assertNumQueries(4):  # 別名檢查 + savepoint + INSERT + release
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data[0]['short_url'].endswith('/bulk-0/'))
+
+    def test_availability(self):
+        """批次檢查別名是否可用"""
+        ShortUrls.objects.create(original_url='https://www.google.com', alias='taken-1')
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse('shorturls-alias-availability'),
+                {'aliases': ['free-1', 'taken-1', 'promo']},
+                format='json',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            [
+                {'alias': 'free-1', 'available': True},
+                {'alias': 'taken-1', 'available': False, 'reason': 'taken'},
+                {'alias': 'promo', 'available': False, 'reason': 'invalid'},
+            ],
+        )
+
+
+@buffered
+class ReuseExistingTests(APITestCase):
+    """
+    20. 測試以 url_hash 索引沿用相同網址的既有連結
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.list_url = reverse('shorturls-list')
+        self.instance = ShortUrls.objects.create(original_url='https://example.com/page')
+
+    def test_normalize_url(self):
+        """scheme 與 host 不分大小寫，預設 port 視為相同"""
+        self.assertEqual(
+            normalize_url('HTTPS://Example.COM:443/Page?q=1'), 'https://example.com/Page?q=1'
+        )
+        self.assertEqual(normalize_url('http://example.com'), 'http://example.com/')
+        self.assertNotEqual(url_hash('https://example.com/a'), url_hash('https://example.com/A'))
+        self.assertEqual(self.instance.url_hash, url_hash('https://EXAMPLE.com/page'))
+
+    def test_reuse_existing(self):
+        """reuse_existing 時，以一次索引查詢回傳既有連結"""
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                self.list_url,
+                {'original_url': 'https://Example.com:443/page', 'reuse_existing': True},
+                format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.instance.id)
+        self.assertFalse(response.data['created'])
+        self.assertNotIn('reuse_existing', response.data)
+
+    def test_reuse_respects_requested_expiry(self):
+        """要求的到期時間晚於既有連結，或要求停用時，應建立新連結並回傳 201"""
+        payload = {'original_url': 'https://example.com/page', 'reuse_existing': True}
+
+        later = self.instance.expires_at + timedelta(days=30)
+        response = self.client.post(
+            self.list_url, {**payload, 'expires_at': later.isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['created'])
+        self.assertNotEqual(response.data['id'], self.instance.id)
+
+        response = self.client.post(self.list_url, {**payload, 'is_active': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.data['is_active'])
+
+        earlier = self.instance.expires_at - timedelta(days=1)
+        response = self.client.post(
+            self.list_url, {**payload, 'expires_at': earlier.isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['created'])
+
+    def test_default_creates_new_link(self):
+        """預設 (未開啟沿用) 仍建立新連結；停用的連結不會被沿用"""
+        response = self.client.post(
+            self.list_url, {'original_url': 'https://example.com/page'}, format='json'
+        )
+        self.assertNotEqual(response.data['id'], self.instance.id)
+
+        ShortUrls.objects.update(is_active=False)
+        with override_settings(SHORTURL_REUSE_EXISTING=True):
+            response = self.client.post(
+                self.list_url, {'original_url': 'https://example.com/page'}, format='json'
+            )
+        self.assertEqual(ShortUrls.objects.count(), 3)
+        self.assertTrue(response.data['is_active'])
+
+    def test_bulk_reuse(self):
+        """批次建立時以一次查詢找出既有連結，同批重複的網址共用新連結"""
+        payload = [
+            {'original_url': 'https://example.com/page', 'reuse_existing': True},
+            {'original_url': 'https://example.com/new', 'reuse_existing': True},
+            {'original_url': 'https://example.com/new', 'reuse_existing': True},
+            {'original_url': 'https://example.com/new'},
+        ]
+        response = self.client.post(reverse('shorturls-bulk-create'), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = [item['id'] for item in response.data]
+        self.assertEqual(ids[0], self.instance.id)
+        self.assertEqual(ids[1], ids[2])
+        self.assertNotEqual(ids[2], ids[3])
+        self.assertEqual([item['created'] for item in response.data], [False, True, True, True])
+        self.assertEqual(
+            ShortUrls.objects.filter(url_hash=url_hash(payload[1]['original_url'])).count(), 2
+        )
+
+    def test_bulk_reuse_respects_requested_expiry(self):
+        """批次建立時也只沿用活得夠久的連結；全部沿用時回傳 200"""
+        later = (self.instance.expires_at + timedelta(days=30)).isoformat()
+        payload = [
+            {'original_url': 'https://example.com/page', 'reuse_existing': True},
+            {
+                'original_url': 'https://example.com/page',
+                'reuse_existing': True,
+                'expires_at': later,
+            },
+        ]
+        response = self.client.post(reverse('shorturls-bulk-create'), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data[0]['id'], self.instance.id)
+        self.assertNotEqual(response.data[1]['id'], self.instance.id)
+
+        response = self.client.post(reverse('shorturls-bulk-create'), payload[:1], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data[0]['created'])
+
+    def test_update_and_backfill(self):
+        """修改網址時 url_hash 跟著更新；舊資料可用指令補上"""
+        self.client.patch(
+            reverse('shorturls-detail', kwargs={'pk': self.instance.pk}),
+            {'original_url': 'https://example.com/other'},
+            format='json',
+        )
+        self.instance.refresh_from_db()
+        self.assertEqual(self.instance.url_hash, url_hash('https://example.com/other'))
+
+        ShortUrls.objects.update(url_hash=None)
+        call_command('backfill_url_hashes', batch_size=1, stdout=io.StringIO())
+        self.instance.refresh_from_db()
+        self.assertEqual(self.instance.url_hash, url_hash('https://example.com/other'))
+
+
+class ExportTests(APITestCase):
+    """
+    21. 測試 ShortUrls / AccessLog 的串流匯出 (CSV / NDJSON / gzip)
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.first = ShortUrls.objects.create(original_url='https://example.com/a')
+        self.second = ShortUrls.objects.create(original_url='https://example.com/b', alias='my-b')
+        ShortUrls.objects.create(original_url='https://example.com/gone', is_deleted=True)
+        now = timezone.now()
+        AccessLog.objects.bulk_create(
+            [
+                AccessLog(short_url_id=self.first, accessed_at=now - timedelta(days=2)),
+                AccessLog(short_url_id=self.first, accessed_at=now, ip_address='10.0.0.1'),
+                AccessLog(short_url_id=self.second, accessed_at=now),
+            ]
+        )
+        self.now = now
+
+    @staticmethod
+    def content(response) -> bytes:
+        return b''.join(response.streaming_content)
+
+    def test_requires_admin(self):
+        """匯出僅限管理員"""
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('shorturls-export'))
+        self.assertIn(
+            response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+        )
+
+    def test_export_short_urls_csv(self):
+        """預設輸出 CSV，只含有效連結，short_code 優先使用 alias"""
+        response = self.client.get(reverse('shorturls-export'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('shorturls.csv', response['Content-Disposition'])
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual(
+            lines[0], 'id,short_code,original_url,alias,create_at,expires_at,is_active,clicks_count'
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(
+            lines[1].startswith(f'{self.first.id},{ShortUrlService.encode(self.first.id)},')
+        )
+        self.assertTrue(lines[2].startswith(f'{self.second.id},my-b,https://example.com/b,my-b,'))
+
+    def test_export_logs_ndjson_filtered(self):
+        """依短網址與時間範圍篩選存取紀錄，輸出 NDJSON"""
+        since = (self.now - timedelta(hours=1)).isoformat()
+        response = self.client.get(
+            reverse('shorturls-export-logs'),
+            {'output': 'ndjson', 'short_url': self.first.id, 'since': since},
+        )
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['short_url_id'], self.first.id)
+        self.assertEqual(rows[0]['ip_address'], '10.0.0.1')
+
+    def test_gzip_and_invalid_parameters(self):
+        """gzip=true 時輸出 gzip；錯誤的參數回傳 400"""
+        response = self.client.get(reverse('shorturls-export-logs'), {'gzip': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('logs.csv.gz', response['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(self.content(response)).splitlines()), 4)
+
+        for params in ({'output': 'xml'}, {'since': 'yesterday'}, {'short_url': 'abc'}):
+            response = self.client.get(reverse('shorturls-export-logs'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunks_and_async_iteration(self):
+        """每 chunk_size 筆輸出一段；ASGI 下逐段以非同步方式讀取"""
+        chunks = list(exports.export('logs', 'ndjson', chunk_size=2))
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 1])
+
+        async def collect():
+            return [
+                chunk
+                async for chunk in exports.aiterate(exports.export('logs', 'ndjson', chunk_size=2))
+            ]
+
+        self.assertEqual(async_to_sync(collect)(), chunks)
+
+    def test_export_command(self):
+        """export_data 指令可寫入檔案"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/shorturls.ndjson.gz'
+            call_command(
+                'export_data', 'shorturls', '--output-format=ndjson', '--gzip', f'--file={path}'
+            )
+            with gzip.open(path) as exported:
+                rows = [json.loads(line) for line in exported]
+
+        self.assertEqual([row['id'] for row in rows], [self.first.id, self.second.id])
+
+
+@override_settings(SHORTURL_ADMIN_RECENT_LOGS=2)
+class AdminTests(APITestCase):
+    """
+    22. 測試 admin：只顯示最近幾筆存取紀錄，列表以估計值計數
+    """
+
+    def setUp(self):
+        reset_buffers()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.instance = ShortUrls.objects.create(original_url='https://example.com')
+        now = timezone.now()
+        AccessLog.objects.bulk_create(
+            AccessLog(
+                short_url_id=self.instance,
+                accessed_at=now - timedelta(minutes=i),
+                user_agent=f'agent-{i}',
+            )
+            for i in range(5)
+        )
+
+    def test_change_page_shows_recent_logs(self):
+        """變更頁只列出最新的 N 筆，並連到篩選後的存取紀錄列表"""
+        response = self.client.get(
+            reverse('admin:shorturl_shorturls_change', args=[self.instance.pk])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'agent-0')
+        self.assertContains(response, 'agent-1')
+        self.assertNotContains(response, 'agent-2')
+        self.assertContains(
+            response,
+            f'{reverse("admin:shorturl_accesslog_changelist")}?short_url_id={self.instance.pk}',
+        )
+
+    def test_changelists_use_estimated_counts(self):
+        """列表不計算總數，篩選單一連結時依時間排序"""
+        for name in ('admin:shorturl_shorturls_changelist', 'admin:shorturl_accesslog_changelist'):
+            response = self.client.get(reverse(name))
+            changelist = response.context['cl']
+            self.assertIsInstance(changelist.paginator, EstimatedCountPaginator)
+            self.assertFalse(changelist.show_full_result_count)
+
+        response = self.client.get(
+            reverse('admin:shorturl_accesslog_changelist'), {'short_url_id': self.instance.pk}
+        )
+        agents = [log.user_agent for log in response.context['cl'].result_list]
+        self.assertEqual(agents, [f'agent-{i}' for i in range(5)])
+
+
+class CountingIdAllocator(IdAllocator):
+    """以程序內計數器租用 id 區段，只用來測試區段的分配邏輯"""
+
+    def __init__(self, block_size, max_age):
+        super().__init__(block_size, max_age)
+        self.leases = []
+
+    def _lease(self, count):
+        start = sum(self.leases) + 1
+        self.leases.append(count)
+        return list(range(start, start + count))
+
+    def issued_max(self):
+        return sum(self.leases)
+
+
+class IdAllocatorTests(APITestCase):
+    """
+    23. 測試 Hi-Lo id 區段分配 (預先取得 id)
+    """
+
+    def setUp(self):
+        reset_buffers()
+
+    def test_blocks(self):
+        """一次租用一整個區段；不足時整段重租，過期或 fork 後捨棄剩餘的 id"""
+        allocator = CountingIdAllocator(block_size=10, max_age=30)
+
+        self.assertEqual([allocator.allocate() for _ in range(3)], [1, 2, 3])
+        self.assertEqual(allocator.allocate_many(20), list(range(11, 31)))
+        self.assertEqual(allocator.leases, [10, 20])
+
+        allocator._leased_at -= 31
+        self.assertEqual(allocator.allocate(), 31)
+        allocator._pid = -1
+        self.assertEqual(allocator.allocate(), 41)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'sequence ids are PostgreSQL-only')
+    @override_settings(SHORTURL_ID_ALLOCATOR='sequence', SHORTURL_ID_BLOCK_SIZE=10)
+    def test_sequence_ids_before_insert(self):
+        """單筆與批次建立都使用租到的連續 id，序列只前進一個區段"""
+        first = self.client.post(
+            reverse('shorturls-list'), {'original_url': 'https://example.com/1'}, format='json'
+        ).data['id']
+        response = self.client.post(
+            reverse('shorturls-bulk-create'),
+            [{'original_url': f'https://example.com/{i}'} for i in range(2, 5)],
+            format='json',
+        )
+
+        self.assertEqual([item['id'] for item in response.data], [first + 1, first + 2, first + 3])
+        self.assertEqual(get_id_allocator().issued_max(), first + 9)
+        self.assertEqual(ShortUrls.objects.get(pk=first + 3).original_url, 'https://example.com/4')
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'sequence ids are PostgreSQL-only')
+    @override_settings(
+        SHORTURL_ID_ALLOCATOR='sequence',
+        SHORTURL_ID_BLOCK_SIZE=10,
+        SHORTURL_BLOOM_SETTLE_SECONDS=0,
+        SHORTURL_BLOOM_ID_HEADROOM=0,
+    )
+    def test_bloom_accepts_ids_inserted_late(self):
+        """其他程序先寫入較大的 id 時，本程序區段內尚未寫入的 id 不可被 Bloom filter 拒絕"""
+        allocator = get_id_allocator()
+        own = ShortUrls.objects.create(original_url='https://example.com/own')
+        other = SequenceIdAllocator(ShortUrls, block_size=10, max_age=30)
+        ShortUrls.objects.create(id=other.allocate(), original_url='https://example.com/other')
+
+        bloom = get_bloom()
+        bloom.refresh(own.id)
+        late = allocator.allocate()
+
+        self.assertLess(late, ShortUrls.objects.latest('id').id)
+        self.assertLess(bloom.snapshot.watermark, late)
+        self.assertTrue(bloom.might_exist(late))
+        self.assertGreaterEqual(bloom.snapshot.ceiling, other.issued_max())
+
+
+@override_settings(SHORTURL_DB_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    24. 測試讀取副本路由：請求內的讀取走副本，寫入後與延遲過大時改走主庫
+    """
+
+    databases = {'default'}
+
+    def setUp(self):
+        get_lag_monitor.cache_clear()
+        now = time.monotonic()
+        get_lag_monitor().lags.update({'replica1': (now, 0.5), 'replica2': (now, 0.0)})
+        self.router = ReplicaRouter()
+
+    def handle(self, view, **cookies):
+        request = RequestFactory().get('/api/shorturls/')
+        request.COOKIES.update(cookies)
+        return ReplicaMiddleware(view)(request)
+
+    def test_request_reads_use_replicas(self):
+        """請求內的讀取分散到副本；請求外 (Celery、指令) 一律讀主庫"""
+        seen = set()
+
+        def view(request):
+            for _ in range(50):
+                seen.add(self.router.db_for_read(ShortUrls))
+            return HttpResponse()
+
+        response = self.handle(view)
+
+        self.assertEqual(seen, {'replica1', 'replica2'})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(ShortUrls), 'default')
+
+    def test_read_your_writes(self):
+        """寫入後同一請求改讀主庫，並以 cookie 讓之後的請求也讀主庫"""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(ShortUrls))
+            self.router.db_for_write(ShortUrls)
+            seen.append(self.router.db_for_read(ShortUrls))
+            return HttpResponse()
+
+        response = self.handle(view)
+        self.assertNotEqual(seen[0], 'default')
+        self.assertEqual(seen[1], 'default')
+        self.assertEqual(
+            response.cookies[STICKY_COOKIE]['max-age'], settings.SHORTURL_DB_STICKY_SECONDS
+        )
+
+        seen.clear()
+        self.handle(view, **{STICKY_COOKIE: '1'})
+        self.assertEqual(seen, ['default', 'default'])
+
+    def test_lagging_replicas_are_skipped(self):
+        """延遲超過上限或無法連線的副本不使用；都不可用時讀主庫"""
+        monitor = get_lag_monitor()
+        now = time.monotonic()
+        monitor.lags['replica1'] = (now, settings.SHORTURL_DB_REPLICA_MAX_LAG + 1)
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(ShortUrls))
+            monitor.lags['replica2'] = (now, None)
+            seen.append(self.router.db_for_read(ShortUrls))
+            return HttpResponse()
+
+        self.handle(view)
+        self.assertEqual(seen, ['replica2', 'default'])
+
+    def test_primary_only_operations(self):
+        """主庫不在複寫中時延遲為 0；migration 只在主庫執行"""
+        self.assertEqual(LagMonitor.measure('default'), 0.0)
+        self.assertFalse(self.router.allow_migrate('replica1', 'shorturl'))
+        self.assertIsNone(self.router.allow_migrate('default', 'shorturl'))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'shorturl.db_backends is PostgreSQL-only')
+class ConnectionMetricsTests(SimpleTestCase):
+    """
+    25. 測試資料庫連線的取得時間與連線池指標
+    """
+
+    databases = {'default'}
+
+    def wrapper(self, alias, **options):
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0}
+        settings_dict['OPTIONS'] = {**settings_dict['OPTIONS'], **options}
+        return DatabaseWrapper(settings_dict, alias=alias)
+
+    def test_checkout_latency(self):
+        """每次建立 (或自連線池取得) 連線都記錄花費的時間"""
+        db = self.wrapper('checkout-test')
+        before = metrics.DB_CHECKOUT.count('checkout-test')
+        try:
+            db.ensure_connection()
+        finally:
+            db.close()
+
+        self.assertEqual(metrics.DB_CHECKOUT.count('checkout-test'), before + 1)
+        self.assertIn('shorturl_db_connection_checkout_seconds_bucket', metrics.REGISTRY.render())
+
+    @unittest.skipUnless(importlib.util.find_spec('psycopg_pool'), 'needs psycopg[pool]')
+    def test_pool_gauges(self):
+        """使用連線池時輸出連線數與等待指標"""
+        db = self.wrapper('pool-test', pool={'min_size': 1, 'max_size': 2})
+        try:
+            db.ensure_connection()
+            samples = list(metrics._pool_connections([db]))
+            waiting = list(metrics._pool_waiting([db]))
+        finally:
+            db.close()
+            db.close_pool()
+
+        samples = dict(samples)
+        self.assertEqual(samples['pool-test', 'max'], 2)
+        self.assertGreaterEqual(samples['pool-test', 'open'], 1)
+        self.assertEqual(waiting, [(('pool-test',), 0)])
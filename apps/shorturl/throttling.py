@@ -0,0 +1,165 @@
+"""GCRA rate limiting, shared across processes through Redis.
+
+The generic cell rate algorithm is a token bucket kept as one number per key:
+the theoretical arrival time (TAT) of the next request. A rate of N requests
+per period spaces requests ``period / N`` apart; ``burst`` of them may arrive
+back to back. With Redis the check is a single Lua script, atomic and timed by
+the Redis clock, so every worker and node shares one limit per client. Without
+Redis the same algorithm runs in process memory.
+
+The throttle classes are drop-in replacements for DRF's, configured with the
+same DEFAULT_THROTTLE_RATES; SHORTURL_THROTTLE_BURST sets the burst per scope
+(default: the N of the rate). RedirectRateThrottle guards the redirect path
+with the ``redirect`` rate, which is unlimited when unset.
+"""
+
+import math
+import threading
+import time
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+from .redis_client import get_async_redis, get_redis
+
+
+class LocalRateLimiter:
+    """In-process GCRA state, used when Redis is not configured."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tats = {}
+        self._prune_at = 1024
+
+    def hit(self, key: str, interval: float, burst: int) -> float:
+        """Admit one request for ``key``; return 0, or the seconds to wait if refused."""
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            allow_at = tat + interval - interval * burst
+            if now < allow_at:
+                return allow_at - now
+            self._tats[key] = tat + interval
+            if len(self._tats) >= self._prune_at:
+                self._prune(now)
+        return 0
+
+    async def ahit(self, key: str, interval: float, burst: int) -> float:
+        return self.hit(key, interval, burst)
+
+    def _prune(self, now: float) -> None:
+        # A TAT in the past means the same as no entry; drop those.
+        self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+        self._prune_at = max(1024, len(self._tats) * 2)
+
+
+class RedisRateLimiter:
+    """GCRA state in Redis: one string per key, expiring when the bucket is full again."""
+
+    KEY_PREFIX = 'shorturl:'
+
+    # KEYS[1]: key; ARGV: interval and burst. Times in microseconds of the Redis clock.
+    HIT_SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = clock[1] * 1000000 + clock[2]
+    local interval = tonumber(ARGV[1])
+    local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+    local allow_at = tat + interval - interval * tonumber(ARGV[2])
+    if now < allow_at then
+        return math.ceil(allow_at - now)
+    end
+    redis.call('SET', KEYS[1], string.format('%.0f', tat + interval),
+        'PX', math.ceil((tat + interval - now) / 1000))
+    return 0
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._hit = client.register_script(self.HIT_SCRIPT)
+        self._ahit = None
+
+    @staticmethod
+    def _args(interval: float, burst: int) -> list[int]:
+        return [max(1, math.ceil(interval * 1_000_000)), burst]
+
+    def hit(self, key: str, interval: float, burst: int) -> float:
+        wait = self._hit(keys=[self.KEY_PREFIX + key], args=self._args(interval, burst))
+        return int(wait) / 1_000_000
+
+    async def ahit(self, key: str, interval: float, burst: int) -> float:
+        client = get_async_redis()
+        # Scripts are bound to a client, and there is one client per event loop.
+        if self._ahit is None or self._ahit.registered_client is not client:
+            self._ahit = client.register_script(self.HIT_SCRIPT)
+        wait = await self._ahit(keys=[self.KEY_PREFIX + key], args=self._args(interval, burst))
+        return int(wait) / 1_000_000
+
+
+@cache
+def get_rate_limiter() -> LocalRateLimiter | RedisRateLimiter:
+    client = get_redis()
+    return RedisRateLimiter(client) if client else LocalRateLimiter()
+
+
+class GCRAThrottleMixin:
+    """Replaces SimpleRateThrottle's timestamp history with a GCRA check."""
+
+    _wait = None
+
+    def get_rate(self):
+        # Read on every instantiation, not frozen at import, so rate changes apply.
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except (AttributeError, KeyError):
+            raise ImproperlyConfigured(
+                f"No default throttle rate set for '{self.scope}' scope"
+            ) from None
+
+    @property
+    def burst(self) -> int:
+        return settings.SHORTURL_THROTTLE_BURST.get(self.scope) or self.num_requests
+
+    def _limit(self, request, view):
+        if self.rate is None:
+            return None
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return None
+        return self.key, self.duration / self.num_requests, self.burst
+
+    def allow_request(self, request, view) -> bool:
+        limit = self._limit(request, view)
+        if limit is None:
+            return True
+        self._wait = get_rate_limiter().hit(*limit)
+        return not self._wait
+
+    async def aallow_request(self, request, view) -> bool:
+        limit = self._limit(request, view)
+        if limit is None:
+            return True
+        self._wait = await get_rate_limiter().ahit(*limit)
+        return not self._wait
+
+    def wait(self) -> float | None:
+        return self._wait
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class RedirectRateThrottle(GCRAThrottleMixin, throttling.SimpleRateThrottle):
+    """Per client IP on /<short_code>/; called by the redirect views, not by DRF."""
+
+    scope = 'redirect'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
@@ -1,13 +1,26 @@
-from django.db.models import F
-from django.http import HttpResponseNotFound
-from django.shortcuts import get_object_or_404, redirect
-from rest_framework import mixins, status, viewsets
+import json
+import math
+import time
+from itertools import batched
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.shortcuts import redirect
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from .models import ShortUrls
-from .serializers import ShortUrlsSerializer
+from . import exports, rollups
+from .buffers import access_record, get_click_buffer, get_log_buffer
+from .cache import ShortUrlCache
+from .metrics import LOG_ENQUEUE
+from .models import ClickRollup, ShortUrls
+from .pagination import ShortUrlsCursorPagination
+from .serializers import ALIAS_TAKEN, AliasAvailabilitySerializer, ShortUrlsSerializer
 from .services import ShortUrlService
-from .tasks import store_log
+from .throttling import RedirectRateThrottle
 
 
 # Create your views here.
@@ -20,41 +33,265 @@ class ShortUrlsViewSet(
 ):
     serializer_class = ShortUrlsSerializer
 
+    @property
+    def paginator(self):
+        if settings.SHORTURL_LIST_PAGINATION == 'cursor' and not hasattr(self, '_paginator'):
+            self._paginator = ShortUrlsCursorPagination()
+        return super().paginator
+
     def get_queryset(self):
         queryset = ShortUrls.objects.all()
 
         return queryset.order_by('-is_active', 'create_at')
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save()
+
+        # 200 when reuse_existing returned a link that already existed.
+        code = status.HTTP_201_CREATED if instance.created else status.HTTP_200_OK
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=code, headers=headers)
+
     def destroy(self, request, pk=None):
         instance = self.get_object()
 
         instance.is_deleted = True
         instance.save()
+        ShortUrlCache.invalidate(instance.id)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """Create many short URLs in one request.
+
+        Accepts a JSON list (validated as a whole, all-or-nothing) or an
+        ``application/x-ndjson`` body, which is read line by line and answered
+        with one NDJSON line per input line, so batches never sit in memory whole.
+        """
+        if request.content_type.startswith('application/x-ndjson'):
+            return StreamingHttpResponse(
+                self._bulk_create_stream(request), content_type='application/x-ndjson'
+            )
+
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=settings.SHORTURL_BULK_MAX_ITEMS
+        )
+        serializer.is_valid(raise_exception=True)
+        instances = serializer.save()
+
+        created = any(instance.created for instance in instances)
+        code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return Response(serializer.data, status=code)
+
+    def _bulk_create_stream(self, request):
+        lines = (
+            (line_no, raw_line)
+            for line_no, raw_line in enumerate(request.stream or (), start=1)
+            if raw_line.strip()
+        )
+        for chunk in batched(lines, settings.SHORTURL_BULK_CREATE_BATCH_SIZE, strict=False):
+            results = {}
+            valid = []
+            aliases = set()
+            for line_no, raw_line in chunk:
+                try:
+                    item = json.loads(raw_line)
+                except ValueError:
+                    errors = {'non_field_errors': ['Invalid JSON.']}
+                    results[line_no] = {'line': line_no, 'errors': errors}
+                    continue
+
+                serializer = self.get_serializer(data=item)
+                if not serializer.is_valid():
+                    results[line_no] = {'line': line_no, 'errors': serializer.errors}
+                    continue
+                # Each line was checked against the table alone, not against its chunk.
+                alias = serializer.validated_data.get('alias')
+                if alias and alias in aliases:
+                    results[line_no] = {'line': line_no, 'errors': {'alias': [ALIAS_TAKEN]}}
+                    continue
+                aliases.add(alias)
+                valid.append((line_no, serializer))
+
+            list_serializer = self.get_serializer(many=True)
+            instances = list_serializer.create([item.validated_data for _, item in valid])
+            for (line_no, item), instance in zip(valid, instances, strict=True):
+                results[line_no] = {
+                    'line': line_no,
+                    'id': instance.id,
+                    'original_url': instance.original_url,
+                    'short_url': item.get_short_url(instance),
+                    'created': instance.created,
+                }
+
+            for line_no, _ in chunk:
+                yield json.dumps(results[line_no]) + '\n'
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='aliases/availability',
+        serializer_class=AliasAvailabilitySerializer,
+    )
+    def alias_availability(self, request):
+        """Check many aliases in one query: ``{"aliases": [...]}``.
+
+        Each result has ``available`` and, when false, a ``reason``: invalid,
+        reserved or taken.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """Stream every live short URL: ``?output=csv|ndjson``, ``?gzip=true``.
+
+        ``?since=`` and ``?until=`` (ISO 8601) bound create_at.
+        """
+        return self._export(request, 'shorturls')
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='logs/export',
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def export_logs(self, request):
+        """Stream access logs, like export; ``?short_url=<id>`` selects one link.
+
+        ``?since=`` and ``?until=`` bound accessed_at.
+        """
+        filters = {}
+        if short_url := request.query_params.get('short_url'):
+            try:
+                filters['short_url'] = int(short_url)
+            except ValueError:
+                raise ValidationError({'short_url': ['A valid integer is required.']}) from None
+        return self._export(request, 'logs', **filters)
+
+    def _export(self, request, kind: str, **filters) -> StreamingHttpResponse:
+        output = request.query_params.get('output', 'csv')
+        if output not in exports.CONTENT_TYPES:
+            raise ValidationError(
+                {'output': [f'Must be one of {", ".join(exports.CONTENT_TYPES)}.']}
+            )
+        for name in ('since', 'until'):
+            try:
+                filters[name] = exports.parse_moment(request.query_params.get(name))
+            except ValueError as error:
+                raise ValidationError({name: [str(error)]}) from None
+        compress = request.query_params.get('gzip', '').lower() == 'true'
+
+        chunks = exports.export(kind, output, compress=compress, **filters)
+        if isinstance(request._request, ASGIRequest):
+            chunks = exports.aiterate(chunks)
+        filename = f'{kind}.{output}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/gzip' if compress else exports.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # Default and maximum number of buckets returned by the stats action, per period.
+    STATS_BUCKETS = {
+        ClickRollup.Period.HOUR: (24, 24 * 31),
+        ClickRollup.Period.DAY: (30, 366),
+    }
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Click analytics from the rollup tables; AccessLog is never scanned.
+
+        ``?period=hour|day`` (default ``day``) and ``?buckets=`` select the window.
+        """
+        instance = self.get_object()
+
+        period = request.query_params.get('period', ClickRollup.Period.DAY)
+        if period not in self.STATS_BUCKETS:
+            raise ValidationError({'period': [f'Must be one of {", ".join(self.STATS_BUCKETS)}.']})
+
+        default, maximum = self.STATS_BUCKETS[period]
+        try:
+            buckets = int(request.query_params.get('buckets', default))
+        except ValueError:
+            raise ValidationError({'buckets': ['A valid integer is required.']}) from None
+        if not 1 <= buckets <= maximum:
+            raise ValidationError({'buckets': [f'Must be between 1 and {maximum}.']})
+
+        return Response({'id': instance.id, **rollups.stats(instance.id, period, buckets)})
+
+
+def _access_info(request) -> tuple:
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    # "client, proxy1, proxy2": the first hop is the client. access_record()
+    # stores None for anything that is not an IP address.
+    log_ip_address = (
+        x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
+    )
+    log_user_agent = request.META.get('HTTP_USER_AGENT', '')
+    log_referer = request.META.get('HTTP_REFERER')
+    return log_ip_address, log_user_agent, log_referer
+
+
+def _throttled(wait: float) -> HttpResponse:
+    response = HttpResponse('Too many requests.', status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
 
 def redirectShortCode(request, short_code):
+    throttle = RedirectRateThrottle()
+    if not throttle.allow_request(request, None):
+        return _throttled(throttle.wait())
+
     try:
-        original_id = ShortUrlService.decode(short_code)
-
-        short_url_instance = get_object_or_404(ShortUrls, pk=original_id, is_active=True)
-        short_url_instance.clicks_count = F('clicks_count') + 1
-        short_url_instance.save(update_fields=['clicks_count'])
-
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        log_ip_address = x_forwarded_for if x_forwarded_for else request.META.get('REMOTE_ADDR')
-        log_user_agent = request.META.get('HTTP_USER_AGENT', '')
-        log_referer = request.META.get('HTTP_REFERER')
-
-        store_log.delay(
-            short_url_id=short_url_instance.id,
-            ip_address=log_ip_address,
-            user_agent=log_user_agent,
-            referer=log_referer,
-        )
+        if ShortUrlService.is_alias(short_code):
+            if not ShortUrlService.is_valid_alias(short_code):
+                raise ValueError(f"Invalid alias '{short_code}'")
+            entry = ShortUrlCache.get_alias(short_code)
+        else:
+            entry = ShortUrlCache.get(ShortUrlService.decode(short_code))
+        if entry is None:
+            raise Http404('No ShortUrls matches the given query.')
+
+        get_click_buffer().incr(entry.id)
+        started = time.perf_counter()
+        get_log_buffer().push(access_record(entry.id, *_access_info(request)))
+        LOG_ENQUEUE.observe(time.perf_counter() - started)
+
+        return redirect(entry.original_url)
+
+    except ValueError:
+        return HttpResponseNotFound('The requested short URL contains invalid characters.')
+
+
+async def redirectShortCodeAsync(request, short_code):
+    """Same contract as redirectShortCode, without occupying a thread under ASGI."""
+    throttle = RedirectRateThrottle()
+    if not await throttle.aallow_request(request, None):
+        return _throttled(throttle.wait())
+
+    try:
+        if ShortUrlService.is_alias(short_code):
+            if not ShortUrlService.is_valid_alias(short_code):
+                raise ValueError(f"Invalid alias '{short_code}'")
+            entry = await ShortUrlCache.aget_alias(short_code)
+        else:
+            entry = await ShortUrlCache.aget(ShortUrlService.decode(short_code))
+        if entry is None:
+            raise Http404('No ShortUrls matches the given query.')
+
+        await get_click_buffer().aincr(entry.id)
+        started = time.perf_counter()
+        await get_log_buffer().apush(access_record(entry.id, *_access_info(request)))
+        LOG_ENQUEUE.observe(time.perf_counter() - started)
 
-        return redirect(short_url_instance.original_url)
+        return redirect(entry.original_url)
 
     except ValueError:
         return HttpResponseNotFound('The requested short URL contains invalid characters.')
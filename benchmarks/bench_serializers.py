@@ -0,0 +1,56 @@
+"""Micro-benchmarks for ShortUrlsSerializer, without a database.
+
+uv run python -m benchmarks.bench_serializers
+"""
+
+from datetime import timedelta
+
+from benchmarks import setup
+from benchmarks.bench_services import bench
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from shorturl.models import ShortUrls  # noqa: E402
+from shorturl.serializers import ShortUrlsSerializer  # noqa: E402
+
+
+def main(size: int = 10_000):
+    now = timezone.now()
+    instances = [
+        ShortUrls(
+            id=pk,
+            original_url=f'https://example.com/{pk}',
+            create_at=now,
+            expires_at=now + timedelta(days=10),
+            clicks_count=pk % 100,
+        )
+        for pk in range(1, size + 1)
+    ]
+    payloads = [{'original_url': f'https://example.com/{pk}'} for pk in range(size)]
+
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        context = {'request': RequestFactory().get('/api/shorturls/')}
+
+        print(f'{size} rows, best of 5')
+        bench(
+            'serialize one by one',
+            lambda: [ShortUrlsSerializer(obj, context=context).data for obj in instances],
+        )
+        # The list path fetches pending clicks for all rows at once.
+        bench(
+            'serialize many=True',
+            lambda: ShortUrlsSerializer(instances, many=True, context=context).data,
+        )
+        bench(
+            'validate create payloads',
+            lambda: ShortUrlsSerializer(data=payloads, many=True, context=context).is_valid(
+                raise_exception=True
+            ),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Micro-benchmarks for ShortUrlService encode/decode.
+
+uv run python -m benchmarks.bench_services
+"""
+
+import random
+import timeit
+
+from benchmarks import setup
+
+setup()
+
+from django.test import override_settings  # noqa: E402
+from shorturl.services import ShortUrlService  # noqa: E402
+
+
+class LegacyShortUrlService:
+    """The pre-lookup-table implementation, kept as the comparison baseline."""
+
+    CHAR_SET = ShortUrlService.CHAR_SET
+    BASE = len(CHAR_SET)
+
+    @classmethod
+    def encode(cls, id_num: int) -> str:
+        if id_num == 0:
+            return cls.CHAR_SET[0]
+
+        short_code = ''
+        base_id = id_num
+        while base_id > 0:
+            char_index = base_id % cls.BASE
+            short_code += cls.CHAR_SET[char_index]
+            base_id //= cls.BASE
+
+        return short_code
+
+    @classmethod
+    def decode(cls, short_code: str) -> int:
+        original_id = 0
+        char_to_index = {char: i for i, char in enumerate(cls.CHAR_SET)}
+
+        for i, char in enumerate(short_code):
+            char_value = char_to_index.get(char)
+            if char_value is None:
+                raise ValueError(f"Invalid character '{char}' in short_code '{short_code}'")
+
+            original_id += char_value * (cls.BASE**i)
+
+        return original_id
+
+
+def bench(label: str, func, repeat: int = 15, number: int = 1) -> float:
+    best = min(timeit.repeat(func, repeat=repeat, number=number))
+    print(f'{label:<32} {best * 1000:9.2f} ms')
+    return best
+
+
+def main(size: int = 100_000):
+    rng = random.Random(0)
+    ids = [rng.randrange(1, 10**9) for _ in range(size)]
+    codes = ShortUrlService.encode_many(ids)
+
+    # Both implementations must produce the same codes.
+    assert codes == [LegacyShortUrlService.encode(i) for i in ids]
+    assert ShortUrlService.decode_many(codes) == ids
+
+    print(f'{size} ids, best of 15')
+    results = {}
+    for name, service in (('legacy', LegacyShortUrlService), ('current', ShortUrlService)):
+        results[name, 'encode'] = bench(
+            f'{name} encode', lambda s=service: [s.encode(i) for i in ids]
+        )
+        results[name, 'decode'] = bench(
+            f'{name} decode', lambda s=service: [s.decode(c) for c in codes]
+        )
+    bench('current encode_many', lambda: ShortUrlService.encode_many(ids))
+    bench('current decode_many', lambda: ShortUrlService.decode_many(codes))
+
+    with override_settings(SHORTURL_CODE_WIDTH=7, SHORTURL_SCRAMBLE_KEY='bench'):
+        scrambled = ShortUrlService.encode_many(ids)
+        bench('scrambled encode_many', lambda: ShortUrlService.encode_many(ids))
+        bench('scrambled decode_many', lambda: ShortUrlService.decode_many(scrambled))
+
+    for op in ('encode', 'decode'):
+        print(f'{op} speedup: {results["legacy", op] / results["current", op]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
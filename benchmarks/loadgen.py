@@ -0,0 +1,340 @@
+"""Load generator for the redirect and create paths.
+
+Seed once, then drive traffic; keep a report as the baseline for later runs:
+
+    uv run python -m benchmarks.loadgen --seed 1000000
+    uv run python -m benchmarks.loadgen --requests 50000 --save baseline.json
+    uv run python -m benchmarks.loadgen --requests 50000 --baseline baseline.json
+
+By default requests run in process through django.test.Client, against the
+database and cache the settings point at (Postgres, and Redis when
+SHORTURL_REDIS_URL is set), so the queries of every request are counted.
+With --url they go over HTTP to a running server instead; query counts are
+then not available, and the server's throttle rates must allow the load.
+
+Redirect keys follow a Zipf distribution over the seeded links; --miss-ratio
+mixes in random codes, as sent by scanners.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from benchmarks import setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from shorturl.models import ShortUrls  # noqa: E402
+from shorturl.services import CHAR_SET, ShortUrlService, url_hash  # noqa: E402
+from shorturl.views import ShortUrlsViewSet  # noqa: E402
+
+# Already in normalize_url() form, so the url_hash of a seeded URL is the SHA-256
+# of the URL itself and can be computed in SQL.
+SEED_URL_PREFIX = 'https://bench.example/'
+SEED_BATCH_SIZE = 100_000
+
+
+def seed(count: int) -> None:
+    """Insert ``count`` live links whose URLs start with SEED_URL_PREFIX."""
+    started = time.perf_counter()
+    expires_at = timezone.now() + timedelta(days=365)
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        size = min(SEED_BATCH_SIZE, count - offset)
+        if connection.vendor == 'postgresql':
+            # Server-side rows: no Python objects or parameters per row.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO shorturl_shorturls
+                        (original_url, url_hash, create_at, expires_at,
+                         is_active, is_deleted, clicks_count)
+                    SELECT url, encode(sha256(convert_to(url, 'UTF8')), 'hex'), now(), %s,
+                        true, false, 0
+                    FROM generate_series(%s::bigint, %s::bigint) AS g,
+                        LATERAL (SELECT %s || g AS url) AS u
+                    """,
+                    [expires_at, offset, offset + size - 1, SEED_URL_PREFIX],
+                )
+        else:
+            ShortUrls.objects.bulk_create(
+                ShortUrls(
+                    original_url=(url := f'{SEED_URL_PREFIX}{n}'),
+                    url_hash=url_hash(url),
+                    expires_at=expires_at,
+                )
+                for n in range(offset, offset + size)
+            )
+        print(f'seeded {offset + size}/{count}', file=sys.stderr)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE shorturl_shorturls')
+    print(f'seeded {count} links in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+def cleanup() -> None:
+    seeded = ShortUrls._base_manager.filter(original_url__startswith=SEED_URL_PREFIX)
+    while True:
+        ids = list(seeded.values_list('pk', flat=True)[:SEED_BATCH_SIZE])
+        if not ids:
+            break
+        ShortUrls._base_manager.filter(pk__in=ids).delete()
+        print(f'deleted {len(ids)} seeded links', file=sys.stderr)
+
+
+class ZipfKeys:
+    """Samples ``keys`` with P(rank r) proportional to 1 / r**exponent."""
+
+    def __init__(self, keys: list, exponent: float, rng: random.Random):
+        self.keys = keys
+        self.rng = rng
+        self.cumulative = list(
+            itertools.accumulate(1 / rank**exponent for rank in range(1, len(keys) + 1))
+        )
+
+    def sample(self) -> int:
+        position = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.keys[min(position, len(self.keys) - 1)]
+
+
+class InProcessTarget:
+    """Sends requests through the Django stack and counts their queries."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def _client(self) -> Client:
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+        return self.local.client
+
+    def get(self, path: str):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._client().get(path)
+        return response.status_code, len(queries)
+
+    def post(self, path: str, payload: dict):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._client().post(path, payload, content_type='application/json')
+        return response.status_code, len(queries)
+
+
+class HttpTarget:
+    """Sends requests to a running server; redirects are not followed."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(self._NoRedirect)
+
+    def _send(self, request) -> tuple[int, None]:
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+    def get(self, path: str):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post(self, path: str, payload: dict):
+        return self._send(
+            urllib.request.Request(
+                self.base_url + path,
+                data=json.dumps(payload).encode(),
+                headers={'Content-Type': 'application/json'},
+            )
+        )
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: list[tuple[float, int | None, bool]], elapsed: float) -> dict:
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(not ok for _, _, ok in samples),
+        'throughput': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'queries_avg': round(statistics.fmean(queries), 3) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run(args) -> dict:
+    rng = random.Random(args.random_seed)
+    keys = list(
+        ShortUrls.objects.filter(original_url__startswith=SEED_URL_PREFIX)
+        .order_by('pk')
+        .values_list('pk', flat=True)[: args.keys]
+    )
+    if not keys:
+        sys.exit('No seeded links found; run with --seed N first.')
+    # Popularity must not follow id order, or the hot keys would all be old rows.
+    rng.shuffle(keys)
+    zipf = ZipfKeys(keys, args.zipf, rng)
+
+    plan = []
+    for _ in range(args.requests):
+        roll = rng.random()
+        if roll < args.create_ratio:
+            plan.append(('create', None))
+        elif roll < args.create_ratio + args.miss_ratio:
+            code = ''.join(rng.choice(CHAR_SET) for _ in range(8))
+            plan.append(('redirect_miss', f'/{code}/'))
+        else:
+            plan.append(('redirect', f'/{ShortUrlService.encode(zipf.sample())}/'))
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    # Not recorded: the first requests build the Bloom filter and fill the caches.
+    for _ in range(args.warmup):
+        target.get(f'/{ShortUrlService.encode(zipf.sample())}/')
+    expected = {'redirect': {302}, 'redirect_miss': {404}, 'create': {201}}
+    samples = {operation: [] for operation in expected}
+
+    def send(item):
+        operation, path = item
+        started = time.perf_counter()
+        if operation == 'create':
+            status, queries = target.post(
+                '/api/shorturls/', {'original_url': f'{SEED_URL_PREFIX}created'}
+            )
+        else:
+            status, queries = target.get(path)
+        return operation, time.perf_counter() - started, queries, status in expected[operation]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for operation, latency, queries, ok in pool.map(send, plan):
+            samples[operation].append((latency, queries, ok))
+    elapsed = time.perf_counter() - started
+    connections.close_all()
+
+    return {
+        'config': {
+            key: getattr(args, key)
+            for key in (
+                'requests',
+                'warmup',
+                'concurrency',
+                'keys',
+                'zipf',
+                'miss_ratio',
+                'create_ratio',
+            )
+        }
+        | {'mode': 'http' if args.url else 'in-process', 'vendor': connection.vendor},
+        'total': {'requests': len(plan), 'seconds': round(elapsed, 3)},
+        'operations': {
+            operation: summarize(values, elapsed) for operation, values in samples.items() if values
+        },
+    }
+
+
+def print_report(report: dict, baseline: dict | None) -> list[str]:
+    """Print the report (and the change against ``baseline``); return p99 regressions."""
+    print(json.dumps(report['config']))
+    columns = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'queries_avg')
+    print(f'{"operation":<14}' + ''.join(f'{column:>14}' for column in columns))
+
+    regressions = []
+    for operation, stats in report['operations'].items():
+        print(f'{operation:<14}' + ''.join(f'{str(stats[column]):>14}' for column in columns))
+        previous = (baseline or {}).get('operations', {}).get(operation)
+        if not previous:
+            continue
+
+        changes = []
+        for column in columns:
+            old, new = previous.get(column), stats[column]
+            changes.append(f'{(new - old) / old:+.1%}' if old and new is not None else '-')
+        print(f'{"  vs baseline":<14}' + ''.join(f'{change:>14}' for change in changes))
+        if previous['p99_ms'] and stats['p99_ms'] > previous['p99_ms']:
+            regressions.append((operation, stats['p99_ms'] / previous['p99_ms'] - 1))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--seed', type=int, metavar='N', help='Insert N links and exit.')
+    parser.add_argument('--cleanup', action='store_true', help='Delete the seeded links.')
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=1_000_000, help='Seeded links to draw from.')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of key popularity.')
+    parser.add_argument('--miss-ratio', type=float, default=0.05)
+    parser.add_argument('--create-ratio', type=float, default=0.01)
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--url', help='Base URL of a running server (default: in process).')
+    parser.add_argument('--save', metavar='PATH', help='Write the report as JSON.')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare with a saved report.')
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        metavar='FRACTION',
+        help='Exit with status 1 if any p99 is worse than the baseline by more than this.',
+    )
+    args = parser.parse_args(argv)
+
+    if args.cleanup:
+        cleanup()
+        return
+    if args.seed:
+        seed(args.seed)
+        return
+
+    # Expected 404s of the miss traffic would otherwise flood stderr.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    if not args.url:
+        # Throttling would turn the create path into 429s after a few requests.
+        ShortUrlsViewSet.throttle_classes = ()
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        report = run(args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    regressions = print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.max_regression is not None:
+        failed = [(op, change) for op, change in regressions if change > args.max_regression]
+        for operation, change in failed:
+            print(f'p99 regression in {operation}: {change:+.1%}', file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
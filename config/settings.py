@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os, sys
 
 from pathlib import Path
+from celery.schedules import crontab
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 
@@ -53,7 +55,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the recorded latency covers every other middleware.
+    'shorturl.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Lets request reads use SHORTURL_DB_REPLICAS; before the redirect fast path.
+    'shorturl.replicas.ReplicaMiddleware',
+    # Answers /<short_code>/ here; the middleware below only runs for other paths.
+    'shorturl.fastpath.FastRedirectMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,7 +99,8 @@ DATABASES = {
     #     'NAME': BASE_DIR / 'db.sqlite3',
     # },
     'default': {
-        "ENGINE": "django.db.backends.postgresql",
+        # django.db.backends.postgresql plus connection checkout metrics.
+        "ENGINE": "shorturl.db_backends",
         "NAME": os.getenv("DJANGO_DB_NAME"),
         "USER": os.getenv("DJANGO_DB_USER"),
         "PASSWORD": os.getenv("DJANGO_DB_PWD"),
@@ -100,6 +109,46 @@ DATABASES = {
     },
 }
 
+# Connection handling, SHORTURL_DB_CONNECTIONS:
+# - 'persistent' (default): each worker thread keeps its connection for
+#   SHORTURL_DB_CONN_MAX_AGE seconds, health-checked before reuse.
+# - 'pool': a psycopg_pool per process (needs psycopg[pool]), sized by
+#   SHORTURL_DB_POOL_MIN_SIZE / SHORTURL_DB_POOL_MAX_SIZE; a checkout waits at
+#   most SHORTURL_DB_POOL_TIMEOUT seconds.
+# - 'pgbouncer': DJANGO_DB_HOST/PORT point at PgBouncer in transaction mode
+#   (compose profile "pgbouncer"). Persistent client connections, but nothing
+#   that outlives a transaction: no server-side cursors, no prepared statements.
+SHORTURL_DB_CONNECTIONS = os.environ.get('SHORTURL_DB_CONNECTIONS', 'persistent')
+if SHORTURL_DB_CONNECTIONS == 'pool':
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('SHORTURL_DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('SHORTURL_DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('SHORTURL_DB_POOL_TIMEOUT', 5)),
+        },
+    }
+elif SHORTURL_DB_CONNECTIONS in ('persistent', 'pgbouncer'):
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('SHORTURL_DB_CONN_MAX_AGE', 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    if SHORTURL_DB_CONNECTIONS == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        DATABASES['default']['OPTIONS'] = {'prepare_threshold': None}
+else:
+    raise ImproperlyConfigured(f"Unknown SHORTURL_DB_CONNECTIONS '{SHORTURL_DB_CONNECTIONS}'.")
+
+# Read replicas: one alias per host in SHORTURL_DB_REPLICA_HOSTS (comma separated),
+# with the primary's credentials. See shorturl/replicas.py for what is routed where.
+for _index, _host in enumerate(filter(None, os.environ.get('SHORTURL_DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = {**DATABASES['default'], 'HOST': _host.strip(), 'TEST': {'MIRROR': 'default'}}
+SHORTURL_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['shorturl.replicas.ReplicaRouter']
+# Seconds a client keeps reading the primary after one of its requests wrote.
+SHORTURL_DB_STICKY_SECONDS = int(os.environ.get('SHORTURL_DB_STICKY_SECONDS', 10))
+# Replicas further behind than this many seconds are skipped until they catch up.
+SHORTURL_DB_REPLICA_MAX_LAG = float(os.environ.get('SHORTURL_DB_REPLICA_MAX_LAG', 5))
+SHORTURL_DB_LAG_CHECK_INTERVAL = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,13 +192,16 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # GCRA throttles: limits shared through Redis when SHORTURL_REDIS_URL is set.
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'shorturl.throttling.AnonRateThrottle',
+        'shorturl.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '5/minute',
-        'user': '12/minute'
+        'user': '12/minute',
+        # Per client IP on /<short_code>/, e.g. '600/minute'; unlimited when unset.
+        'redirect': os.environ.get('SHORTURL_REDIRECT_THROTTLE_RATE'),
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 3,
@@ -158,14 +210,153 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    },
+# Redis is already required as the Celery broker; point SHORTURL_REDIS_URL at it
+# (ideally another db number) to share the cache between workers.
+SHORTURL_REDIS_URL = os.environ.get('SHORTURL_REDIS_URL')
+# Connection pool options for the cache and for shorturl's own Redis clients
+# (click/log buffers, throttles); each keeps one pool per process.
+SHORTURL_REDIS_POOL_OPTIONS = {
+    'max_connections': int(os.environ.get('SHORTURL_REDIS_MAX_CONNECTIONS', 50)),
+    'socket_connect_timeout': 1,
+    'socket_timeout': 1,
+    'health_check_interval': 30,
+}
+
+if SHORTURL_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": SHORTURL_REDIS_URL,
+            "OPTIONS": SHORTURL_REDIS_POOL_OPTIONS,
+        },
+        # In-process LRU (L1) in front of "default" (L2) for hot, read-mostly keys.
+        # Writes from other processes reach L1 after at most L1_TIMEOUT seconds.
+        "tiered": {
+            "BACKEND": "shorturl.cache_backends.TieredCache",
+            "LOCATION": "default",
+            "OPTIONS": {
+                "MAX_ENTRIES": int(os.environ.get('SHORTURL_L1_CACHE_MAX_ENTRIES', 10_000)),
+                "L1_TIMEOUT": int(os.environ.get('SHORTURL_L1_CACHE_TIMEOUT', 5)),
+            },
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Redirect cache (short code -> original_url, is_active, expires_at).
+# Entries never outlive the link's expires_at.
+SHORTURL_CACHE_ALIAS = 'tiered' if SHORTURL_REDIS_URL else 'default'
+# XFetch early refresh: higher values reload hot entries earlier before expiry.
+SHORTURL_CACHE_XFETCH_BETA = 1.0
+SHORTURL_CACHE_TIMEOUT = int(os.environ.get('SHORTURL_CACHE_TIMEOUT', 60 * 60))
+
+# Click counters are buffered (Redis hash, or in-process without Redis) and
+# written to ShortUrls.clicks_count in bulk every SHORTURL_CLICK_FLUSH_INTERVAL seconds.
+# In-process, each web process flushes its own clicks on the first redirect past
+# the interval and when it exits: they stay unwritten while the process gets no
+# traffic, and are lost if it is killed.
+SHORTURL_CLICK_FLUSH_INTERVAL = float(os.environ.get('SHORTURL_CLICK_FLUSH_INTERVAL', 5))
+SHORTURL_CLICK_FLUSH_BATCH = 500
+
+# Access logs are queued (Redis list, or in-process without Redis) and inserted
+# with bulk_create in chunks of SHORTURL_LOG_BATCH_SIZE. In-process queues drain
+# on redirects and at exit, with the same window as the click buffer above.
+SHORTURL_LOG_BATCH_SIZE = int(os.environ.get('SHORTURL_LOG_BATCH_SIZE', 1000))
+SHORTURL_LOG_FLUSH_INTERVAL = float(os.environ.get('SHORTURL_LOG_FLUSH_INTERVAL', 1))
+SHORTURL_LOG_DRAIN_MAX_SECONDS = 30
+
+# POST /api/shorturls/bulk/: rows per INSERT, and the item cap for JSON list
+# bodies (NDJSON bodies are streamed and have no cap).
+SHORTURL_BULK_CREATE_BATCH_SIZE = 500
+SHORTURL_BULK_MAX_ITEMS = 10_000
+# Default of the create-time reuse_existing flag: hand out the existing live link
+# for an already shortened URL (one url_hash index lookup) instead of a new one,
+# if it is active and expires no earlier than a requested expires_at. Such
+# responses are 200 with "created": false instead of 201.
+SHORTURL_REUSE_EXISTING = os.environ.get('SHORTURL_REUSE_EXISTING', 'false').lower() == 'true'
+# Rows per database round trip (server-side cursor fetch) and per written piece
+# of the streaming exports (/api/shorturls/export/, logs/export/, export_data).
+SHORTURL_EXPORT_CHUNK_SIZE = int(os.environ.get('SHORTURL_EXPORT_CHUNK_SIZE', 2000))
+# Access logs listed on a short URL's admin change page (newest first).
+SHORTURL_ADMIN_RECENT_LOGS = 20
+# Aliases per /api/shorturls/aliases/availability/ request.
+SHORTURL_ALIAS_CHECK_MAX_ITEMS = 1_000
+
+# AccessLog range partitions on accessed_at (PostgreSQL): 'month' or 'day'.
+# Old partitions are dropped once they fall out of the retention window
+# (unset = keep everything).
+SHORTURL_ACCESSLOG_PARTITION_INTERVAL = os.environ.get('SHORTURL_ACCESSLOG_PARTITION_INTERVAL', 'month')
+SHORTURL_ACCESSLOG_PARTITIONS_AHEAD = 3
+SHORTURL_ACCESSLOG_RETENTION_DAYS = int(os.environ['SHORTURL_ACCESSLOG_RETENTION_DAYS']) if os.environ.get('SHORTURL_ACCESSLOG_RETENTION_DAYS') else None
+
+# Unknown short codes on the redirect path. Misses are cached for
+# SHORTURL_NEGATIVE_CACHE_TIMEOUT seconds, and an in-process Bloom filter of
+# existing ids (see shorturl/bloom.py) rejects most unknown ids without any lookup.
+SHORTURL_NEGATIVE_CACHE_TIMEOUT = int(os.environ.get('SHORTURL_NEGATIVE_CACHE_TIMEOUT', 60))
+SHORTURL_BLOOM_ENABLED = os.environ.get('SHORTURL_BLOOM_ENABLED', 'true').lower() == 'true'
+SHORTURL_BLOOM_ERROR_RATE = float(os.environ.get('SHORTURL_BLOOM_ERROR_RATE', 0.01))
+SHORTURL_BLOOM_MAX_BYTES = int(os.environ.get('SHORTURL_BLOOM_MAX_BYTES', 16 * 1024 * 1024))
+SHORTURL_BLOOM_GROWTH = 1.5
+SHORTURL_BLOOM_REFRESH_INTERVAL = 60
+SHORTURL_BLOOM_REBUILD_INTERVAL = 60 * 60
+SHORTURL_BLOOM_MIN_REFRESH_SECONDS = 1
+SHORTURL_BLOOM_SETTLE_SECONDS = 60
+SHORTURL_BLOOM_ID_HEADROOM = 1_000
+
+# Prometheus text metrics on /metrics (per process), for staff users only. With
+# SHORTURL_METRICS_TOKEN set, scrapes may also send "Authorization: Bearer <token>".
+SHORTURL_METRICS_ENABLED = os.environ.get('SHORTURL_METRICS_ENABLED', 'true').lower() == 'true'
+SHORTURL_METRICS_TOKEN = os.environ.get('SHORTURL_METRICS_TOKEN')
+
+# Reaper for dead links: soft-deleted rows, and rows expired more than
+# SHORTURL_REAPER_GRACE_DAYS ago, are copied to ShortUrlArchive (unless
+# SHORTURL_REAPER_ARCHIVE is false) and deleted, SHORTURL_REAPER_BATCH_SIZE
+# links per transaction. Their access logs go first, in separate smaller deletes.
+SHORTURL_REAPER_GRACE_DAYS = int(os.environ.get('SHORTURL_REAPER_GRACE_DAYS', 30))
+SHORTURL_REAPER_ARCHIVE = os.environ.get('SHORTURL_REAPER_ARCHIVE', 'true').lower() == 'true'
+SHORTURL_REAPER_BATCH_SIZE = 500
+SHORTURL_REAPER_LOG_BATCH_SIZE = 5_000
+SHORTURL_REAPER_MAX_SECONDS = 60
+
+# Serve /<short_code>/ with the async view (uvicorn/daphne) instead of the sync one.
+SHORTURL_ASYNC_REDIRECT = os.environ.get('SHORTURL_ASYNC_REDIRECT', 'false').lower() == 'true'
+# Serve GET/HEAD /<short_code>/ from FastRedirectMiddleware, skipping the rest of
+# MIDDLEWARE and URL resolution.
+SHORTURL_FAST_REDIRECT = os.environ.get('SHORTURL_FAST_REDIRECT', 'true').lower() == 'true'
+
+# Requests a client may send back to back per throttle scope (see
+# shorturl.throttling); a scope not listed here gets the N of its rate.
+SHORTURL_THROTTLE_BURST = {
+    'redirect': int(os.environ['SHORTURL_REDIRECT_THROTTLE_BURST']) if os.environ.get('SHORTURL_REDIRECT_THROTTLE_BURST') else None,
 }
 
+# Hi-Lo ids (shorturl/ids.py): 'sequence' (PostgreSQL) or 'redis' leases blocks of
+# SHORTURL_ID_BLOCK_SIZE ids per process, so ids and short codes are known before
+# the INSERT. Unset: the INSERT assigns them. Unused ids of a block are dropped
+# after SHORTURL_ID_BLOCK_MAX_AGE seconds.
+SHORTURL_ID_ALLOCATOR = os.environ.get('SHORTURL_ID_ALLOCATOR') or None
+SHORTURL_ID_BLOCK_SIZE = int(os.environ.get('SHORTURL_ID_BLOCK_SIZE', 100))
+SHORTURL_ID_BLOCK_MAX_AGE = 30
+
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 
+# 'offset' keeps REST_FRAMEWORK's LimitOffsetPagination for /api/shorturls/;
+# 'cursor' switches to keyset pagination (constant cost per page, count on demand).
+SHORTURL_LIST_PAGINATION = os.environ.get('SHORTURL_LIST_PAGINATION', 'offset')
+SHORTURL_MAX_PAGE_SIZE = 100
+
+# Short code layout. With a width, codes are fixed-width; adding a scramble key
+# makes them non-sequential. Pick a width longer than every code already issued,
+# because shorter codes keep decoding as plain ids. SHORTURL_SCRAMBLE_LEGACY_MAX_ID,
+# if set, rejects plain codes above the last id issued before scrambling.
+SHORTURL_CODE_WIDTH = int(os.environ['SHORTURL_CODE_WIDTH']) if os.environ.get('SHORTURL_CODE_WIDTH') else None
+SHORTURL_SCRAMBLE_KEY = os.environ.get('SHORTURL_SCRAMBLE_KEY')
+SHORTURL_SCRAMBLE_LEGACY_MAX_ID = int(os.environ['SHORTURL_SCRAMBLE_LEGACY_MAX_ID']) if os.environ.get('SHORTURL_SCRAMBLE_LEGACY_MAX_ID') else None
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'tudou URL API',
     'DESCRIPTION': 'A lightweight URL shortening API built with Django REST Framework for learning purposes.',
@@ -184,3 +375,25 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = 'django-db' # 使用 django-celery-results 將結果存入資料庫
 CELERY_CACHE_BACKEND = 'django-cache'
+
+CELERY_BEAT_SCHEDULE = {
+    'shorturl-maintain-access-log-partitions': {
+        'task': 'shorturl.tasks.maintain_access_log_partitions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'shorturl-reap-dead-links': {
+        'task': 'shorturl.tasks.reap_dead_links',
+        'schedule': crontab(minute=30),
+    },
+}
+if SHORTURL_REDIS_URL:
+    # Without Redis clicks and access logs are buffered inside each web process,
+    # out of a worker's reach: it would only drain its own empty buffers.
+    CELERY_BEAT_SCHEDULE['shorturl-flush-clicks'] = {
+        'task': 'shorturl.tasks.flush_clicks',
+        'schedule': SHORTURL_CLICK_FLUSH_INTERVAL,
+    }
+    CELERY_BEAT_SCHEDULE['shorturl-drain-access-logs'] = {
+        'task': 'shorturl.tasks.drain_access_logs',
+        'schedule': SHORTURL_LOG_FLUSH_INTERVAL,
+    }
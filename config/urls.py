@@ -17,9 +17,12 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import include, path
+from shorturl.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Before the redirect catch-all.
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('shorturl.urls')),
     path('', include('shorturl.redirect_urls')),
 ]